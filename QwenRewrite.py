@@ -1,32 +1,62 @@
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
+import re
+import sys
+import json
 
-# 加载环境变量（项目根目录有 .env 文件,其中写有api key）
-load_dotenv()
+from pipeline_metrics import metrics
+from token_budget import ledger, planned_tokens
 
-# 初始化客户端
-client = OpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-)
+_client = None
+_async_client = None
 
-# 读取文件内容
-file_path = "output.txt"
 
-if not os.path.exists(file_path):
-    print(f"错误：文件 {file_path} 不存在！")
-    exit(1)
-else:
-    with open(file_path, "r", encoding="utf-8") as f:
-        original_text = f.read().strip()
+def _client_options():
+    from dotenv import load_dotenv
 
-    if not original_text or original_text == "无文字内容":
-        print("无需纠错的文本内容")
-        exit(0)
+    # 加载环境变量（项目根目录有 .env 文件,其中写有api key）
+    load_dotenv()
+    # DASHSCOPE_BASE_URL 可指向本地模拟服务，用于基准测试
+    return {
+        "api_key": os.getenv("DASHSCOPE_API_KEY"),
+        "base_url": os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+    }
+
+
+def get_client():
+    """首次调用时才导入 openai 并创建客户端，导入本模块本身保持轻量"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        _client = OpenAI(**_client_options())
+    return _client
+
+
+def get_async_client():
+    """asyncio 版本的客户端（见 async_pipeline.py），同样在首次调用时创建"""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+
+        _async_client = AsyncOpenAI(**_client_options())
+    return _async_client
+
+
+REWRITE_MODEL = "qwen-plus"
+SYSTEM_PROMPT = "你是一个中文文本纠错助手，请保持原文的行数格式。"
+EDIT_SYSTEM_PROMPT = "你是一个中文文本纠错助手，只输出需要修改的地方，不要输出整段文本。"
+
+# full：逐行输出整段纠错后的文本；edits：只输出修改列表，本地应用（输出 token 与改动量成正比）
+REWRITE_MODES = ("full", "edits")
+
+
+class EditParseError(ValueError):
+    """大模型返回的修改列表无法解析"""
 
-    # 构造提示词
-    prompt = (
+
+def build_rewrite_prompt(original_text):
+    """构造提示词"""
+    return (
         "该文本可能部分汉字存在错误，请你根据语义和读音和常见词组来判断。"
         "请你逐行输出与该文本字符串相同的，语义通顺的经过纠错后的中文句子。"
         "保持原文的行数和格式，每行对应纠错后的内容。"
@@ -35,26 +65,231 @@ else:
         + original_text
     )
 
+
+def build_rewrite_messages(original_text):
+    """构造二级纠错请求的消息"""
+    prompt = build_rewrite_prompt(original_text)
+    metrics.add_bytes("llm_upload", len(prompt.encode("utf-8")))
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def build_edit_prompt(lines):
+    """
+    构造只返回修改列表的提示词，每行前加行号，空行不发送
+    Args:
+        lines: 各行文本
+    """
+    numbered = "\n".join(f"{index}\t{line}" for index, line in enumerate(lines, 1) if line.strip())
+    return (
+        "以下文本每行开头是行号和制表符，文本中可能部分汉字存在错误，请你根据语义和读音和常见词组来判断。"
+        "只输出需要修改的地方，格式为 JSON 列表，每项为 "
+        '{"id": 行号, "from": "原文中需要修改的最短片段", "to": "修改后的片段"}；'
+        "同一片段在该行出现多次时，加上 \"offset\": 片段在该行中的起始字符位置（从 0 开始）。"
+        "没有错误时输出 []。不要输出 JSON 以外的任何内容：\n\n"
+        + numbered
+    )
+
+
+def parse_edits(content):
+    """
+    解析大模型返回的修改列表（允许包在 ```json 代码块中）
+    Returns:
+        list[dict]
+    """
+    content = content.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", content, re.DOTALL)
+    if fenced:
+        content = fenced.group(1)
     try:
-        # 发起请求
-        completion = client.chat.completions.create(
-            model="qwen-plus",
-            messages=[
-                {"role": "system", "content": "你是一个中文文本纠错助手，请保持原文的行数格式。"},
-                {"role": "user", "content": prompt},
-            ],
-        )
-
-        # 获取模型回复
-        corrected_text = completion.choices[0].message.content.strip()
-        
+        edits = json.loads(content)
+    except ValueError as e:
+        raise EditParseError(f"修改列表不是合法的 JSON: {e}")
+    if isinstance(edits, dict):
+        edits = edits.get("edits", edits)
+    if not isinstance(edits, list) or not all(isinstance(edit, dict) for edit in edits):
+        raise EditParseError("修改列表格式不正确")
+    return edits
+
+
+def apply_edits(lines, edits):
+    """
+    校验并应用修改：行号必须存在、原文片段必须在该行中（有 offset 时位置也要一致），
+    同一行中重叠的修改只保留第一个；无效的修改跳过
+    Returns:
+        (list[str], int, int): 修改后的各行、应用的修改数、跳过的修改数
+    """
+    by_line = {}
+    rejected = 0
+    for edit in edits:
+        try:
+            index = int(edit["id"]) - 1
+            original, replacement = str(edit["from"]), str(edit["to"])
+        except (KeyError, TypeError, ValueError):
+            rejected += 1
+            continue
+        if not 0 <= index < len(lines) or not original or original == replacement:
+            rejected += 1
+            continue
+        line = lines[index]
+        offset = edit.get("offset")
+        # 只接受落在行内的非负整数位置（不接受 True/False 和负数，负数下标会绕过重叠检查），否则按唯一出现处理
+        if type(offset) is int and 0 <= offset <= len(line) - len(original) \
+                and line[offset:offset + len(original)] == original:
+            start = offset
+        elif line.count(original) == 1:
+            start = line.index(original)
+        else:
+            # 片段不存在，或出现多次又没有给出正确位置
+            rejected += 1
+            continue
+        spans = by_line.setdefault(index, [])
+        if any(start < end and other_start < start + len(original) for other_start, end, _ in spans):
+            rejected += 1
+            continue
+        spans.append((start, start + len(original), replacement))
+
+    result = list(lines)
+    applied = 0
+    for index, spans in by_line.items():
+        line = result[index]
+        # 从后往前替换，前面的位置不受影响
+        for start, end, replacement in sorted(spans, reverse=True):
+            line = line[:start] + replacement + line[end:]
+            applied += 1
+        result[index] = line
+    return result, applied, rejected
+
+
+def build_edit_messages(lines):
+    prompt = build_edit_prompt(lines)
+    metrics.add_bytes("llm_upload", len(prompt.encode("utf-8")))
+    return [
+        {"role": "system", "content": EDIT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _apply_edit_reply(lines, content):
+    edits = parse_edits(content)
+    result, applied, rejected = apply_edits(lines, edits)
+    metrics.incr("llm_edits_applied", applied)
+    if rejected:
+        metrics.incr("llm_edits_rejected", rejected)
+    return "\n".join(result)
+
+
+def _completion_text(completion):
+    metrics.add_usage("llm_rewrite", getattr(completion, "usage", None))
+    ledger.record("llm_rewrite", REWRITE_MODEL, getattr(completion, "usage", None))
+    return completion.choices[0].message.content.strip()
+
+
+def rewrite_text(original_text):
+    """调用 qwen-plus 对文本进行二级纠错，返回纠错后的文本"""
+    messages = build_rewrite_messages(original_text)
+    with metrics.stage("llm_rewrite"):
+        completion = get_client().chat.completions.create(model=REWRITE_MODEL, messages=messages)
+    return _completion_text(completion)
+
+
+async def rewrite_text_async(original_text):
+    """rewrite_text 的 asyncio 版本，使用 AsyncOpenAI"""
+    messages = build_rewrite_messages(original_text)
+    with metrics.stage("llm_rewrite"):
+        completion = await get_async_client().chat.completions.create(model=REWRITE_MODEL, messages=messages)
+    return _completion_text(completion)
+
+
+def _fallback_allowed(original_text):
+    """
+    退回整段改写前检查预算：预算按一次请求预留，第二次请求放不进剩余预算时放弃改写，保留第一次纠错的结果
+    """
+    remaining = ledger.remaining_tokens(REWRITE_MODEL)
+    if remaining is None or remaining >= planned_tokens(original_text):
+        metrics.incr("llm_edit_fallbacks")
+        return True
+    print(f"剩余预算 {remaining} token 不足以整段改写，保留第一次纠错的结果")
+    metrics.incr("llm_edit_fallbacks_skipped")
+    return False
+
+
+def rewrite_text_edits(original_text):
+    """
+    只让大模型返回修改列表（行号、原文片段、替换），在本地校验并应用；
+    回复无法解析时退回整段改写（预算不足时返回原文）
+    """
+    lines = original_text.split("\n")
+    messages = build_edit_messages(lines)
+    with metrics.stage("llm_rewrite"):
+        completion = get_client().chat.completions.create(model=REWRITE_MODEL, messages=messages)
+    content = _completion_text(completion)
+    try:
+        return _apply_edit_reply(lines, content)
+    except EditParseError as e:
+        print(f"修改列表解析失败，改为整段改写: {e}")
+        if not _fallback_allowed(original_text):
+            return original_text
+        return rewrite_text(original_text)
+
+
+async def rewrite_text_edits_async(original_text):
+    """rewrite_text_edits 的 asyncio 版本"""
+    lines = original_text.split("\n")
+    messages = build_edit_messages(lines)
+    with metrics.stage("llm_rewrite"):
+        completion = await get_async_client().chat.completions.create(model=REWRITE_MODEL, messages=messages)
+    content = _completion_text(completion)
+    try:
+        return _apply_edit_reply(lines, content)
+    except EditParseError as e:
+        print(f"修改列表解析失败，改为整段改写: {e}")
+        if not _fallback_allowed(original_text):
+            return original_text
+        return await rewrite_text_async(original_text)
+
+
+def get_rewrite_func(mode="full"):
+    """按模式返回改写函数 text -> text"""
+    if mode not in REWRITE_MODES:
+        raise ValueError(f"不支持的改写模式: {mode}")
+    return rewrite_text_edits if mode == "edits" else rewrite_text
+
+
+if __name__ == "__main__":
+    # 读取文件内容
+    file_path = "output.txt"
+
+    if not os.path.exists(file_path):
+        print(f"错误：文件 {file_path} 不存在！")
+        exit(1)
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        original_text = f.read().strip()
+
+    if not original_text or original_text == "无文字内容":
+        print("无需纠错的文本内容")
+        exit(0)
+
+    # 父进程设置了预算时传入本次可用的 token 数，退回整段改写前据此检查
+    if "--max-tokens" in sys.argv[1:]:
+        ledger.configure(max_tokens=int(sys.argv[sys.argv.index("--max-tokens") + 1]))
+
+    try:
+        # 获取模型回复；--edits 时只让模型返回修改列表
+        corrected_text = get_rewrite_func("edits" if "--edits" in sys.argv[1:] else "full")(original_text)
+
         # 将纠错后的文本保存到新文件
         with open("corrected_output.txt", "w", encoding="utf-8") as f:
             f.write(corrected_text)
-            
-        # 简单输出成功标识，避免编码问题
+
+        # 简单输出成功标识，避免编码问题；附带供调用方汇总的计数
         print("SUCCESS")
+        print("METRICS " + json.dumps(metrics.snapshot()["counters"]))
+        print("USAGE " + json.dumps(ledger.records))
 
     except Exception as e:
         print(f"文本纠错出现异常: {str(e)}")
-        exit(1)
\ No newline at end of file
+        exit(1)
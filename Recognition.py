@@ -1,18 +1,60 @@
 import os
+import re
 import sys
+import json
 import base64
-from openai import OpenAI
-from dotenv import load_dotenv
 
-# 加载环境变量（项目根目录有 .env 文件,其中写有api key）
-load_dotenv()
+from pipeline_metrics import metrics
+from token_budget import ledger
 
-# 初始化客户端
-client = OpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+_client = None
+_async_client = None
+
+
+def _client_options():
+    from dotenv import load_dotenv
+
+    # 加载环境变量（项目根目录有 .env 文件,其中写有api key）
+    load_dotenv()
+    # DASHSCOPE_BASE_URL 可指向本地模拟服务，用于基准测试
+    return {
+        "api_key": os.getenv("DASHSCOPE_API_KEY"),
+        "base_url": os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+    }
+
+
+def get_client():
+    """首次调用时才导入 openai 并创建客户端，导入本模块本身保持轻量"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        _client = OpenAI(**_client_options())
+    return _client
+
+
+def get_async_client():
+    """asyncio 版本的客户端（见 async_pipeline.py），同样在首次调用时创建"""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+
+        _async_client = AsyncOpenAI(**_client_options())
+    return _async_client
+
+OCR_MODEL = "qwen-vl-ocr-latest"
+
+# 自定义提示词（可以自由修改）
+OCR_PROMPT = (
+    "请提取这张图片中的所有可见文字内容。"
+    "输出纯中文文本内容。"
+    "不要遗漏任何段落，输出纯文本即可。"
+    "如果图片中没有文字，请输出：无文字内容"
 )
 
+# 多帧合并请求时，每张图片结果前的分隔行
+BATCH_MARKER_PATTERN = re.compile(r"^\s*===\s*第\s*(\d+)\s*张\s*===\s*$", re.MULTILINE)
+
 
 # 将图片转为 data URI
 def image_to_data_uri(file_path):
@@ -23,61 +65,145 @@ def image_to_data_uri(file_path):
     return f"data:{mime_type};base64,{encoded_str}"
 
 
-if __name__ == "__main__":
-    # 支持命令行参数传入图片路径
-    if len(sys.argv) > 1:
-        image_path = sys.argv[1]
-    else:
-        image_path = "image.jpg"
-
-    if not os.path.exists(image_path):
-        print(f"错误：文件 {image_path} 不存在！")
-        exit(1)
+def build_image_part(image_path):
+    """构造单张图片的 image_url 消息片段"""
+    image_data_uri = image_to_data_uri(image_path)
+    metrics.add_bytes("ocr_upload", len(image_data_uri))
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": image_data_uri,
+            "min_pixels": 28 * 28 * 4,
+            "max_pixels": 28 * 28 * 8192
+        }
+    }
 
-    try:
-        # 构造图像数据URI
-        image_data_uri = image_to_data_uri(image_path)
-
-        # 自定义提示词（可以自由修改）
-        custom_prompt = (
-            "请提取这张图片中的所有可见文字内容。"
-            "输出纯中文文本内容。"
-            "不要遗漏任何段落，输出纯文本即可。"
-            "如果图片中没有文字，请输出：无文字内容"
-        )
 
-        # 发起请求
-        completion = client.chat.completions.create(
-            model="qwen-vl-ocr-latest",  # 支持OCR的模型
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_data_uri,
-                                "min_pixels": 28 * 28 * 4,
-                                "max_pixels": 28 * 28 * 8192
-                            }
-                        },
-                        {"type": "text", "text": custom_prompt}
-                    ]
-                }
+def build_batch_prompt(count):
+    """构造多帧合并识别的提示词"""
+    return (
+        f"以下共有 {count} 张图片，请按顺序分别提取每张图片中的所有可见文字内容。"
+        "输出纯中文文本内容，不要遗漏任何段落。"
+        f"每张图片的结果前单独输出一行“===第N张===”（N 为 1 到 {count} 的序号）。"
+        "如果某张图片中没有文字，该张图片输出：无文字内容"
+    )
+
+
+def split_batch_response(content, count):
+    """
+    将多帧合并识别的回复按分隔行拆回每张图片
+    Returns:
+        list[str]: 与输入图片顺序一致的文本列表；分隔行缺失或序号不完整时返回 None
+    """
+    markers = list(BATCH_MARKER_PATTERN.finditer(content))
+    if not markers:
+        return None
+
+    texts = {}
+    for i, marker in enumerate(markers):
+        index = int(marker.group(1))
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(content)
+        if not 1 <= index <= count or index in texts:
+            return None
+        texts[index] = content[marker.end():end].strip()
+
+    if len(texts) != count:
+        return None
+    return [texts[i] for i in range(1, count + 1)]
+
+
+def build_ocr_messages(image_path):
+    """构造单张图片识别请求的消息"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                build_image_part(image_path),
+                {"type": "text", "text": OCR_PROMPT}
             ]
+        }
+    ]
+
+
+def _record_ocr_completion(completion, image_count=1):
+    metrics.incr("ocr_images", image_count)
+    metrics.add_usage("ocr", getattr(completion, "usage", None))
+    ledger.record("ocr", OCR_MODEL, getattr(completion, "usage", None))
+
+
+def recognize_image(image_path):
+    """识别单张图片中的文字"""
+    with metrics.stage("ocr_request"):
+        completion = get_client().chat.completions.create(
+            model=OCR_MODEL,  # 支持OCR的模型
+            messages=build_ocr_messages(image_path)
+        )
+    _record_ocr_completion(completion)
+    return completion.choices[0].message.content
+
+
+async def recognize_image_async(image_path):
+    """recognize_image 的 asyncio 版本：读图和 base64 编码放到线程中，请求使用 AsyncOpenAI"""
+    import asyncio
+
+    messages = await asyncio.to_thread(build_ocr_messages, image_path)
+    with metrics.stage("ocr_request"):
+        completion = await get_async_client().chat.completions.create(model=OCR_MODEL, messages=messages)
+    _record_ocr_completion(completion)
+    return completion.choices[0].message.content
+
+
+def recognize_images_batch(image_paths):
+    """
+    在一次请求中识别多张图片（多个 image_url 片段），按分隔行拆回每张图片的结果
+    Returns:
+        list[str] 或 None（回复无法按张拆分时）
+    """
+    content = [build_image_part(path) for path in image_paths]
+    content.append({"type": "text", "text": build_batch_prompt(len(image_paths))})
+
+    with metrics.stage("ocr_request"):
+        completion = get_client().chat.completions.create(
+            model=OCR_MODEL,
+            messages=[{"role": "user", "content": content}]
         )
+    _record_ocr_completion(completion, len(image_paths))
+    return split_batch_response(completion.choices[0].message.content, len(image_paths))
+
+
+if __name__ == "__main__":
+    # 支持命令行参数传入图片路径；传入多张图片时合并为一次请求
+    image_paths = sys.argv[1:] if len(sys.argv) > 1 else ["image.jpg"]
 
-        # 获取识别结果
-        extracted_text = completion.choices[0].message.content
+    for image_path in image_paths:
+        if not os.path.exists(image_path):
+            print(f"错误：文件 {image_path} 不存在！")
+            exit(1)
 
-        # 将结果保存到 txt 文件（不在控制台输出，避免编码问题）
-        output_file_path = "output.txt"
-        with open(output_file_path, "w", encoding="utf-8") as output_file:
-            output_file.write(extracted_text)
-            
-        # 输出成功标识
+    try:
+        if len(image_paths) == 1:
+            # 获取识别结果
+            extracted_text = recognize_image(image_paths[0])
+
+            # 将结果保存到 txt 文件（不在控制台输出，避免编码问题）
+            output_file_path = "output.txt"
+            with open(output_file_path, "w", encoding="utf-8") as output_file:
+                output_file.write(extracted_text)
+        else:
+            extracted_texts = recognize_images_batch(image_paths)
+            if extracted_texts is None:
+                print("多帧识别结果无法按图片拆分")
+                exit(2)
+
+            # 多帧结果按输入顺序保存为 JSON 列表
+            with open("output_batch.json", "w", encoding="utf-8") as output_file:
+                json.dump(extracted_texts, output_file, ensure_ascii=False)
+
+        # 输出成功标识，以及供调用方汇总的计数（上传字节数、token 用量）
         print("OCR_SUCCESS")
+        print("METRICS " + json.dumps(metrics.snapshot()["counters"]))
+        print("USAGE " + json.dumps(ledger.records))
 
     except Exception as e:
         print("出现异常：", str(e))
-        exit(1)
\ No newline at end of file
+        exit(1)
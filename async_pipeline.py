@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio 接口
+
+供 asyncio Web 后端直接 await，不必再用线程包装同步接口：
+网络请求（OCR、大模型改写）使用 AsyncOpenAI，可在一个事件循环中同时挂起大量请求；
+pycorrector 模型、本地 OCR、视频抽帧等 CPU 密集的调用放到执行器中运行。
+模型不保证线程安全，所有模型调用都在同一个单线程执行器中串行执行。
+
+import asyncio
+from async_pipeline import ocr_image, correct_text_async, rewrite_async, process_video_async
+
+text = await ocr_image("image.png")
+first_pass = await correct_text_async(text)
+final = await rewrite_async(first_pass)
+result = await process_video_async("video.mp4")
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ocr_backends import NO_TEXT
+from pipeline_metrics import metrics
+
+_model_executor = None
+# {模型列表（None 为默认列表）: TextFileCorrector}
+_default_correctors = {}
+_corrector_lock = None
+
+
+def get_model_executor():
+    """运行 pycorrector 模型的单线程执行器"""
+    global _model_executor
+    if _model_executor is None:
+        _model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="correction-model")
+    return _model_executor
+
+
+async def get_default_corrector(use_models=None):
+    """每种模型列表首次调用时在模型执行器中创建 TextFileCorrector，之后复用"""
+    global _corrector_lock
+    if _corrector_lock is None:
+        _corrector_lock = asyncio.Lock()
+    key = None if use_models is None else tuple(use_models)
+    async with _corrector_lock:
+        if key not in _default_correctors:
+            from text_file_corrector import TextFileCorrector
+
+            loop = asyncio.get_running_loop()
+            _default_correctors[key] = await loop.run_in_executor(
+                get_model_executor(), lambda: TextFileCorrector(use_models=use_models)
+            )
+    return _default_correctors[key]
+
+
+async def ocr_image(image_path, ocr_backend=None):
+    """
+    识别单张图片
+    Args:
+        image_path: 图片路径
+        ocr_backend: OCR 后端（见 ocr_backends.py），在线程中运行；默认异步请求通义千问 OCR
+    Returns:
+        str: 识别文本，失败时为 None
+    """
+    if ocr_backend is None:
+        from Recognition import recognize_image_async
+
+        return await recognize_image_async(image_path)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, ocr_backend.recognize, image_path)
+    return result.text if result else None
+
+
+async def ocr_images(image_paths, ocr_backend=None, concurrency=8):
+    """
+    并发识别多张图片，同时在途的请求不超过 concurrency 个
+    Returns:
+        list[str]: 与输入顺序一致，失败的项为 None
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def recognize(path):
+        async with semaphore:
+            try:
+                return await ocr_image(path, ocr_backend=ocr_backend)
+            except Exception as e:
+                print(f"  识别失败 {path}: {e}")
+                return None
+
+    return await asyncio.gather(*(recognize(path) for path in image_paths))
+
+
+def _correct_lines(corrector, text, strategy):
+    return "\n".join(corrector.correct_text(line.strip(), strategy=strategy) if line.strip() else ""
+                     for line in text.splitlines())
+
+
+async def correct_text_async(text, strategy="pipeline", corrector=None):
+    """
+    第一次纠错：整段文本一次交给模型执行器，逐行纠错
+    Args:
+        text: 待纠错文本（可以有多行）
+        strategy: 集成策略
+        corrector: TextFileCorrector 或 RemoteCorrector，默认使用 get_default_corrector()
+    """
+    corrector = corrector or await get_default_corrector()
+    loop = asyncio.get_running_loop()
+    with metrics.stage("first_pass_correction"):
+        return await loop.run_in_executor(get_model_executor(), _correct_lines, corrector, text, strategy)
+
+
+async def rewrite_async(text, mode="full"):
+    """
+    二级纠错：异步请求大模型
+    Args:
+        mode: 'full' 整段改写，或 'edits' 只让大模型返回修改列表
+    """
+    from QwenRewrite import rewrite_text_async, rewrite_text_edits_async
+
+    if mode == "edits":
+        return await rewrite_text_edits_async(text)
+    return await rewrite_text_async(text)
+
+
+async def process_video_async(video_path, corrector=None, strategy="pipeline", llm=True, ocr_backend=None,
+                              ocr_concurrency=8, frame_interval=60, text_threshold=0.002,
+                              merge_threshold=0.7, merge_max_gap=5.0, rewrite_mode="full"):
+    """
+    视频完整流程：抽帧 → 并发 OCR → 相似文本合并 → 第一次纠错 → 大模型二级纠错
+    Args:
+        video_path: 视频文件路径
+        corrector: 纠错器，默认使用 get_default_corrector()
+        strategy: 集成策略
+        llm: 是否进行大模型二级纠错
+        ocr_backend: OCR 后端，默认异步请求通义千问 OCR
+        ocr_concurrency: 同时在途的 OCR 请求数
+        rewrite_mode: 二级纠错方式，'full' 或 'edits'
+        其余参数同 integrated_corrector.process_video_ocr
+    Returns:
+        dict: success、first_pass_text、text、segments（各时间段的原文与最终文本）、timings
+    """
+    from integrated_corrector import extract_frames_from_video
+    from line_aligner import align_to_segments
+    from segment_merger import merge_segments
+
+    timings = {}
+    started = time.time()
+    loop = asyncio.get_running_loop()
+    # 每个任务使用独立的帧目录，并发任务之间互不干扰
+    frame_dir = tempfile.mkdtemp(prefix="frames_")
+    try:
+        stage_start = time.time()
+        frames = await loop.run_in_executor(
+            None, lambda: extract_frames_from_video(video_path, output_dir=frame_dir, frame_interval=frame_interval,
+                                                    text_threshold=text_threshold)
+        )
+        timings["frame_extract"] = time.time() - stage_start
+
+        stage_start = time.time()
+        frame_texts = await ocr_images([path for path, _ in frames], ocr_backend=ocr_backend,
+                                       concurrency=ocr_concurrency)
+        timings["ocr"] = time.time() - stage_start
+    finally:
+        shutil.rmtree(frame_dir, ignore_errors=True)
+
+    texts = []
+    for (_, timestamp), frame_text in zip(frames, frame_texts):
+        # 同一帧内的多行文字合并为一行
+        frame_text = " ".join(line.strip() for line in (frame_text or "").splitlines() if line.strip())
+        if frame_text and frame_text != NO_TEXT:
+            texts.append((frame_text, timestamp))
+    if not texts:
+        return {"success": False, "error": "未从视频中识别到任何文字", "timings": _round_timings(timings)}
+
+    with metrics.stage("segment_merge"):
+        segments = merge_segments(texts, similarity_threshold=merge_threshold, max_gap=merge_max_gap)
+
+    stage_start = time.time()
+    first_pass = await correct_text_async("\n".join(text for text, _, _ in segments), strategy=strategy,
+                                          corrector=corrector)
+    timings["correction"] = time.time() - stage_start
+
+    result = {"success": True, "type": "video", "first_pass_text": first_pass}
+    final_text = first_pass
+    if llm and first_pass.strip():
+        stage_start = time.time()
+        try:
+            final_text = await rewrite_async(first_pass, mode=rewrite_mode)
+        except Exception as e:
+            result["llm_error"] = str(e)
+        timings["llm_rewrite"] = time.time() - stage_start
+
+    aligned = align_to_segments([text for text, _, _ in segments], final_text)
+    result["text"] = final_text
+    result["segments"] = [
+        {"start": round(start, 3), "end": round(end, 3), "ocr_text": text, "text": segment_text}
+        for (text, start, end), segment_text in zip(segments, aligned)
+    ]
+    timings["total"] = time.time() - started
+    result["timings"] = _round_timings(timings)
+    return result
+
+
+def _round_timings(timings):
+    return {stage: round(seconds, 4) for stage, seconds in timings.items()}
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        print("用法: python async_pipeline.py <视频文件> [--no-llm]")
+        sys.exit(1)
+    video_result = asyncio.run(process_video_async(sys.argv[1], llm="--no-llm" not in sys.argv))
+    print(json.dumps(video_result, ensure_ascii=False, indent=2))
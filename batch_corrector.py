@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+批量纠错：目录、通配符或清单文件中的文本/图片/视频一起处理
+
+# 处理目录下的所有支持文件
+python integrated_corrector.py --batch input_dir/
+
+# 通配符和清单文件（每行一个路径）
+python integrated_corrector.py --batch "scans/*.png" videos/ --manifest files.txt --output-dir results
+
+所有文件共用一个纠错器（模型只加载一次）和两个线程池：
+网络池负责 OCR 和大模型请求，CPU 池负责 pycorrector 纠错。
+不同文件的网络等待和本地纠错相互重叠。
+"""
+import os
+import glob
+import json
+import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline_metrics import metrics
+from subtitle_writer import JsonlWriter, SrtWriter, VttWriter, subtitle_intervals
+from token_budget import ledger, line_priority, rewrite_within_budget
+
+
+def expand_inputs(specs, manifest_path=None, recursive=False):
+    """
+    把目录、通配符、文件路径和清单文件展开为去重后的文件列表
+    Args:
+        specs: 路径、目录或通配符列表
+        manifest_path: 清单文件，每行一个路径/目录/通配符，# 开头为注释
+        recursive: 目录是否递归展开
+    """
+    from integrated_corrector import detect_file_type
+
+    specs = list(specs)
+    if manifest_path:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            specs.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    files = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            pattern = os.path.join(spec, "**", "*") if recursive else os.path.join(spec, "*")
+            candidates = sorted(glob.glob(pattern, recursive=recursive))
+        elif glob.has_magic(spec):
+            candidates = sorted(glob.glob(spec, recursive=True))
+        else:
+            candidates = [spec]
+        for path in candidates:
+            if os.path.isfile(path) and detect_file_type(path) in ("text", "image", "video"):
+                files.append(os.path.normpath(path))
+
+    seen = set()
+    return [path for path in files if not (path in seen or seen.add(path))]
+
+
+class BatchCorrector:
+    """跨文件调度的批量纠错器"""
+
+    def __init__(self, output_dir="batch_output", use_models=None, strategy="pipeline", llm=True,
+                 network_workers=8, max_files_in_flight=4, corrector=None, ocr_func=None, rewrite_func=None,
+                 text_threshold=None, confusion_path=None, frame_batch_size=1, merge_threshold=0.7,
+                 merge_max_gap=5.0):
+        """
+        Args:
+            output_dir: 输出目录
+            use_models: pycorrector 模型列表
+            strategy: 第一次纠错的集成策略
+            llm: 是否进行大模型二级纠错
+            network_workers: 网络池线程数（OCR 与大模型请求）
+            max_files_in_flight: 同时处理的文件数
+            corrector / ocr_func / rewrite_func: 可注入的纠错器与识别、改写函数
+            text_threshold: 视频抽帧的文字存在性预判阈值，None 表示不过滤
+            confusion_path: 创建纠错器时加载的额外混淆集文件（见 confusion_miner.py）
+            frame_batch_size: 视频每次 OCR 请求合并识别的帧数（ocr_func 支持 recognize_batch 时生效）
+            merge_threshold / merge_max_gap: 相邻文本段合并的相似度阈值和最大时间间隔（秒）
+        """
+        if corrector is None:
+            from text_file_corrector import TextFileCorrector
+            corrector = TextFileCorrector(
+                use_models=use_models or ['kenlm', 'macbert', 'ernie', 'confusion'],
+                confusion_path=confusion_path
+            )
+        if ocr_func is None:
+            # 进程内请求通义千问 OCR；多帧合并请求无法拆分时退回逐帧识别
+            from ocr_backends import QwenOCRBackend
+            ocr_func = QwenOCRBackend()
+        if llm and rewrite_func is None:
+            from QwenRewrite import rewrite_text as rewrite_func
+
+        self.corrector = corrector
+        self.ocr_func = ocr_func
+        self.rewrite_func = rewrite_func
+        self.output_dir = output_dir
+        self.strategy = strategy
+        self.llm = llm
+        self.network_workers = network_workers
+        self.max_files_in_flight = max_files_in_flight
+        self.text_threshold = text_threshold
+        self.frame_batch_size = max(1, frame_batch_size)
+        self.merge_threshold = merge_threshold
+        self.merge_max_gap = merge_max_gap
+        # 模型不保证线程安全，CPU 纠错固定单线程
+        self.cpu_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cpu")
+        self.network_pool = ThreadPoolExecutor(max_workers=network_workers, thread_name_prefix="net")
+        self.stage_busy = {}
+        self.lock = threading.Lock()
+
+    def _timed(self, stage, timings, func, *args):
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.time() - start
+            # 同一个 timings 可能由多个阶段的线程同时累加
+            with self.lock:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+                self.stage_busy[stage] = self.stage_busy.get(stage, 0.0) + elapsed
+
+    def _correct_lines(self, lines):
+        """
+        Returns:
+            (list[str], list[int] 或 None): 纠错后的各行，以及设置了预算时各行的二级纠错优先级
+        """
+        if ledger.has_budget:
+            corrected, priorities = [], []
+            for line in lines:
+                details = {}
+                target = self.corrector.correct_text(line, strategy=self.strategy, details=details) \
+                    if line.strip() else line
+                corrected.append(target)
+                priorities.append(line_priority(line, details, target))
+            return corrected, priorities
+        # 远程模型宿主支持整批纠错，减少 IPC 往返
+        if hasattr(self.corrector, "correct_lines"):
+            return self.corrector.correct_lines(lines, strategy=self.strategy), None
+        return [self.corrector.correct_text(line, strategy=self.strategy) if line.strip() else line
+                for line in lines], None
+
+    def _output_path(self, input_path, suffix):
+        """
+        输出文件名带上扩展名和绝对路径的短哈希：不同目录下的同名文件、
+        同名不同扩展名的文件（x.png 与 x.txt）以及共用输出目录的多个 worker 不会互相覆盖
+        """
+        stem, extension = os.path.splitext(os.path.basename(input_path))
+        if extension:
+            stem = f"{stem}_{extension.lstrip('.')}"
+        digest = hashlib.blake2b(os.path.abspath(input_path).encode("utf-8"), digest_size=4).hexdigest()
+        return os.path.join(self.output_dir, f"{stem}_{digest}{suffix}")
+
+    def _ocr_frames(self, frame_paths):
+        """识别一组帧，ocr_func 支持 recognize_batch 时合并为一次请求"""
+        if hasattr(self.ocr_func, "recognize_batch"):
+            return [result.text if result else None for result in self.ocr_func.recognize_batch(frame_paths)]
+        return [self.ocr_func(path) for path in frame_paths]
+
+    def process_file(self, path):
+        """处理单个文件，返回该文件的结果记录"""
+        from integrated_corrector import detect_file_type, extract_frames_from_video
+        from segment_merger import merge_segments
+
+        file_type = detect_file_type(path)
+        timings = {}
+        record = {"file": path, "type": file_type}
+        start = time.time()
+        segments = None
+        try:
+            if file_type == "text":
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = f.read().split("\n")
+            elif file_type == "image":
+                text = self.network_pool.submit(self._timed, "ocr", timings, self.ocr_func, path).result()
+                text = (text or "").strip()
+                lines = [] if text == "无文字内容" else text.split("\n")
+            else:
+                frame_dir = self._output_path(path, "_frames")
+                frames = self._timed("frame_extraction", timings, extract_frames_from_video, path, frame_dir,
+                                     60, self.text_threshold)
+                # 各帧（每 frame_batch_size 帧一组）的 OCR 请求并发提交到共享网络池
+                frame_paths = [frame_path for frame_path, _ in frames]
+                futures = [self.network_pool.submit(self._timed, "ocr", timings, self._ocr_frames,
+                                                    frame_paths[start:start + self.frame_batch_size])
+                           for start in range(0, len(frame_paths), self.frame_batch_size)]
+                frame_texts = [text for future in futures for text in future.result()]
+                texts = []
+                for (frame_path, timestamp), frame_text in zip(frames, frame_texts):
+                    frame_text = frame_text or ""
+                    frame_text = " ".join(line.strip() for line in frame_text.splitlines() if line.strip())
+                    if frame_text and frame_text != "无文字内容":
+                        texts.append((frame_text, timestamp))
+                    try:
+                        os.remove(frame_path)
+                    except OSError:
+                        pass
+                try:
+                    os.rmdir(frame_dir)
+                except OSError:
+                    pass
+                segments = self._timed("merge", timings, merge_segments, texts, self.merge_threshold,
+                                       self.merge_max_gap)
+                lines = [text for text, _, _ in segments]
+
+            corrected_lines, priorities = self.cpu_pool.submit(
+                self._timed, "correction", timings, self._correct_lines, lines
+            ).result()
+            first_pass_text = "\n".join(corrected_lines)
+            final_text = first_pass_text
+            if self.llm and first_pass_text.strip() and ledger.has_budget:
+                # 所有文件共用一个预算，低优先级的行在预算不足时保留第一次纠错的结果
+                final_lines, skipped = self.network_pool.submit(
+                    self._timed, "llm_rewrite", timings, rewrite_within_budget,
+                    corrected_lines, self.rewrite_func, ledger, priorities
+                ).result()
+                final_text = "\n".join(final_lines)
+                record["llm_lines_skipped"] = skipped
+            elif self.llm and first_pass_text.strip():
+                final_text = self.network_pool.submit(
+                    self._timed, "llm_rewrite", timings, self.rewrite_func, first_pass_text
+                ).result()
+
+            self._write_outputs(path, first_pass_text, final_text, segments)
+            record.update({
+                "success": True,
+                "lines": len([line for line in lines if line.strip()]),
+                "output_file_path": self._output_path(path, "_corrected.txt"),
+            })
+        except Exception as e:
+            record.update({"success": False, "error": str(e)})
+
+        record["wall_time"] = round(time.time() - start, 4)
+        record["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        status = "✓" if record["success"] else f"✗ {record['error']}"
+        print(f"  [{file_type}] {path}: {status} ({record['wall_time']:.2f}s)")
+        return record
+
+    def _write_outputs(self, path, first_pass_text, final_text, segments):
+        with open(self._output_path(path, "_first_pass.txt"), "w", encoding="utf-8") as f:
+            f.write(first_pass_text)
+        with open(self._output_path(path, "_corrected.txt"), "w", encoding="utf-8") as f:
+            f.write(final_text)
+
+        if segments:
+            from line_aligner import align_to_segments
+
+            final_lines = align_to_segments([text for text, _, _ in segments], final_text)
+            intervals = subtitle_intervals([(start, end) for _, start, end in segments])
+            with SrtWriter(self._output_path(path, ".srt")) as srt_writer, \
+                    VttWriter(self._output_path(path, ".vtt")) as vtt_writer, \
+                    JsonlWriter(self._output_path(path, "_results.jsonl")) as jsonl_writer:
+                for index, ((ocr_text, _, _), line, (start, end)) in enumerate(zip(segments, final_lines, intervals)):
+                    srt_writer.write_cue(start, end, line)
+                    vtt_writer.write_cue(start, end, line)
+                    jsonl_writer.write({"segment_index": index, "start": round(start, 3), "end": round(end, 3),
+                                        "ocr_text": ocr_text, "final_text": line})
+
+    def run(self, files, report_path=None):
+        """
+        批量处理文件并写出汇总报告
+        Returns:
+            dict: 汇总报告
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"批量处理 {len(files)} 个文件，输出目录: {self.output_dir}")
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_files_in_flight, thread_name_prefix="file") as file_pool:
+            records = list(file_pool.map(self.process_file, files))
+        wall_time = time.time() - start
+
+        succeeded = [record for record in records if record["success"]]
+        total_lines = sum(record["lines"] for record in succeeded)
+        report = {
+            "files": len(records),
+            "succeeded": len(succeeded),
+            "failed": len(records) - len(succeeded),
+            "total_lines": total_lines,
+            "wall_time": round(wall_time, 4),
+            "files_per_second": round(len(records) / wall_time, 4) if wall_time > 0 else None,
+            "lines_per_second": round(total_lines / wall_time, 4) if wall_time > 0 else None,
+            # 各阶段累计耗时之和大于墙钟时间的部分即为重叠执行节省的时间
+            "stage_busy_time": {stage: round(seconds, 4) for stage, seconds in self.stage_busy.items()},
+            "metrics": metrics.snapshot(),
+            "usage": ledger.summary(),
+            "results": records,
+        }
+
+        report_path = report_path or os.path.join(self.output_dir, "batch_report.json")
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        print("=" * 60)
+        print(f"批量处理完成: 成功 {report['succeeded']}，失败 {report['failed']}，"
+              f"耗时 {wall_time:.2f}s，{report['lines_per_second']} 行/秒")
+        print(f"汇总报告: {report_path}")
+        return report
+
+    def close(self):
+        self.cpu_pool.shutdown()
+        self.network_pool.shutdown()
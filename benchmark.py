@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+纠错与OCR流水线的可复现基准测试
+
+# 运行全部基准（合成语料 + 合成视频 + 本地模拟 DashScope 接口的端到端测试）
+python benchmark.py --lines 500 --error-rate 0.2 --models confusion,kenlm --output bench_results.json
+
+# 保存为基线 / 与基线对比（指标变差超过 10% 视为回退）
+python benchmark.py --save-baseline bench_baseline.json
+python benchmark.py --compare bench_baseline.json --tolerance 0.1 --fail-on-regression
+
+# 只测启动耗时（python -X importtime，列出累计耗时最多的导入）
+python benchmark.py --startup-only --startup-runs 5
+
+所有输入均由固定随机种子生成：语料来自混淆集（正确词按比例替换为易错写法），
+视频用 cv2 绘制文字，OCR 与大模型请求发往本地模拟服务，不需要网络和 API Key。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 句子模板，每个 {} 填入一个来自混淆集的正确词
+SENTENCE_TEMPLATES = [
+    "我们必须{}这个{}。",
+    "他在会上{}了关于{}的看法。",
+    "这次{}对大家来说非常{}。",
+    "请大家认真{}，不要忽视{}。",
+    "{}和{}都是今年工作的重点。",
+    "老师说{}比{}更加重要。",
+]
+
+# 合成视频中绘制的字幕（cv2 内置字体只支持 ASCII）
+VIDEO_CAPTIONS = [
+    "Welcome to the benchmark",
+    "Subtitle number two",
+    "The quick brown fox",
+    "jumps over the lazy dog",
+]
+
+
+def confusion_variants():
+    """由混淆集得到 {正确词: [错误写法, ...]}"""
+    from text_file_corrector import CUSTOM_CONFUSION
+
+    variants = {}
+    for wrong, right in CUSTOM_CONFUSION.items():
+        if wrong != right:
+            variants.setdefault(right, []).append(wrong)
+    return variants
+
+
+def generate_corpus(num_lines, error_rate=0.2, seed=42):
+    """
+    生成合成语料
+    Args:
+        num_lines: 行数
+        error_rate: 每个填充词被替换为错误写法的概率
+        seed: 随机种子
+    Returns:
+        (noisy_lines, clean_lines)
+    """
+    rng = random.Random(seed)
+    variants = confusion_variants()
+    words = sorted(variants)
+    noisy_lines, clean_lines = [], []
+    for _ in range(num_lines):
+        template = rng.choice(SENTENCE_TEMPLATES)
+        slots = [rng.choice(words) for _ in range(template.count("{}"))]
+        noisy = [rng.choice(variants[word]) if rng.random() < error_rate else word for word in slots]
+        clean_lines.append(template.format(*slots))
+        noisy_lines.append(template.format(*noisy))
+    return noisy_lines, clean_lines
+
+
+def generate_video(file_path, num_frames=300, fps=30, size=(640, 360), caption_frames=60, seed=42):
+    """
+    用 cv2 生成带字幕的合成视频，每 caption_frames 帧换一条字幕，每隔一条留空
+    Returns:
+        list[(start, end, caption)]: 实际绘制的字幕及起止时间
+    """
+    import cv2
+    import numpy as np
+
+    rng = random.Random(seed)
+    width, height = size
+    writer = cv2.VideoWriter(file_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    captions = []
+    current = None
+    for index in range(num_frames):
+        block = index // caption_frames
+        if index % caption_frames == 0:
+            current = rng.choice(VIDEO_CAPTIONS) if block % 2 == 0 else None
+            if current:
+                captions.append([index / fps, (index + caption_frames) / fps, current])
+        frame = np.full((height, width, 3), 30 + (index % 50), dtype=np.uint8)
+        if current:
+            cv2.putText(frame, current, (20, height - 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+    return [tuple(caption) for caption in captions]
+
+
+class MockDashScopeHandler(BaseHTTPRequestHandler):
+    """模拟 DashScope 兼容模式的 /chat/completions 接口"""
+
+    latency = 0.0
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length).decode("utf-8"))
+        time.sleep(self.latency)
+
+        content = request["messages"][-1]["content"]
+        if isinstance(content, list):
+            images = sum(1 for part in content if part.get("type") == "image_url")
+            if images == 1:
+                reply = "模拟字幕文本"
+            else:
+                reply = "\n".join(f"===第{i}张===\n模拟字幕文本" for i in range(1, images + 1))
+            prompt_tokens = 1000 * images
+        else:
+            # 改写请求：原样返回提示词中的原文部分
+            reply = content.split("：\n\n", 1)[-1]
+            prompt_tokens = len(content)
+
+        body = json.dumps({
+            "id": "mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply),
+                      "total_tokens": prompt_tokens + len(reply)},
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(latency=0.0):
+    """在后台线程启动模拟接口，返回 (server, base_url)"""
+    handler = type("MockHandler", (MockDashScopeHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/compatible-mode/v1"
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 2)
+
+
+def bench_models(lines, clean_lines, model_names, strategies, backend="torch", onnx_dir="models/macbert_onnx"):
+    """各模型及各集成策略的吞吐（行/秒）和整行纠正率"""
+    from text_file_corrector import TextFileCorrector
+
+    results = {}
+    for model_name in model_names:
+        corrector = TextFileCorrector(use_models=[model_name], backend=backend, onnx_dir=onnx_dir)
+        if model_name not in corrector.available_models:
+            print(f"跳过不可用的模型: {model_name}")
+            continue
+        start = time.perf_counter()
+        outputs = [corrector.correct_single_model(line, model_name)["target"] for line in lines]
+        elapsed = time.perf_counter() - start
+        results[f"model.{model_name}.lines_per_second"] = round(len(lines) / elapsed, 3)
+        results[f"model.{model_name}.exact_match_rate"] = round(
+            sum(out == clean for out, clean in zip(outputs, clean_lines)) / len(lines), 4)
+
+    if strategies and len(model_names) > 1:
+        corrector = TextFileCorrector(use_models=model_names, backend=backend, onnx_dir=onnx_dir)
+        for strategy in strategies:
+            start = time.perf_counter()
+            outputs = [corrector.correct_text(line, strategy=strategy) for line in lines]
+            elapsed = time.perf_counter() - start
+            results[f"strategy.{strategy}.lines_per_second"] = round(len(lines) / elapsed, 3)
+            results[f"strategy.{strategy}.exact_match_rate"] = round(
+                sum(out == clean for out, clean in zip(outputs, clean_lines)) / len(lines), 4)
+    return results
+
+
+def bench_frame_extraction(video_path, frame_interval=30, text_threshold=0.002):
+    """抽帧吞吐（解码帧/秒），以及开启文字预判后跳过的帧数"""
+    import cv2
+    from integrated_corrector import extract_frames_from_video
+
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    output_dir = tempfile.mkdtemp(prefix="bench_frames_")
+    start = time.perf_counter()
+    frames = extract_frames_from_video(video_path, output_dir=output_dir, frame_interval=frame_interval)
+    elapsed = time.perf_counter() - start
+    filtered = extract_frames_from_video(video_path, output_dir=output_dir, frame_interval=frame_interval,
+                                         text_threshold=text_threshold)
+    for frame_path in {frame_path for frame_path, _ in frames + filtered}:
+        os.remove(frame_path)
+    os.rmdir(output_dir)
+    return {
+        "video.frames_per_second": round(total_frames / elapsed, 3),
+        "video.sampled_frames": len(frames),
+        "video.frames_after_text_filter": len(filtered),
+    }
+
+
+def bench_end_to_end(text_path, video_path, model_names, latency):
+    """通过本地模拟接口运行批量流水线，记录每个文件的端到端耗时"""
+    server, base_url = start_mock_server(latency=latency)
+    os.environ["DASHSCOPE_BASE_URL"] = base_url
+    os.environ.setdefault("DASHSCOPE_API_KEY", "mock-key")
+    try:
+        from batch_corrector import BatchCorrector
+
+        output_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+        batch = BatchCorrector(output_dir=output_dir, use_models=model_names)
+        files = [path for path in (text_path, video_path) if path]
+        try:
+            report = batch.run(files)
+        finally:
+            batch.close()
+    finally:
+        server.shutdown()
+
+    results = {"e2e.total_seconds": report["wall_time"]}
+    for record in report["results"]:
+        if not record["success"]:
+            # 失败任务的耗时不是有效的延迟，只计数
+            name = f"e2e.{record['type']}.failed"
+            results[name] = results.get(name, 0) + 1
+            print(f"端到端任务失败 {record['file']}: {record.get('error')}")
+            continue
+        results[f"e2e.{record['type']}.latency_seconds"] = record["wall_time"]
+    return results
+
+
+# 启动耗时测试的目标：命令行参数（在仓库目录下以 python -X importtime 运行）
+STARTUP_TARGETS = {
+    "cli_help": ["integrated_corrector.py", "--help"],
+    "confusion_corrector": ["-c", "from text_file_corrector import TextFileCorrector; "
+                                  "TextFileCorrector(use_models=['confusion'])"],
+    "service_import": ["-c", "import correction_server"],
+}
+
+# 这些包出现在启动过程中说明懒加载失效
+HEAVY_MODULES = ("torch", "transformers", "paddle", "pycorrector", "cv2", "numpy", "openai")
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+    Returns:
+        dict: 顶层导入的模块名 → 累计耗时（微秒），以及所有出现过的模块名集合
+    """
+    top_level = {}
+    imported = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        imported.add(name.strip())
+        # 模块名前只有一个空格的是顶层导入，嵌套导入逐级多两个空格
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(parts[1])
+    return top_level, imported
+
+
+def bench_startup(runs=3, top=5):
+    """测量各入口的启动耗时（取中位数），并列出累计耗时最多的顶层导入"""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, argv in STARTUP_TARGETS.items():
+        durations = []
+        proc = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=repo_dir,
+                                  capture_output=True, text=True, encoding="utf-8", errors="replace")
+            durations.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            print(f"启动测试 {name} 失败（退出码 {proc.returncode}），已跳过")
+            continue
+
+        top_level, imported = parse_importtime(proc.stderr)
+        results[f"startup.{name}.seconds"] = round(statistics.median(durations), 4)
+        heavy = sorted(module for module in HEAVY_MODULES
+                       if any(item == module or item.startswith(module + ".") for item in imported))
+        print(f"启动 {name}: {statistics.median(durations) * 1000:.1f}ms"
+              + (f"，加载了重依赖: {', '.join(heavy)}" if heavy else ""))
+        for module, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:top]:
+            print(f"  {cumulative / 1000:8.1f}ms  {module}")
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.1):
+    """
+    与基线对比，返回变差超过 tolerance 的指标列表
+    名称以 per_second / rate 结尾的指标越大越好，其余（耗时、内存）越小越好
+    """
+    regressions = []
+    print(f"\n{'指标':<45}{'基线':>12}{'本次':>12}{'变化':>10}")
+    for name, value in sorted(results.items()):
+        if name.startswith("config.") or name not in baseline:
+            continue
+        if not isinstance(value, (int, float)) or not baseline[name]:
+            continue
+        old = baseline[name]
+        change = (value - old) / old
+        higher_is_better = name.endswith("per_second") or name.endswith("rate")
+        worse = -change if higher_is_better else change
+        flag = "  ← 回退" if worse > tolerance else ""
+        print(f"{name:<45}{old:>12}{value:>12}{change:>+10.1%}{flag}")
+        if worse > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="纠错与OCR流水线基准测试")
+    parser.add_argument("--lines", type=int, default=200, help="合成语料行数")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="合成语料的错误注入比例")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--models", default="confusion,kenlm", help="逗号分隔的模型列表")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch", help="MacBERT 推理后端")
+    parser.add_argument("--onnx-dir", default="models/macbert_onnx", help="ONNX 模型目录")
+    parser.add_argument("--strategies", default="voting,pipeline", help="逗号分隔的集成策略")
+    parser.add_argument("--video-frames", type=int, default=300, help="合成视频帧数，0 表示跳过视频相关测试")
+    parser.add_argument("--mock-latency", type=float, default=0.05, help="模拟接口的响应延迟（秒）")
+    parser.add_argument("--skip-e2e", action="store_true", help="跳过端到端测试")
+    parser.add_argument("--startup-runs", type=int, default=3, help="启动耗时测试的重复次数，0 表示跳过")
+    parser.add_argument("--startup-only", action="store_true", help="只运行启动耗时测试")
+    parser.add_argument("--output", help="把结果写入该 JSON 文件")
+    parser.add_argument("--save-baseline", help="把结果保存为基线文件")
+    parser.add_argument("--compare", help="与该基线文件对比")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的相对变差幅度")
+    parser.add_argument("--fail-on-regression", action="store_true", help="出现回退时以非零状态退出")
+    args = parser.parse_args()
+
+    model_names = [name.strip() for name in args.models.split(",") if name.strip()]
+    strategies = [name.strip() for name in args.strategies.split(",") if name.strip()]
+
+    results = {"config.lines": args.lines, "config.error_rate": args.error_rate, "config.seed": args.seed,
+               "config.backend": args.backend}
+    # 启动耗时在子进程中测量，先于本进程加载任何模型
+    if args.startup_runs > 0 or args.startup_only:
+        results.update(bench_startup(max(args.startup_runs, 1)))
+
+    if not args.startup_only:
+        work_dir = tempfile.mkdtemp(prefix="bench_")
+        noisy_lines, clean_lines = generate_corpus(args.lines, args.error_rate, args.seed)
+        text_path = os.path.join(work_dir, "corpus.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(noisy_lines) + "\n")
+
+        results.update(bench_models(noisy_lines, clean_lines, model_names, strategies,
+                                    args.backend, args.onnx_dir))
+
+        video_path = None
+        if args.video_frames > 0:
+            video_path = os.path.join(work_dir, "synthetic.mp4")
+            generate_video(video_path, num_frames=args.video_frames, seed=args.seed)
+            results.update(bench_frame_extraction(video_path))
+
+        if not args.skip_e2e:
+            results.update(bench_end_to_end(text_path, video_path, model_names, args.mock_latency))
+
+        results["process.peak_rss_mb"] = peak_rss_mb()
+
+    print("\n基准测试结果:")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"结果已保存到 {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项回退: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\n未发现超出容差的回退")
+
+    failed = sum(value for name, value in results.items() if name.startswith("e2e.") and name.endswith(".failed"))
+    if failed:
+        print(f"\n{failed} 个端到端任务失败，结果不可作为有效的基准")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
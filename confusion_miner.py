@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+从历史纠错结果中挖掘混淆集
+
+内置的 CUSTOM_CONFUSION 很小，大部分错误要靠 MacBERT/ERNIE/大模型才能改对。
+这里读取以往运行的逐行明细，找出多个模型（或大模型）一致做出的同一处替换，
+按出现次数排序，并用"该错词出现时被改正的比例"过滤掉有歧义的词，导出为混淆集文件。
+之后用 --confusion-dict 加载，反复出现的错误在几乎零开销的混淆集阶段就能改正：
+混淆集最先运行，一行中只命中挖掘出的词条时直接采用其结果，不再运行 kenlm/macbert/ernie。
+
+# 从第一次纠错明细和视频/批量结果中挖掘
+python confusion_miner.py correction_details.jsonl corrected_results.jsonl batch_output/*_results.jsonl \\
+    -o learned_confusion.txt --min-agreement 2 --min-count 3
+# 使用挖掘出的混淆集
+python integrated_corrector.py input.txt --confusion-dict learned_confusion.txt
+
+支持的记录格式：
+- correct_file 的明细（source + models）
+- integrated_corrector 的 corrected_results.jsonl（ocr_text + corrections + final_text，final_text 记为 llm）
+- 批量模式的 *_results.jsonl（ocr_text + final_text）
+"""
+import re
+import sys
+import glob
+import json
+import difflib
+import argparse
+from collections import Counter, defaultdict
+
+# 混淆集阶段本身的结果不参与投票，否则已有的词条会自我强化
+EXCLUDED_VOTERS = ("confusion",)
+
+CJK_PATTERN = re.compile(r"^[一-鿿]+$")
+
+
+def load_confusion(path):
+    """
+    读取混淆集文件：每行 "错词 正词"（其后的字段忽略），# 开头为注释
+    Returns:
+        dict: {错词: 正词}
+    """
+    confusion = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 2 and not fields[0].startswith("#"):
+                confusion[fields[0]] = fields[1]
+    return confusion
+
+
+def iter_records(paths):
+    """逐条读取 JSONL 记录，返回 (原文, {投票者: 纠错后文本})"""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                source = record.get("source", record.get("ocr_text"))
+                if not source:
+                    continue
+                voters = dict(record.get("models") or record.get("corrections") or {})
+                if record.get("final_text"):
+                    voters["llm"] = record["final_text"]
+                yield source, voters
+
+
+def extract_spans(source, target, max_span=4, min_length=2):
+    """
+    找出 target 相对 source 的等长汉字替换
+    单字替换向左、右各扩展一个字作为上下文，生成两个候选词条（单字混淆集误伤太多）
+    Returns:
+        list[(位置, 错词, 正词)]：位置为错词在 source 中的起点
+    """
+    spans = []
+    matcher = difflib.SequenceMatcher(None, source, target, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "replace" or i2 - i1 != j2 - j1 or i2 - i1 > max_span:
+            continue
+        replacement = target[j1:j2]
+        if not CJK_PATTERN.match(source[i1:i2]) or not CJK_PATTERN.match(replacement):
+            continue
+        if i2 - i1 >= min_length:
+            spans.append((i1, source[i1:i2], replacement))
+            continue
+        padding = min_length - (i2 - i1)
+        for start, end in ((i1 - padding, i2), (i1, i2 + padding)):
+            if start < 0 or end > len(source) or not CJK_PATTERN.match(source[start:end]):
+                continue
+            wrong = source[start:end]
+            right = source[start:i1] + replacement + source[i2:end]
+            spans.append((start, wrong, right))
+    return spans
+
+
+def collect_votes(records, min_agreement=2, excluded=EXCLUDED_VOTERS):
+    """
+    统计各行中至少 min_agreement 个投票者一致做出的替换
+    Returns:
+        (Counter, dict): {(错词, 正词): 行内一致替换的次数}，{(错词, 正词): Counter(投票者)}
+    """
+    counts = Counter()
+    supporters = defaultdict(Counter)
+    for source, voters in records:
+        votes = defaultdict(set)
+        for voter, target in voters.items():
+            if voter in excluded or not target or target == source:
+                continue
+            for position, wrong, right in extract_spans(source, target):
+                votes[(position, wrong, right)].add(voter)
+        for (_, wrong, right), names in votes.items():
+            if len(names) >= min_agreement:
+                counts[(wrong, right)] += 1
+                supporters[(wrong, right)].update(names)
+    return counts, supporters
+
+
+def count_occurrences(records, words):
+    """统计各错词在原文中出现的总次数（无论是否被改正，重叠出现也计数）"""
+    occurrences = Counter()
+    words_by_length = defaultdict(set)
+    for word in words:
+        words_by_length[len(word)].add(word)
+    for source, _ in records:
+        for length, candidates in words_by_length.items():
+            for start in range(len(source) - length + 1):
+                if source[start:start + length] in candidates:
+                    occurrences[source[start:start + length]] += 1
+    return occurrences
+
+
+def mine_confusion(paths, min_agreement=2, min_count=2, min_precision=0.9, existing=None):
+    """
+    挖掘混淆集词条
+    Args:
+        paths: JSONL 文件列表
+        min_agreement: 同一行中至少多少个投票者（模型/大模型）做出同一替换
+        min_count: 一致替换至少出现的次数
+        min_precision: 错词出现时被改成该正词的比例下限，过滤本身也是正确用法的词
+        existing: 已有的混淆集，已包含的词条不再输出
+    Returns:
+        list[dict]: 按次数降序的词条 {wrong, right, count, occurrences, precision, voters}
+    """
+    existing = existing or {}
+    counts, supporters = collect_votes(iter_records(paths), min_agreement=min_agreement)
+    candidates = {pair: count for pair, count in counts.items()
+                  if count >= min_count and existing.get(pair[0]) != pair[1]}
+    occurrences = count_occurrences(iter_records(paths), {wrong for wrong, _ in candidates})
+
+    entries = []
+    used = set()
+    for (wrong, right), count in sorted(candidates.items(), key=lambda item: (-item[1], item[0])):
+        # 同一错词有多个改法时只保留次数最多的
+        if wrong in used:
+            continue
+        precision = count / max(occurrences[wrong], count)
+        if precision < min_precision:
+            continue
+        used.add(wrong)
+        entries.append({
+            "wrong": wrong,
+            "right": right,
+            "count": count,
+            "occurrences": occurrences[wrong],
+            "precision": round(precision, 4),
+            "voters": dict(supporters[(wrong, right)]),
+        })
+    return entries
+
+
+def export_confusion(entries, path, top=None):
+    """写出混淆集文件：每行 "错词 正词 次数 比例"，可直接用 load_confusion 读取"""
+    entries = entries[:top] if top else entries
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# 错词 正词 一致替换次数 改正比例\n")
+        for entry in entries:
+            f.write(f"{entry['wrong']} {entry['right']} {entry['count']} {entry['precision']}\n")
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从历史纠错结果中挖掘混淆集")
+    parser.add_argument("inputs", nargs="+", help="JSONL 明细/结果文件或通配符")
+    parser.add_argument("-o", "--output", default="learned_confusion.txt", help="输出的混淆集文件")
+    parser.add_argument("--min-agreement", type=int, default=2, help="同一行中至少多少个模型做出同一替换")
+    parser.add_argument("--min-count", type=int, default=2, help="一致替换至少出现的次数")
+    parser.add_argument("--min-precision", type=float, default=0.9, help="错词出现时被改正的比例下限")
+    parser.add_argument("--top", type=int, help="最多输出的词条数")
+    parser.add_argument("--existing", help="已有的混淆集文件，已包含的词条不再输出")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for spec in args.inputs:
+        paths.extend(sorted(glob.glob(spec)) if glob.has_magic(spec) else [spec])
+    existing = load_confusion(args.existing) if args.existing else None
+    entries = mine_confusion(paths, min_agreement=args.min_agreement, min_count=args.min_count,
+                             min_precision=args.min_precision, existing=existing)
+    written = export_confusion(entries, args.output, top=args.top)
+    for entry in entries[:20]:
+        print(f"  {entry['wrong']} → {entry['right']}  次数 {entry['count']}  比例 {entry['precision']}  "
+              f"{entry['voters']}")
+    print(f"从 {len(paths)} 个文件中挖掘出 {written} 个词条，已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
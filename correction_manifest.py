@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+增量纠错的旁路清单
+
+编辑修改 OCR 文本后重新提交同一个文件时，没有变化的行不必再过一遍模型。
+清单与输出文件放在一起（<输出文件>.manifest.json），按行内容的哈希记录上一次各策略的纠错结果
+和各模型的结果；再次运行时，哈希命中的行直接复用，只有新插入或改动过的行交给模型，
+耗时与改动量成正比，而不是与文件长度成正比。
+
+纠错器配置（模型列表、规范化、切分长度等）与清单记录的不一致时整个清单作废，所有行重新纠错。
+"""
+import hashlib
+import json
+import os
+
+# 2: 纠错结果放回原文，不再返回规范化后的文本
+MANIFEST_VERSION = 2
+
+
+def manifest_path_for(output_file_path):
+    """输出文件对应的清单路径"""
+    return f"{output_file_path}.manifest.json"
+
+
+def line_hash(line):
+    """行内容的哈希（去掉首尾空白后计算）"""
+    return hashlib.blake2b(line.strip().encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CorrectionManifest:
+    """上一次运行的逐行纠错结果，按行内容哈希索引"""
+
+    def __init__(self, path, config, encoding="utf-8"):
+        """
+        Args:
+            path: 清单文件路径，不存在时从空清单开始
+            config: 纠错器配置，与清单中记录的不一致时不复用任何结果
+            encoding: 清单文件编码
+        """
+        self.path = path
+        # 按 JSON 往返后的形式保存，元组等类型与读回的清单比较时才一致
+        self.config = json.loads(json.dumps(config, ensure_ascii=False))
+        self.encoding = encoding
+        self.previous = {}
+        self.current = {}
+        self.reused = 0
+        self.corrected = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding=self.encoding) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取增量清单失败，将重新纠错所有行: {e}")
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("config") != self.config:
+            print("纠错器配置已变化，增量清单作废")
+            return
+        self.previous = data.get("entries", {})
+
+    def lookup(self, line, strategies):
+        """
+        查找该行上一次的结果
+        Returns:
+            (dict, dict) 或 None: ({策略名: 纠错后文本}, {模型名: 纠错后文本})；
+                                  未命中或缺少某个策略的结果时返回 None
+        """
+        key = line_hash(line)
+        entry = self.current.get(key) or self.previous.get(key)
+        if entry is None or any(strategy not in entry["targets"] for strategy in strategies):
+            return None
+        self.current[key] = entry
+        self.reused += 1
+        return {strategy: entry["targets"][strategy] for strategy in strategies}, entry["models"]
+
+    def store(self, line, targets, models):
+        """记录本次新纠错的行"""
+        self.current[line_hash(line)] = {"targets": dict(targets), "models": dict(models or {})}
+        self.corrected += 1
+
+    def save(self):
+        """只保留本次输入中出现的行，先写临时文件再替换，避免中断时留下半个清单"""
+        data = {"version": MANIFEST_VERSION, "config": self.config, "entries": self.current}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding=self.encoding) as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def stats(self):
+        return {"manifest_path": self.path, "reused_lines": self.reused, "corrected_lines": self.corrected}
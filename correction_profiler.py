@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+文件纠错的性能剖析
+
+记录每一行、每个模型的耗时，保留最慢的 N 行及其文本；
+可选地用 cProfile 或采样剖析器包裹整个运行，最终写出文本报告。
+"""
+import io
+import sys
+import time
+import heapq
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+
+class LineProfiler:
+    """逐行、逐模型耗时记录"""
+
+    def __init__(self, top_n=20):
+        self.top_n = top_n
+        self.slowest = []           # 小根堆: (耗时, 行号, 文本, {模型: 耗时})
+        self.model_totals = Counter()
+        self.model_calls = Counter()
+        self.line_count = 0
+        self.total_time = 0.0
+        self._current = None
+
+    def start_line(self, line_number, text):
+        self._current = (line_number, text, time.perf_counter(), {})
+
+    def record_model(self, model_name, elapsed):
+        """由 TextFileCorrector.correct_single_model 调用"""
+        self.model_totals[model_name] += elapsed
+        self.model_calls[model_name] += 1
+        if self._current is not None:
+            model_times = self._current[3]
+            model_times[model_name] = model_times.get(model_name, 0.0) + elapsed
+
+    def end_line(self):
+        if self._current is None:
+            return
+        line_number, text, started, model_times = self._current
+        elapsed = time.perf_counter() - started
+        self._current = None
+        self.line_count += 1
+        self.total_time += elapsed
+        entry = (elapsed, line_number, text, model_times)
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, entry)
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def report(self):
+        """生成文本报告"""
+        lines = ["逐行纠错耗时报告", "=" * 60,
+                 f"处理行数: {self.line_count}",
+                 f"总耗时: {self.total_time:.3f}s",
+                 f"平均每行: {self.total_time / self.line_count * 1000:.2f}ms" if self.line_count else "平均每行: -",
+                 "", "各模型耗时:"]
+        for model_name, total in self.model_totals.most_common():
+            calls = self.model_calls[model_name]
+            lines.append(f"  {model_name:<10} 总计 {total:.3f}s  调用 {calls} 次  平均 {total / calls * 1000:.2f}ms")
+
+        lines += ["", f"最慢的 {len(self.slowest)} 行:"]
+        for elapsed, line_number, text, model_times in sorted(self.slowest, reverse=True):
+            detail = ", ".join(f"{name} {seconds * 1000:.1f}ms"
+                               for name, seconds in sorted(model_times.items(), key=lambda item: -item[1]))
+            preview = text if len(text) <= 60 else text[:60] + "..."
+            lines.append(f"  第 {line_number} 行  {elapsed * 1000:.1f}ms  [{detail}]")
+            lines.append(f"    {preview}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """采样剖析器：后台线程定期采集目标线程的调用栈，统计各函数出现的次数"""
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = 0
+        self.function_counts = Counter()   # 出现在栈中任意位置
+        self.leaf_counts = Counter()       # 位于栈顶
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                if leaf:
+                    self.leaf_counts[key] += 1
+                    leaf = False
+                if key not in seen:
+                    self.function_counts[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self, top=30):
+        if not self.samples:
+            return "采样剖析: 无样本"
+        lines = [f"采样剖析（间隔 {self.interval * 1000:.1f}ms，共 {self.samples} 个样本）", "", "栈顶函数:"]
+        for key, count in self.leaf_counts.most_common(top):
+            lines.append(f"  {count / self.samples:6.1%}  {key}")
+        lines += ["", "累计（出现在调用栈中）:"]
+        for key, count in self.function_counts.most_common(top):
+            lines.append(f"  {count / self.samples:6.1%}  {key}")
+        return "\n".join(lines)
+
+
+class RunProfiler:
+    """包裹一次完整运行：'cprofile'、'sampling' 或 None（只做逐行统计）"""
+
+    def __init__(self, mode=None, sample_interval=0.005):
+        if mode not in (None, "cprofile", "sampling"):
+            raise ValueError(f"不支持的剖析方式: {mode}")
+        self.mode = mode
+        self.profiler = None
+        if mode == "cprofile":
+            self.profiler = cProfile.Profile()
+        elif mode == "sampling":
+            self.profiler = SamplingProfiler(interval=sample_interval)
+
+    def start(self):
+        if self.mode == "cprofile":
+            self.profiler.enable()
+        elif self.mode == "sampling":
+            self.profiler.start()
+
+    def stop(self):
+        if self.mode == "cprofile":
+            self.profiler.disable()
+        elif self.mode == "sampling":
+            self.profiler.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def report(self, top=30):
+        if self.mode == "cprofile":
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(top)
+            return "cProfile（按累计耗时排序）\n" + stream.getvalue()
+        if self.mode == "sampling":
+            return self.profiler.report(top)
+        return ""
+
+
+def write_profile_report(file_path, line_profiler, run_profiler=None, encoding="utf-8"):
+    """写出剖析报告"""
+    sections = [line_profiler.report()]
+    if run_profiler is not None and run_profiler.mode:
+        sections.append(run_profiler.report())
+    with open(file_path, "w", encoding=encoding) as f:
+        f.write(("\n\n" + "=" * 60 + "\n\n").join(sections) + "\n")
+    return file_path
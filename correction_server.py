@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+"""
+常驻纠错服务
+
+模型和 API 客户端只在启动时加载一次，之后通过本地 HTTP 接口接收任务，
+避免每个小任务都重新导入 pycorrector、加载模型、创建客户端。
+
+# 启动服务
+python correction_server.py --port 8765 --models kenlm,confusion
+
+# 提交任务（同步返回结果和各阶段耗时）
+curl -X POST http://127.0.0.1:8765/jobs -d '{"type": "text", "text": "少先队员因该为老人让坐"}'
+curl -X POST http://127.0.0.1:8765/jobs -d '{"type": "image", "path": "image.png", "llm": true}'
+# 交互式调用：300 毫秒内返回已得到的最好结果，skipped_stages 说明跳过了哪些阶段
+# （设置 deadline_ms 时各阶段按固定顺序依次应用，相当于 pipeline 策略，不支持其他 strategy）
+curl -X POST http://127.0.0.1:8765/jobs -d '{"type": "text", "text": "少先队员因该为老人让坐", "llm": true, "deadline_ms": 300}'
+curl -X POST http://127.0.0.1:8765/jobs -d '{"type": "video", "path": "video.mp4"}'
+
+# 查看服务状态和各阶段统计（Prometheus 文本格式）
+curl http://127.0.0.1:8765/health
+curl http://127.0.0.1:8765/metrics
+"""
+import sys
+import json
+import time
+import queue
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline_metrics import metrics
+
+JOB_TYPES = ("text", "image", "video")
+
+
+class Job:
+    """一个待处理的任务"""
+
+    def __init__(self, job_type, payload, strategy="pipeline", llm=False, deadline_ms=None):
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"不支持的任务类型: {job_type}")
+        self.job_type = job_type
+        self.payload = payload
+        self.strategy = strategy
+        self.llm = llm
+        self.submitted_at = time.time()
+        # 截止时间（time.monotonic()），从提交时开始计时，排队时间也计算在内
+        self.deadline = time.monotonic() + deadline_ms / 1000 if deadline_ms else None
+        self.timings = {}
+        self.result = None
+        self.done = threading.Event()
+
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+
+    def wait(self, timeout=None):
+        """等待任务完成，超时返回 None"""
+        if not self.done.wait(timeout):
+            return None
+        return self.result
+
+
+class CorrectionService:
+    """
+    常驻纠错服务
+    所有任务经由有界队列交给单个工作线程处理（模型不保证线程安全），
+    工作线程每次最多取出 max_batch_size 个任务，跨任务去重后统一纠错（微批处理）
+    """
+
+    def __init__(self, corrector=None, use_models=None, ocr_func=None, rewrite_func=None,
+                 video_ocr_func=None, max_queue_size=64, max_batch_size=16, batch_wait=0.01):
+        """
+        Args:
+            corrector: 已初始化的 TextFileCorrector（可选，默认按 use_models 创建）
+            use_models: 创建 TextFileCorrector 时使用的模型列表
+            ocr_func: 图片识别函数 path -> text（默认 Recognition.recognize_image）
+            rewrite_func: 二级纠错函数 text -> text（默认 QwenRewrite.rewrite_text）
+            video_ocr_func: 视频识别函数 path -> [(text, start, end)]（默认逐帧调用 ocr_func）
+            max_queue_size: 队列容量，队列满时拒绝新任务
+            max_batch_size: 每个微批最多合并的任务数
+            batch_wait: 取到第一个任务后等待更多任务加入同一微批的时间（秒）
+        """
+        if corrector is None:
+            from text_file_corrector import TextFileCorrector
+            corrector = TextFileCorrector(use_models=use_models)
+        self.corrector = corrector
+        self.ocr_func = ocr_func
+        self.rewrite_func = rewrite_func
+        self.video_ocr_func = video_ocr_func
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.worker = None
+        self.running = False
+        self.stats = {"jobs": 0, "batches": 0, "lines": 0, "unique_lines": 0, "failed": 0}
+
+    def _get_ocr_func(self):
+        if self.ocr_func is None:
+            from Recognition import recognize_image
+            self.ocr_func = recognize_image
+        return self.ocr_func
+
+    def _get_rewrite_func(self):
+        if self.rewrite_func is None:
+            from QwenRewrite import rewrite_text
+            self.rewrite_func = rewrite_text
+        return self.rewrite_func
+
+    def _get_video_ocr_func(self):
+        if self.video_ocr_func is None:
+            from integrated_corrector import ocr_video_segments
+            recognize = self._get_ocr_func()
+            self.video_ocr_func = lambda path: ocr_video_segments(
+                path, recognize, output_dir=tempfile.mkdtemp(prefix="frames_")
+            )
+        return self.video_ocr_func
+
+    def start(self):
+        """启动工作线程"""
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self._worker_loop, name="correction-worker", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """停止工作线程（处理完已取出的任务后退出），队列中剩余的任务以失败结束"""
+        self.running = False
+        if self.worker is not None:
+            # 队列满时放不进结束标记，工作线程在下一次取任务超时后检查 running 退出
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self.worker.join()
+            self.worker = None
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.finish({"success": False, "error": "服务已停止", "timings": _round_timings(job.timings)})
+
+    def submit(self, job_type, payload, strategy="pipeline", llm=False, deadline_ms=None):
+        """
+        提交任务，队列已满时抛出 queue.Full，策略未注册时抛出 ValueError
+        Args:
+            deadline_ms: 截止时间（毫秒），设置后按 confusion → kenlm → macbert → ernie → en_spell → 大模型
+                         的固定顺序只运行剩余时间内来得及完成的阶段（见 deadline_scheduler.py），
+                         只能与 pipeline 策略一起使用；纠错器不支持截止时间时抛出 ValueError
+        Returns:
+            Job
+        """
+        from text_file_corrector import check_strategies
+        check_strategies([strategy])
+        if deadline_ms is not None:
+            if not hasattr(self.corrector, "correct_with_deadline"):
+                raise ValueError("当前纠错器不支持 deadline_ms")
+            if strategy != "pipeline":
+                raise ValueError(f"设置 deadline_ms 时各阶段按固定顺序应用，不支持 strategy={strategy}")
+        job = Job(job_type, payload, strategy=strategy, llm=llm, deadline_ms=deadline_ms)
+        self.queue.put_nowait(job)
+        return job
+
+    def run(self, job_type, payload, strategy="pipeline", llm=False, timeout=None, deadline_ms=None):
+        """提交任务并等待结果"""
+        return self.submit(job_type, payload, strategy=strategy, llm=llm, deadline_ms=deadline_ms).wait(timeout)
+
+    def _worker_loop(self):
+        while self.running:
+            try:
+                job = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if job is None:
+                break
+            batch = [job]
+            batch_deadline = time.time() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                remaining = batch_deadline - time.time()
+                try:
+                    next_job = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_job is None:
+                    self.running = False
+                    break
+                batch.append(next_job)
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                # 工作线程只有一个，不能因为一个微批出错而退出，否则之后的任务都会一直等到超时
+                for failed_job in batch:
+                    if not failed_job.done.is_set():
+                        self.stats["failed"] += 1
+                        failed_job.finish({"success": False, "error": f"处理失败: {e}",
+                                           "timings": _round_timings(failed_job.timings)})
+
+    def _process_batch(self, batch):
+        """处理一个微批：先取得各任务的文本，再跨任务去重后统一纠错"""
+        started = time.time()
+        self.stats["batches"] += 1
+        job_lines = {}
+
+        # 第一阶段：获取文本（图片/视频需要OCR）
+        for job in batch:
+            job.timings["queue_wait"] = started - job.submitted_at
+            stage_start = time.time()
+            try:
+                if job.job_type == "text":
+                    job.segments = None
+                    job_lines[job] = job.payload.split("\n")
+                elif job.job_type == "image":
+                    text = self._get_ocr_func()(job.payload) or ""
+                    job.segments = None
+                    job_lines[job] = [] if text.strip() == "无文字内容" else text.strip().split("\n")
+                else:
+                    job.segments = self._get_video_ocr_func()(job.payload)
+                    job_lines[job] = [text for text, _, _ in job.segments]
+                if job.job_type != "text":
+                    job.timings["ocr"] = time.time() - stage_start
+            except Exception as e:
+                self.stats["failed"] += 1
+                job.finish({"success": False, "error": f"识别失败: {e}", "timings": _round_timings(job.timings)})
+
+        pending = [job for job in batch if job in job_lines]
+        # 有截止时间的任务单独按截止时间调度，不参与跨任务去重
+        deadline_jobs = [job for job in pending if job.deadline is not None]
+
+        # 第二阶段：跨任务去重后进行第一次纠错
+        stage_start = time.time()
+        # 同一行的多个策略一起计算，每个模型只运行一次
+        line_strategies = {}
+        for job in pending:
+            if job in deadline_jobs:
+                continue
+            for line in job_lines[job]:
+                line = line.strip()
+                if line and job.strategy not in line_strategies.setdefault(line, []):
+                    line_strategies[line].append(job.strategy)
+        corrected = {}
+        # 出错的行只让包含它的任务失败
+        failed_lines = {}
+        for line, strategies in line_strategies.items():
+            try:
+                for strategy, target in self.corrector.correct_text_multi(line, strategies).items():
+                    corrected[(line, strategy)] = target
+            except Exception as e:
+                failed_lines[line] = e
+        correction_time = time.time() - stage_start
+        self.stats["lines"] += sum(len(lines) for lines in job_lines.values())
+        self.stats["unique_lines"] += len(corrected)
+
+        # 第三阶段：可选的大模型二级纠错，然后返回结果
+        for job in pending:
+            try:
+                failed = next((failed_lines[line.strip()] for line in job_lines[job]
+                               if line.strip() in failed_lines), None)
+                if failed is not None:
+                    raise failed
+                self._finish_job(job, job_lines[job], job in deadline_jobs, corrected, correction_time, len(batch))
+            except Exception as e:
+                self.stats["failed"] += 1
+                job.finish({"success": False, "error": f"纠错失败: {e}", "timings": _round_timings(job.timings)})
+
+    def _finish_job(self, job, job_lines, with_deadline, corrected, correction_time, batch_size):
+        """对一个任务完成纠错（截止时间任务逐行调度）、可选的二级纠错，并返回结果"""
+        skipped_stages = None
+        if with_deadline:
+            stage_start = time.time()
+            lines, skipped_stages = self._correct_before_deadline(job, job_lines)
+            job.timings["correction"] = time.time() - stage_start
+        else:
+            job.timings["correction"] = correction_time
+            lines = [corrected.get((line.strip(), job.strategy), line.strip()) for line in job_lines]
+        text = "\n".join(lines)
+        result = {"success": True, "type": job.job_type, "first_pass_text": text}
+        if skipped_stages is not None and job.llm and text.strip():
+            # 剩余时间不够一次大模型请求时跳过二级纠错
+            remaining = job.deadline - time.monotonic()
+            if remaining <= 0:
+                skipped_stages["llm"] = "deadline"
+            elif self.corrector.latency.estimate("llm") > remaining:
+                skipped_stages["llm"] = "budget"
+        if job.llm and text.strip() and "llm" not in (skipped_stages or {}):
+            stage_start = time.time()
+            try:
+                text = self._get_rewrite_func()(text)
+            except Exception as e:
+                result["llm_error"] = str(e)
+            job.timings["llm_rewrite"] = time.time() - stage_start
+            # 所有大模型请求的耗时都用于估计截止时间任务能否来得及请求大模型
+            if "llm_error" not in result and hasattr(self.corrector, "latency"):
+                self.corrector.latency.observe("llm", job.timings["llm_rewrite"])
+        result["text"] = text
+        if skipped_stages is not None:
+            result["skipped_stages"] = skipped_stages
+            result["deadline_met"] = time.monotonic() <= job.deadline
+        if job.segments is not None:
+            result["segments"] = _segments_with_text(job.segments, text)
+        job.timings["total"] = time.time() - job.submitted_at
+        result["timings"] = _round_timings(job.timings)
+        result["batch_size"] = batch_size
+        self.stats["jobs"] += 1
+        job.finish(result)
+
+    def _correct_before_deadline(self, job, lines):
+        """
+        按任务的截止时间逐行纠错，所有行共用同一个截止时间
+        Returns:
+            (list[str], dict): 纠错后的各行，以及 {被跳过的阶段: 原因}（任意一行跳过即记录）
+        """
+        corrected_lines = []
+        skipped_stages = {}
+        for line in lines:
+            line = line.strip()
+            if not line:
+                corrected_lines.append(line)
+                continue
+            line_result = self.corrector.correct_with_deadline(line, deadline=job.deadline)
+            corrected_lines.append(line_result["target"])
+            for stage, reason in line_result["skipped"].items():
+                skipped_stages.setdefault(stage, reason)
+        return corrected_lines, skipped_stages
+
+    def health(self):
+        """服务状态"""
+        return {
+            "running": self.running,
+            "models": list(self.corrector.available_models),
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "stats": dict(self.stats),
+        }
+
+
+def _segments_with_text(segments, corrected_text):
+    """把纠错后的文本按对齐结果放回视频各时间段"""
+    from line_aligner import align_to_segments
+
+    aligned = align_to_segments([text for text, _, _ in segments], corrected_text)
+    return [
+        {"start": round(start, 3), "end": round(end, 3), "ocr_text": text, "text": final_text}
+        for (text, start, end), final_text in zip(segments, aligned)
+    ]
+
+
+def _round_timings(timings):
+    return {stage: round(seconds, 4) for stage, seconds in timings.items()}
+
+
+def make_handler(service, job_timeout=600):
+    """创建绑定到指定服务实例的 HTTP 请求处理类"""
+
+    class CorrectionRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, service.health())
+            elif self.path == "/metrics":
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length).decode("utf-8"))
+                job_type = request.get("type", "text")
+                payload = request["text"] if job_type == "text" else request["path"]
+                job = service.submit(job_type, payload,
+                                     strategy=request.get("strategy", "pipeline"),
+                                     llm=bool(request.get("llm", False)),
+                                     deadline_ms=request.get("deadline_ms"))
+            except queue.Full:
+                self._send_json(503, {"error": "任务队列已满，请稍后重试"})
+                return
+            except (KeyError, ValueError, TypeError) as e:
+                self._send_json(400, {"error": f"请求格式错误: {e}"})
+                return
+
+            result = job.wait(job_timeout)
+            if result is None:
+                self._send_json(504, {"error": "任务处理超时"})
+            else:
+                self._send_json(200 if result.get("success") else 500, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CorrectionRequestHandler
+
+
+def serve(service, host="127.0.0.1", port=8765):
+    """启动 HTTP 服务（阻塞）"""
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"纠错服务已启动: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务被用户中断")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻纠错服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--models", default="kenlm,macbert,ernie,confusion",
+                        help="逗号分隔的模型列表")
+    parser.add_argument("--queue-size", type=int, default=64, help="任务队列容量")
+    parser.add_argument("--batch-size", type=int, default=16, help="每个微批最多合并的任务数")
+    parser.add_argument("--batch-wait", type=float, default=0.01, help="微批等待时间（秒）")
+    parser.add_argument("--model-host", help="使用 model_host.py 宿主进程中的模型，而不是在本进程加载")
+    args = parser.parse_args()
+
+    corrector = None
+    if args.model_host:
+        from model_host import RemoteCorrector
+        corrector = RemoteCorrector(args.model_host)
+        print(f"已连接模型宿主 {args.model_host}，模型: {corrector.available_models}")
+
+    service = CorrectionService(
+        corrector=corrector,
+        use_models=[name.strip() for name in args.models.split(",") if name.strip()],
+        max_queue_size=args.queue_size,
+        max_batch_size=args.batch_size,
+        batch_wait=args.batch_wait,
+    )
+    if not service.corrector.available_models:
+        print("错误：没有可用的纠错模型，请检查模型安装")
+        sys.exit(1)
+
+    # 预先创建 OCR 和大模型客户端，保持常驻
+    try:
+        service._get_ocr_func()
+        service._get_rewrite_func()
+    except Exception as e:
+        print(f"API 客户端初始化失败（图片/视频及二级纠错任务将不可用）: {e}")
+
+    serve(service, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
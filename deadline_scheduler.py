@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+带截止时间的纠错调度
+
+交互式调用有延迟要求：按 confusion → kenlm → macbert → ernie → en_spell → 大模型 的顺序（大体由快到慢）
+依次应用各阶段（相当于流水线策略，设置截止时间时不使用投票等其他策略），每个阶段开始前用实测延迟（指数滑动平均）估计耗时，放不进剩余时间的阶段跳过。
+截止时间到达时返回已经得到的最好结果，并说明哪些阶段被跳过以及原因。
+
+已开始的模型调用无法中断，截止时间只在阶段之间检查；估计值偏小时实际耗时可能略超截止时间。
+
+corrector = TextFileCorrector()
+result = corrector.correct_with_deadline("少先队员因该为老人让坐", timeout=0.2)
+result["target"], result["skipped"]
+"""
+import threading
+import time
+
+# 由快到慢的阶段顺序，llm 为大模型二级纠错
+DEADLINE_ORDER = ("confusion", "kenlm", "macbert", "ernie", "en_spell", "llm")
+
+# 还没有实测数据时的单次耗时估计（秒）
+DEFAULT_LATENCY = {
+    "confusion": 0.001,
+    "kenlm": 0.02,
+    "macbert": 0.05,
+    "ernie": 0.1,
+    "en_spell": 0.01,
+    "llm": 2.0,
+}
+
+# 跳过原因
+SKIP_BUDGET = "budget"        # 估计耗时超过剩余时间
+SKIP_DEADLINE = "deadline"    # 截止时间已过
+SKIP_ERROR = "error"          # 调用出错
+
+
+class LatencyTracker:
+    """各阶段单次调用耗时的指数滑动平均"""
+
+    def __init__(self, alpha=0.2, defaults=None):
+        """
+        Args:
+            alpha: 新样本的权重，越大越快适应最近的延迟变化
+            defaults: 没有实测数据时的估计值，默认 DEFAULT_LATENCY
+        """
+        self.alpha = alpha
+        self.defaults = dict(DEFAULT_LATENCY, **(defaults or {}))
+        self.lock = threading.Lock()
+        self.estimates = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            previous = self.estimates.get(stage)
+            self.estimates[stage] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def estimate(self, stage):
+        with self.lock:
+            return self.estimates.get(stage, self.defaults.get(stage, 0.0))
+
+    def snapshot(self):
+        with self.lock:
+            return {stage: round(seconds, 6) for stage, seconds in self.estimates.items()}
+
+
+def run_with_deadline(text, stages, run_stage, deadline, tracker):
+    """
+    在截止时间前依次运行各阶段，后一阶段的输入是前一阶段的输出
+    Args:
+        text: 待纠错文本
+        stages: 可用阶段（按运行顺序）
+        run_stage: run_stage(阶段名, 输入文本) -> 纠错后文本，出错时抛出异常；耗时由 run_stage 自行记入 tracker
+        deadline: time.monotonic() 时间点
+        tracker: LatencyTracker，用于估计各阶段耗时
+    Returns:
+        dict: target（最好的结果）、stages（实际运行的阶段）、skipped（{阶段: 原因}）、elapsed、deadline_met
+    """
+    started = time.monotonic()
+    current = text
+    completed = []
+    skipped = {}
+    for index, stage in enumerate(stages):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            skipped.update((rest, SKIP_DEADLINE) for rest in stages[index:])
+            break
+        # 按当前剩余时间判断：前面的阶段比估计快时，省下的时间留给后面的阶段
+        if tracker.estimate(stage) > remaining:
+            skipped[stage] = SKIP_BUDGET
+            continue
+        try:
+            current = run_stage(stage, current)
+            completed.append(stage)
+        except Exception as e:
+            print(f"  阶段 {stage} 出错: {e}")
+            skipped[stage] = SKIP_ERROR
+
+    finished = time.monotonic()
+    return {
+        "source": text,
+        "target": current,
+        "stages": completed,
+        "skipped": skipped,
+        "elapsed": round(finished - started, 4),
+        "deadline_met": finished <= deadline,
+    }
@@ -3,7 +3,7 @@
 示例：如何从其他代码文件调用文本纠错器
 """
 
-from text_file_corrector import text_file_corrector
+from text_file_corrector import text_file_corrector, TextFileCorrector
 import os
 
 def main():
@@ -56,14 +56,17 @@ def main():
         print(f"✗ 纠错失败: {result2['error']}")
 
 def batch_correct_files(file_list):
-    """批量处理多个文件的示例"""
+    """批量处理多个文件的示例（所有文件共用一个纠错器，模型只加载一次）"""
     print("\n批量处理示例")
     print("=" * 50)
     
+    # 图片、视频混合或大批量文件可使用: python integrated_corrector.py --batch <目录>
+    corrector = TextFileCorrector(use_models=['kenlm', 'macbert', 'ernie', 'confusion'])
+    
     results = []
     for file_path in file_list:
         print(f"处理文件: {file_path}")
-        result = text_file_corrector(file_path, show_progress=False)
+        result = corrector.correct_file(file_path, show_progress=False)
         results.append(result)
         
         if result["success"]:
@@ -7,15 +7,29 @@ python integrated_corrector.py image.png
 
 # 处理视频文件
 python integrated_corrector.py video_20250612_121048.mp4
+
+# 处理视频文件，每次OCR请求合并4帧
+python integrated_corrector.py video_20250612_121048.mp4 --batch-frames 4
+
+# 批量处理目录、通配符或清单文件中的文件
+python integrated_corrector.py --batch input_dir/ "scans/*.png" --manifest files.txt --output-dir results
 """
 
 import subprocess
 import sys
 import os
-import cv2
+import json
+import argparse
 from pathlib import Path
 import shutil
 
+from line_aligner import align_to_segments
+from ocr_backends import NO_TEXT, create_ocr_backend
+from pipeline_metrics import metrics
+from segment_merger import merge_segments
+from subtitle_writer import JsonlWriter, SrtWriter, VttWriter, read_jsonl, subtitle_intervals
+from token_budget import ledger, line_priority, load_prices, planned_tokens, rewrite_within_budget
+
 # 设置控制台编码为UTF-8（解决Windows中文显示问题）
 import locale
 
@@ -125,8 +139,12 @@ def detect_file_type(file_path):
         return 'unknown'
 
 
-def extract_frames_from_video(video_path, output_dir="temp_frames", frame_interval=60):
-    """从视频中提取关键帧"""
+def extract_frames_from_video(video_path, output_dir="temp_frames", frame_interval=60, text_threshold=None):
+    """
+    从视频中提取关键帧
+    Args:
+        text_threshold: 文字存在性预判的阈值（见 text_detector.py），低于阈值的帧不保存、不做 OCR；None 或 0 表示不过滤
+    """
     import cv2
 
     if not os.path.exists(video_path):
@@ -151,18 +169,35 @@ def extract_frames_from_video(video_path, output_dir="temp_frames", frame_interv
 
     frame_count = 0
     saved_frames = []
+    skipped_frames = 0
 
     while True:
-        ret, frame = cap.read()
+        with metrics.stage("frame_decode"):
+            ret, frame = cap.read()
         if not ret:
             break
+        metrics.incr("frames_decoded")
+
+        if frame_count % frame_interval == 0 and text_threshold:
+            from text_detector import text_score
+
+            with metrics.stage("text_detect"):
+                score = text_score(frame)
+            if score < text_threshold:
+                # 预判无文字：跳过 JPEG 编码和 OCR 请求
+                skipped_frames += 1
+                metrics.incr("ocr_frames_skipped_no_text")
+                frame_count += 1
+                continue
 
         if frame_count % frame_interval == 0:
             frame_path = os.path.join(output_dir, f"frame_{frame_count:06d}.jpg")
             # 计算时间点（秒）
             timestamp = frame_count / fps if fps > 0 else 0
             # 提高图片质量
-            cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            with metrics.stage("jpeg_encode"):
+                cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            metrics.add_bytes("jpeg_encode", os.path.getsize(frame_path))
             saved_frames.append((frame_path, timestamp))
             print(f"  保存帧: {frame_path} (时间: {timestamp:.2f}秒)")
 
@@ -170,51 +205,123 @@ def extract_frames_from_video(video_path, output_dir="temp_frames", frame_interv
 
     cap.release()
     print(f"共提取了 {len(saved_frames)} 帧")
+    if skipped_frames:
+        print(f"文字预判跳过了 {skipped_frames} 帧（节省相应的 OCR 请求）")
     return saved_frames
 
 
-def process_video_ocr(video_path):
-    """处理视频OCR识别"""
-    frames = extract_frames_from_video(video_path)
-    if not frames:
-        return False
-
-    all_text = []
-    frame_timestamps = []
+def merge_child_metrics(stdout):
+    """合并子进程输出的 METRICS 计数行（上传字节数、token 用量等）和 USAGE 用量记录"""
+    for line in (stdout or "").splitlines():
+        try:
+            if line.startswith("METRICS "):
+                metrics.merge_counters(json.loads(line[len("METRICS "):]))
+            elif line.startswith("USAGE "):
+                ledger.merge_records(json.loads(line[len("USAGE "):]))
+        except ValueError:
+            pass
 
-    for i, (frame_path, timestamp) in enumerate(frames):
-        print(f"\n处理第 {i + 1}/{len(frames)} 帧: {frame_path} (时间: {timestamp:.2f}秒)")
 
+def run_frame_recognition(frame_paths):
+    """
+    调用 Recognition.py 识别一张或多张帧图片
+    Returns:
+        list[str]: 与输入顺序一致的识别文本；识别失败返回 None
+    """
+    # 子进程耗时包含解释器启动和客户端初始化，与 ocr_request 对比可看出这部分开销
+    with metrics.stage("ocr_subprocess"):
         recog_result = subprocess.run(
-            [sys.executable, "Recognition.py", frame_path],
+            [sys.executable, "Recognition.py"] + list(frame_paths),
             capture_output=True,
             text=True,
             encoding='utf-8',
             errors='replace'
         )
+    merge_child_metrics(recog_result.stdout)
 
-        print(f"  返回码: {recog_result.returncode}")
-
-        if recog_result.returncode == 0 and "OCR_SUCCESS" in recog_result.stdout:
-            if os.path.exists("output.txt"):
-                with open("output.txt", "r", encoding='utf-8') as f:
-                    frame_text = f.read().strip()
-                    if frame_text and frame_text != "无文字内容":
-                        all_text.append(frame_text)
-                        frame_timestamps.append(timestamp)
-                        print(f"  识别到文字: {frame_text[:50]}...")
-                    else:
-                        print(f"  该帧无文字内容")
-                try:
-                    os.remove("output.txt")
-                except:
-                    pass
-            else:
-                print(f"  未找到输出文件")
+    print(f"  返回码: {recog_result.returncode}")
+
+    if recog_result.returncode != 0 or "OCR_SUCCESS" not in recog_result.stdout:
+        if recog_result.stderr:
+            print(f"  错误: {recog_result.stderr}")
+        return None
+
+    output_path = "output.txt" if len(frame_paths) == 1 else "output_batch.json"
+    if not os.path.exists(output_path):
+        print(f"  未找到输出文件")
+        return None
+
+    with open(output_path, "r", encoding='utf-8') as f:
+        if len(frame_paths) == 1:
+            texts = [f.read()]
+        else:
+            texts = json.load(f)
+    try:
+        os.remove(output_path)
+    except:
+        pass
+
+    return texts
+
+
+def process_video_ocr(video_path, batch_size=1, merge_threshold=0.7, merge_max_gap=5.0, ocr_backend=None,
+                      text_threshold=None):
+    """
+    处理视频OCR识别
+    Args:
+        video_path: 视频文件路径
+        batch_size: 每次请求合并识别的帧数，大于1时多帧共用一次OCR请求
+        merge_threshold: 相邻文本段合并的相似度阈值（1.0 表示只合并完全相同的文本）
+        merge_max_gap: 可合并文本段之间的最大时间间隔（秒）
+        ocr_backend: OCR 后端（见 ocr_backends.py），默认通过 Recognition.py 子进程请求云端
+        text_threshold: 抽帧时的文字存在性预判阈值，None 表示不过滤
+    """
+    if ocr_backend is None:
+        ocr_backend = create_ocr_backend("cloud", cloud_runner=run_frame_recognition)
+    frames = extract_frames_from_video(video_path, text_threshold=text_threshold)
+    if not frames:
+        return False
+
+    all_text = []
+    frame_timestamps = []
+    # 帧时间 → 抽样帧序号，用于结构化输出
+    frame_indices = {timestamp: index for index, (_, timestamp) in enumerate(frames)}
+    # 逐帧识别结果边识别边写入，下游无需等待整个视频处理完成
+    frames_writer = JsonlWriter("ocr_frames.jsonl")
+
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        batch_paths = [frame_path for frame_path, _ in batch]
+
+        if len(batch) == 1:
+            print(f"\n处理第 {start + 1}/{len(frames)} 帧: {batch_paths[0]} (时间: {batch[0][1]:.2f}秒)")
         else:
-            print(f"  第 {i + 1} 帧识别失败")
-            if recog_result.stderr:
-                print(f"  错误: {recog_result.stderr}")
+            print(f"\n处理第 {start + 1}-{start + len(batch)}/{len(frames)} 帧 "
+                  f"(时间: {batch[0][1]:.2f}-{batch[-1][1]:.2f}秒)")
+
+        batch_results = ocr_backend.recognize_batch(batch_paths)
+
+        for offset, ((frame_path, timestamp), frame_result) in enumerate(zip(batch, batch_results)):
+            if frame_result is None:
+                print(f"  第 {start + offset + 1} 帧识别失败")
+                continue
+            # 同一帧内的多行文字合并为一行，保证一段文字对应一行
+            frame_text = " ".join(line.strip() for line in frame_result.text.splitlines() if line.strip())
+            frames_writer.write({
+                "frame_index": start + offset,
+                "timestamp": round(timestamp, 3),
+                "ocr_text": frame_text,
+                "ocr_backend": frame_result.backend,
+                "confidence": None if frame_result.confidence is None else round(frame_result.confidence, 3)
+            })
+            if frame_text and frame_text != NO_TEXT:
+                all_text.append(frame_text)
+                frame_timestamps.append(timestamp)
+                print(f"  识别到文字({timestamp:.2f}秒): {frame_text[:50]}...")
+            else:
+                print(f"  该帧无文字内容({timestamp:.2f}秒)")
+
+    frames_writer.close()
 
     # 清理临时文件
     for frame_path, _ in frames:
@@ -232,64 +339,109 @@ def process_video_ocr(video_path):
         print("未从视频中识别到任何文字")
         return False
 
-    # 合并所有文本并去重，同时保存时间信息
-    unique_data = []
-    seen_texts = set()
-
-    for text, timestamp in zip(all_text, frame_timestamps):
-        if text not in seen_texts:
-            unique_data.append((text, timestamp))
-            seen_texts.add(text)
+    # 合并相邻帧中相似的文本（OCR噪声导致的近似重复），保留每段的起止时间
+    with metrics.stage("segment_merge"):
+        merged_segments = merge_segments(
+            list(zip(all_text, frame_timestamps)),
+            similarity_threshold=merge_threshold,
+            max_gap=merge_max_gap
+        )
+    print(f"相似文本合并: {len(all_text)} 帧文字 → {len(merged_segments)} 段")
 
     # 保存文本到临时文件
-    combined_text = "\n".join([text for text, _ in unique_data])
+    combined_text = "\n".join([text for text, _, _ in merged_segments])
 
     with open("temp_extracted_text.txt", "w", encoding='utf-8') as f:
         f.write(combined_text)
 
     # 保存时间信息到单独文件
     with open("timestamps.txt", "w", encoding='utf-8') as f:
-        for text, timestamp in unique_data:
-            f.write(f"{timestamp:.2f}秒: {text}\n")
-
-    print(f"视频文字识别完成，共识别 {len(unique_data)} 段文字")
+        for text, start, end in merged_segments:
+            f.write(f"{start:.2f}秒-{end:.2f}秒: {text}\n")
+
+    # 结构化的时间段信息，供后续生成字幕和 JSONL 使用
+    with JsonlWriter("segments.jsonl") as writer:
+        for index, (text, start, end) in enumerate(merged_segments):
+            writer.write({
+                "segment_index": index,
+                "start_frame": frame_indices.get(start),
+                "end_frame": frame_indices.get(end),
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "ocr_text": text
+            })
+
+    print(f"视频文字识别完成，共识别 {len(merged_segments)} 段文字")
     return True
 
 
-def process_image_ocr(image_path=None):
-    """处理图像OCR识别"""
-    print("开始执行图像识别任务...")
+def ocr_video_segments(video_path, recognize, output_dir="temp_frames", frame_interval=60,
+                       merge_threshold=0.7, merge_max_gap=5.0, text_threshold=None):
+    """
+    在进程内完成视频抽帧、逐帧OCR和相似文本合并（供常驻服务等调用，不经过子进程和固定文件名）
+    Args:
+        video_path: 视频文件路径
+        recognize: 识别函数，输入帧图片路径，返回识别文本
+        output_dir: 临时帧目录（并发调用时应各不相同）
+        text_threshold: 文字存在性预判阈值，None 表示不过滤
+    Returns:
+        list[(text, start, end)]
+    """
+    frames = extract_frames_from_video(video_path, output_dir=output_dir, frame_interval=frame_interval,
+                                       text_threshold=text_threshold)
+    texts = []
+    try:
+        for frame_path, timestamp in frames:
+            frame_text = recognize(frame_path) or ""
+            frame_text = " ".join(line.strip() for line in frame_text.splitlines() if line.strip())
+            if frame_text and frame_text != "无文字内容":
+                texts.append((frame_text, timestamp))
+    finally:
+        for frame_path, _ in frames:
+            try:
+                os.remove(frame_path)
+            except:
+                pass
+        try:
+            os.rmdir(output_dir)
+        except:
+            pass
 
-    # 构建命令参数
-    cmd = [sys.executable, "Recognition.py"]
-    if image_path:
-        cmd.append(image_path)
-
-    recog_result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        encoding='utf-8',
-        errors='replace'
-    )
+    with metrics.stage("segment_merge"):
+        return merge_segments(texts, similarity_threshold=merge_threshold, max_gap=merge_max_gap)
 
-    if recog_result.returncode != 0 or "OCR_SUCCESS" not in recog_result.stdout:
-        print(f"图像识别失败！错误信息：\n{recog_result.stderr}")
-        return False
 
-    if not os.path.exists("output.txt"):
-        print("未找到输出文件 output.txt")
+def process_image_ocr(image_path=None, ocr_backend=None):
+    """处理图像OCR识别"""
+    print("开始执行图像识别任务...")
+
+    if ocr_backend is None:
+        ocr_backend = create_ocr_backend("cloud", cloud_runner=run_frame_recognition)
+    # 与 Recognition.py 的默认输入一致
+    result = ocr_backend.recognize(image_path or "image.jpg")
+    if result is None:
+        print("图像识别失败！")
         return False
+    if result.confidence is not None:
+        print(f"识别后端: {result.backend}，置信度: {result.confidence:.2f}")
 
     # 将识别结果保存到临时文件
-    shutil.copy("output.txt", "temp_extracted_text.txt")
+    with open("temp_extracted_text.txt", "w", encoding='utf-8') as f:
+        f.write(result.text)
 
     print("图像识别完成")
     return True
 
 
-def process_text_file_correction(input_file):
-    """使用 text_file_corrector.py 进行第一次纠错"""
+def process_text_file_correction(input_file, details_file_path=None, incremental=False, confusion_path=None):
+    """
+    使用 text_file_corrector.py 进行第一次纠错
+    Args:
+        input_file: 待纠错的文本文件
+        details_file_path: 逐行、逐模型纠错明细的 JSONL 输出路径（可选）
+        incremental: 增量模式，只纠错与上一次运行相比新增或改动的行
+        confusion_path: 额外的混淆集文件（见 confusion_miner.py）
+    """
     print("\n" + "=" * 60)
     print("第一步：使用 text_file_corrector.py 进行纠错")
     print("=" * 60)
@@ -299,18 +451,24 @@ def process_text_file_correction(input_file):
         from text_file_corrector import text_file_corrector
 
         # 使用 text_file_corrector 进行纠错
-        result = text_file_corrector(
-            input_file_path=input_file,
-            strategy='pipeline',  # 使用流水线策略
-            use_models=['kenlm', 'macbert', 'ernie', 'confusion'],  # 使用多个模型
-            show_progress=True  # 显示进度
-        )
+        with metrics.stage("first_pass_correction"):
+            result = text_file_corrector(
+                input_file_path=input_file,
+                strategy='pipeline',  # 使用流水线策略
+                use_models=['kenlm', 'macbert', 'ernie', 'confusion'],  # 使用多个模型
+                show_progress=True,  # 显示进度
+                details_file_path=details_file_path,
+                incremental=incremental,
+                confusion_path=confusion_path
+            )
 
         if result["success"]:
             print(f"第一次纠错成功！")
             print(f"  输入文件: {input_file}")
             print(f"  输出文件: {result['output_file_path']}")
             print(f"  总行数: {result['total_lines']}")
+            if "incremental" in result:
+                print(f"  复用上一次结果的行数: {result['incremental']['reused_lines']}")
             return result['output_file_path']
         else:
             print(f"第一次纠错失败: {result['error']}")
@@ -324,33 +482,49 @@ def process_text_file_correction(input_file):
         return None
 
 
-def process_二级_correction(input_file):
-    """使用 QwenRewrite.py 进行二级纠错"""
+def process_二级_correction(input_file, rewrite_mode="full"):
+    """
+    使用 QwenRewrite.py 进行二级纠错
+    Args:
+        rewrite_mode: 'full' 整段改写，或 'edits' 只让大模型返回修改列表
+    """
     print("\n" + "=" * 60)
     print("第二步：使用 QwenRewrite.py 进行二级纠错")
     print("=" * 60)
 
-    # 将第一次纠错的结果复制到 output.txt（QwenRewrite.py 的输入文件）
-    try:
-        shutil.copy(input_file, "output.txt")
-    except Exception as e:
-        print(f"复制文件失败: {e}")
-        return False
+    if ledger.has_budget:
+        # 设置了预算：只把优先级高的行交给大模型
+        success = run_budgeted_rewrite(input_file, rewrite_mode=rewrite_mode)
+    else:
+        # 将第一次纠错的结果复制到 output.txt（QwenRewrite.py 的输入文件）
+        try:
+            shutil.copy(input_file, "output.txt")
+        except Exception as e:
+            print(f"复制文件失败: {e}")
+            return False
 
-    # 先显示第一次纠错后的内容
-    # with open("output.txt", "r", encoding='utf-8') as f:
-    #     first_correction_text = f.read().strip()
-    #     print(f"第一次纠错后内容: {first_correction_text}")
-
-    correction_result = subprocess.run(
-        [sys.executable, "QwenRewrite.py"],
-        capture_output=True,
-        text=True,
-        encoding='utf-8',
-        errors='replace'
-    )
+        # 先显示第一次纠错后的内容
+        # with open("output.txt", "r", encoding='utf-8') as f:
+        #     first_correction_text = f.read().strip()
+        #     print(f"第一次纠错后内容: {first_correction_text}")
+
+        # 删除上一次的结果，子进程失败时不会沿用旧结果
+        if os.path.exists("corrected_output.txt"):
+            os.remove("corrected_output.txt")
+        with metrics.stage("llm_subprocess"):
+            correction_result = subprocess.run(
+                rewrite_command(rewrite_mode),
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace'
+            )
+        merge_child_metrics(correction_result.stdout)
+        success = correction_result.returncode == 0
+        if not success and correction_result.stderr:
+            print(f"错误信息: {correction_result.stderr}")
 
-    if correction_result.returncode == 0:
+    if success:
         print("二级纠错完成")
 
         # 直接从文件读取最终纠错结果
@@ -363,6 +537,8 @@ def process_二级_correction(input_file):
             if os.path.exists("timestamps.txt"):
                 create_timestamped_correction()
                 print(f"带时间戳的纠错结果已保存到 corrected_with_timestamps.txt")
+                if os.path.exists("segments.jsonl"):
+                    print(f"字幕和结构化结果已保存到 corrected_output.srt / corrected_output.vtt / corrected_results.jsonl")
             else:
                 print(f"最终纠错结果已保存到 corrected_output.txt")
         else:
@@ -371,44 +547,118 @@ def process_二级_correction(input_file):
         return True
     else:
         print("二级纠错失败")
-        if correction_result.stderr:
-            print(f"错误信息: {correction_result.stderr}")
         return False
 
 
+def rewrite_command(rewrite_mode="full", max_tokens=None):
+    """
+    QwenRewrite.py 子进程的命令行
+    Args:
+        max_tokens: 子进程本次可用的 token 数（修改列表解析失败、退回整段改写前检查），None 表示不限
+    """
+    command = [sys.executable, "QwenRewrite.py"]
+    if rewrite_mode == "edits":
+        command.append("--edits")
+    if max_tokens is not None:
+        command.extend(["--max-tokens", str(max_tokens)])
+    return command
+
+
+def subprocess_budget(text):
+    """
+    子进程可用的 token 数：账本剩余预算加上 rewrite_within_budget 已为这段文本预留的部分；
+    没有预算时为 None
+    """
+    remaining = ledger.remaining_tokens()
+    return None if remaining is None else remaining + planned_tokens(text)
+
+
+def rewrite_via_subprocess(text, rewrite_mode="full"):
+    """通过 QwenRewrite.py 子进程改写一段文本，返回改写结果"""
+    with open("output.txt", "w", encoding="utf-8") as f:
+        f.write(text)
+    # 删除上一次的结果，子进程失败时不会把旧结果当作本次的返回
+    if os.path.exists("corrected_output.txt"):
+        os.remove("corrected_output.txt")
+    with metrics.stage("llm_subprocess"):
+        correction_result = subprocess.run(
+            rewrite_command(rewrite_mode, max_tokens=subprocess_budget(text)),
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+    merge_child_metrics(correction_result.stdout)
+    if correction_result.returncode != 0:
+        raise RuntimeError(correction_result.stderr or correction_result.stdout)
+    if not os.path.exists("corrected_output.txt"):
+        raise RuntimeError("QwenRewrite.py 没有生成 corrected_output.txt")
+    with open("corrected_output.txt", "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def run_budgeted_rewrite(input_file, details_file_path="correction_details.jsonl", rewrite_mode="full"):
+    """
+    在 token 预算内进行二级纠错，结果写入 corrected_output.txt
+    优先级取自第一次纠错的逐行明细（如果有），超出预算的行保留第一次纠错的结果
+    """
+    with open(input_file, "r", encoding="utf-8") as f:
+        lines = f.read().rstrip("\n").split("\n")
+
+    priorities = None
+    if os.path.exists(details_file_path):
+        priorities = [0] * len(lines)
+        for record in read_jsonl(details_file_path):
+            index = record["line_number"] - 1
+            if 0 <= index < len(lines):
+                priorities[index] = line_priority(record["source"], record.get("models"), record["target"])
+
+    try:
+        final_lines, skipped = rewrite_within_budget(
+            lines, lambda text: rewrite_via_subprocess(text, rewrite_mode), priorities=priorities
+        )
+    except Exception as e:
+        print(f"大模型请求失败: {e}")
+        return False
+
+    if skipped:
+        metrics.incr("llm_lines_skipped_budget", skipped)
+        print(f"超出预算：{skipped} 行跳过二级纠错，保留第一次纠错的结果")
+    with open("corrected_output.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(final_lines))
+    return True
+
+
 def create_timestamped_correction():
     """创建带时间戳的纠错结果"""
     if not os.path.exists("timestamps.txt") or not os.path.exists("corrected_output.txt"):
         return
 
-    # 读取时间戳信息
+    # 读取时间戳信息（优先使用结构化的 segments.jsonl，避免重新解析文本格式）
+    segments = read_jsonl("segments.jsonl") if os.path.exists("segments.jsonl") else None
     timestamps_data = []
-    with open("timestamps.txt", "r", encoding='utf-8') as f:
-        for line in f:
-            if ": " in line:
-                timestamp_str, original_text = line.strip().split(": ", 1)
-                timestamps_data.append((timestamp_str, original_text))
+    if segments is not None:
+        for segment in segments:
+            timestamp_str = f"{segment['start']:.2f}秒-{segment['end']:.2f}秒"
+            timestamps_data.append((timestamp_str, segment["ocr_text"]))
+    else:
+        with open("timestamps.txt", "r", encoding='utf-8') as f:
+            for line in f:
+                if ": " in line:
+                    timestamp_str, original_text = line.strip().split(": ", 1)
+                    timestamps_data.append((timestamp_str, original_text))
 
     # 读取纠错结果
     with open("corrected_output.txt", "r", encoding='utf-8') as f:
         corrected_content = f.read().strip()
 
-    # 处理纠错结果 - 可能是单行或多行
-    if '\n' in corrected_content:
-        corrected_lines = corrected_content.split('\n')
-    else:
-        # 如果是单行文本，按原文分割数量来处理
-        corrected_lines = [corrected_content] * len(timestamps_data)
+    # 按字符对齐把纠错结果切回各时间段，行数不一致（合并/拆分/丢行）时时间戳也不会错位
+    aligned_lines = align_to_segments([text for _, text in timestamps_data], corrected_content)
 
     # 匹配纠错结果与时间戳
     corrected_with_timestamps = []
 
-    for i, (timestamp_str, original_text) in enumerate(timestamps_data):
-        if i < len(corrected_lines):
-            corrected_text = corrected_lines[i].strip()
-        else:
-            corrected_text = corrected_content.strip()  # 使用完整的纠错结果
-
+    for (timestamp_str, original_text), corrected_text in zip(timestamps_data, aligned_lines):
         # 检查是否有修改
         if corrected_text != original_text:
             corrected_with_timestamps.append(f"[{timestamp_str}] 原文: {original_text}")
@@ -423,12 +673,56 @@ def create_timestamped_correction():
     with open("corrected_with_timestamps.txt", "w", encoding='utf-8') as f:
         f.write("\n".join(corrected_with_timestamps))
 
+    if segments is not None:
+        write_structured_outputs(segments, aligned_lines)
+
+
+def write_structured_outputs(segments, final_texts, output_prefix="corrected_output",
+                             details_file_path="correction_details.jsonl"):
+    """
+    写出 SRT、WebVTT 字幕和逐段 JSONL 结果
+    Args:
+        segments: segments.jsonl 中的时间段记录
+        final_texts: 与 segments 一一对应的最终纠错文本
+        output_prefix: 字幕文件名前缀
+        details_file_path: 第一次纠错的逐行明细（行号与时间段一一对应），不存在时省略各模型结果
+    """
+    model_details = {}
+    if details_file_path and os.path.exists(details_file_path):
+        for record in read_jsonl(details_file_path):
+            model_details[record["line_number"] - 1] = record
+
+    intervals = subtitle_intervals([(segment["start"], segment["end"]) for segment in segments])
+
+    with SrtWriter(f"{output_prefix}.srt") as srt_writer, \
+            VttWriter(f"{output_prefix}.vtt") as vtt_writer, \
+            JsonlWriter("corrected_results.jsonl") as jsonl_writer:
+        for segment, final_text, (start, end) in zip(segments, final_texts, intervals):
+            srt_writer.write_cue(start, end, final_text)
+            vtt_writer.write_cue(start, end, final_text)
+
+            detail = model_details.get(segment["segment_index"], {})
+            jsonl_writer.write({
+                "segment_index": segment["segment_index"],
+                "start_frame": segment["start_frame"],
+                "end_frame": segment["end_frame"],
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "ocr_text": segment["ocr_text"],
+                "corrections": detail.get("models", {}),
+                "first_pass_text": detail.get("target"),
+                "final_text": final_text
+            })
+
 
 def cleanup_temp_files():
     """清理临时文件"""
     temp_files = [
         "output.txt",
+        "output_batch.json",
         "timestamps.txt",
+        "segments.jsonl",
+        "correction_details.jsonl",
         "temp_extracted_text.txt"
     ]
 
@@ -440,13 +734,111 @@ def cleanup_temp_files():
             print(f"删除临时文件 {temp_file} 时发生错误: {e}")
 
 
+def parse_args(argv):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="文本/图片/视频文字识别与两级纠错")
+    parser.add_argument("inputs", nargs="*",
+                        help="输入文件路径（文本、图片或视频）；--batch 模式下可为多个文件、目录或通配符")
+    parser.add_argument("--batch-frames", type=int, default=1,
+                        help="视频OCR时每次请求合并识别的帧数（默认1，即逐帧请求）")
+    parser.add_argument("--merge-threshold", type=float, default=0.7,
+                        help="视频相邻帧文字合并的相似度阈值（默认0.7）")
+    parser.add_argument("--merge-max-gap", type=float, default=5.0,
+                        help="视频相似文字可合并的最大时间间隔，单位秒（默认5）")
+    parser.add_argument("--batch", action="store_true",
+                        help="批量模式：处理多个文件、目录或通配符，共享模型和线程池")
+    parser.add_argument("--manifest", help="批量模式的清单文件，每行一个路径、目录或通配符")
+    parser.add_argument("--recursive", action="store_true", help="批量模式下递归展开目录")
+    parser.add_argument("--output-dir", default="batch_output", help="批量模式的输出目录")
+    parser.add_argument("--workers", type=int, default=8, help="批量模式的网络请求线程数")
+    parser.add_argument("--files-in-flight", type=int, default=4, help="批量模式同时处理的文件数")
+    parser.add_argument("--no-llm", action="store_true", help="批量模式下跳过大模型二级纠错")
+    parser.add_argument("--model-host", help="批量模式下使用 model_host.py 宿主进程中的模型")
+    parser.add_argument("--metrics-json", help="把各阶段耗时与吞吐统计写入该 JSON 文件")
+    parser.add_argument("--metrics-prom", help="把各阶段耗时与吞吐统计以 Prometheus 文本格式写入该文件")
+    parser.add_argument("--ocr-backend", choices=["cloud", "local-only", "local-first"], default="cloud",
+                        help="OCR 策略：云端、仅本地 Tesseract、本地优先（低置信度时请求云端）")
+    parser.add_argument("--ocr-lang", default="chi_sim", help="本地 OCR 的 Tesseract 语言包")
+    parser.add_argument("--ocr-min-confidence", type=float, default=0.6,
+                        help="local-first 策略下请求云端的置信度阈值（0-1）")
+    parser.add_argument("--text-threshold", type=float, default=0.002,
+                        help="抽帧后文字存在性预判的阈值（文字行区域占画面的比例），低于阈值的帧不做 OCR，0 表示关闭")
+    parser.add_argument("--max-tokens", type=int, help="本次作业的大模型 token 预算，超出时跳过低优先级行的二级纠错")
+    parser.add_argument("--max-cost", type=float, help="本次作业的大模型费用预算（元）")
+    parser.add_argument("--prices", help="模型价格 JSON 文件：{模型: [输入价格, 输出价格]}，单位元/千 token")
+    parser.add_argument("--usage-json", help="把 token 用量和费用明细写入该 JSON 文件")
+    parser.add_argument("--rewrite-mode", choices=["full", "edits"], default="full",
+                        help="二级纠错方式：full 让大模型输出整段文本，edits 只输出修改列表（输出 token 大幅减少）")
+    parser.add_argument("--confusion-dict", help="额外的混淆集文件（confusion_miner.py 挖掘得到），与内置混淆集合并")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量纠错：复用上一次运行的逐行结果，只纠错新增或改动的行")
+    return parser.parse_args(argv)
+
+
+def build_ocr_backend(args):
+    """按命令行参数创建 OCR 后端，云端部分通过 Recognition.py 子进程请求"""
+    return create_ocr_backend(args.ocr_backend, cloud_runner=run_frame_recognition, lang=args.ocr_lang,
+                              min_confidence=args.ocr_min_confidence)
+
+
+def run_batch(args):
+    """批量模式入口"""
+    from batch_corrector import BatchCorrector, expand_inputs
+    from QwenRewrite import get_rewrite_func
+
+    files = expand_inputs(args.inputs, manifest_path=args.manifest, recursive=args.recursive)
+    if not files:
+        print("没有找到可处理的文件")
+        return
+
+    corrector = None
+    if args.model_host:
+        from model_host import RemoteCorrector
+        corrector = RemoteCorrector(args.model_host)
+
+    # 云端策略沿用 BatchCorrector 默认的进程内识别
+    ocr_func = None
+    if args.ocr_backend != "cloud":
+        ocr_func = create_ocr_backend(args.ocr_backend, lang=args.ocr_lang,
+                                      min_confidence=args.ocr_min_confidence)
+
+    batch = BatchCorrector(
+        output_dir=args.output_dir,
+        corrector=corrector,
+        ocr_func=ocr_func,
+        text_threshold=args.text_threshold,
+        confusion_path=args.confusion_dict,
+        frame_batch_size=max(1, args.batch_frames),
+        merge_threshold=args.merge_threshold,
+        merge_max_gap=args.merge_max_gap,
+        rewrite_func=None if args.no_llm else get_rewrite_func(args.rewrite_mode),
+        llm=not args.no_llm,
+        network_workers=args.workers,
+        max_files_in_flight=args.files_in_flight
+    )
+    try:
+        batch.run(files)
+    finally:
+        batch.close()
+
+
 def main():
     input_file = None
     file_type = None
+    args = parse_args(sys.argv[1:])
+    ledger.configure(max_tokens=args.max_tokens, max_cost=args.max_cost,
+                     prices=load_prices(args.prices) if args.prices else None)
+
+    if args.batch or args.manifest:
+        try:
+            run_batch(args)
+        finally:
+            export_metrics(args)
+        return
 
     # 检查命令行参数
-    if len(sys.argv) > 1:
-        input_file = sys.argv[1]
+    if args.inputs:
+        input_file = args.inputs[0]
         file_type = detect_file_type(input_file)
 
         if file_type is None:
@@ -463,7 +855,9 @@ def main():
         print(f"检测到 {file_type} 文件: {input_file}")
     else:
         print("请指定输入文件")
-        print("用法: python integrated_corrector.py <文件路径>")
+        print("用法: python integrated_corrector.py <文件路径> [--batch-frames K]")
+        print("批量: python integrated_corrector.py --batch <目录/通配符/文件...> [--manifest 清单文件]")
+        print("队列: python job_queue.py submit <文件...>，各机器上运行 python job_queue.py worker")
         print("支持文本文件(.txt)、图片文件、视频文件")
         return
 
@@ -474,13 +868,17 @@ def main():
             print("\n处理文本文件，将进行两次纠错")
 
             # 第一次纠错：使用 text_file_corrector.py
-            first_corrected_file = process_text_file_correction(input_file)
+            first_corrected_file = process_text_file_correction(
+                input_file, details_file_path="correction_details.jsonl",
+                incremental=args.incremental,
+                confusion_path=args.confusion_dict
+            )
             if not first_corrected_file:
                 print("第一次纠错失败，终止处理")
                 return
 
             # 第二次纠错：使用 QwenRewrite.py 二级
-            if not process_二级_correction(first_corrected_file):
+            if not process_二级_correction(first_corrected_file, rewrite_mode=args.rewrite_mode):
                 print("第二次纠错失败")
                 return
 
@@ -494,18 +892,26 @@ def main():
                 return
 
             # 提取视频中的文本
-            if not process_video_ocr(input_file):
+            if not process_video_ocr(input_file, batch_size=max(1, args.batch_frames),
+                                     merge_threshold=args.merge_threshold,
+                                     merge_max_gap=args.merge_max_gap,
+                                     ocr_backend=build_ocr_backend(args),
+                                     text_threshold=args.text_threshold):
                 print("视频文本提取失败，终止处理")
                 return
 
             # 第一次纠错：使用 text_file_corrector.py
-            first_corrected_file = process_text_file_correction("temp_extracted_text.txt")
+            first_corrected_file = process_text_file_correction(
+                "temp_extracted_text.txt", details_file_path="correction_details.jsonl",
+                incremental=args.incremental,
+                confusion_path=args.confusion_dict
+            )
             if not first_corrected_file:
                 print("第一次纠错失败，终止处理")
                 return
 
             # 第二次纠错：使用 QwenRewrite.py 二级
-            if not process_二级_correction(first_corrected_file):
+            if not process_二级_correction(first_corrected_file, rewrite_mode=args.rewrite_mode):
                 print("第二次纠错失败")
                 return
 
@@ -514,18 +920,22 @@ def main():
             print("\n处理图片文件，将提取文本后进行两次纠错")
 
             # 提取图片中的文本
-            if not process_image_ocr(input_file):
+            if not process_image_ocr(input_file, ocr_backend=build_ocr_backend(args)):
                 print("图片文本提取失败，终止处理")
                 return
 
             # 第一次纠错：使用 text_file_corrector.py
-            first_corrected_file = process_text_file_correction("temp_extracted_text.txt")
+            first_corrected_file = process_text_file_correction(
+                "temp_extracted_text.txt", details_file_path="correction_details.jsonl",
+                incremental=args.incremental,
+                confusion_path=args.confusion_dict
+            )
             if not first_corrected_file:
                 print("第一次纠错失败，终止处理")
                 return
 
             # 第二次纠错：使用 QwenRewrite.py 二级
-            if not process_二级_correction(first_corrected_file):
+            if not process_二级_correction(first_corrected_file, rewrite_mode=args.rewrite_mode):
                 print("第二次纠错失败")
                 return
 
@@ -540,6 +950,10 @@ def main():
         if os.path.exists("corrected_with_timestamps.txt"):
             print("带时间戳的纠错结果文件: corrected_with_timestamps.txt")
 
+        if os.path.exists("corrected_results.jsonl"):
+            print("字幕文件: corrected_output.srt, corrected_output.vtt")
+            print("结构化结果文件: corrected_results.jsonl（逐帧OCR结果: ocr_frames.jsonl）")
+
         print("\n请查看输出文件以查看最终纠错结果。")
 
     except KeyboardInterrupt:
@@ -549,10 +963,27 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
+        export_metrics(args)
         # 清理临时文件
         cleanup_temp_files()
         print("\n已清理临时文件")
 
 
+def export_metrics(args):
+    """按命令行参数导出阶段统计"""
+    if args.metrics_json:
+        metrics.to_json(args.metrics_json)
+        print(f"阶段统计已保存到 {args.metrics_json}")
+    if args.metrics_prom:
+        metrics.to_prometheus(args.metrics_prom)
+        print(f"阶段统计已保存到 {args.metrics_prom}")
+    summary = ledger.summary()
+    if summary["stages"]:
+        print(f"大模型用量: {summary['total_tokens']} token，估算费用 {summary['total_cost']:.4f} 元")
+    if args.usage_json:
+        ledger.to_json(args.usage_json)
+        print(f"token 用量已保存到 {args.usage_json}")
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+持久化任务队列：把视频、图片、文本任务分给多台机器、多个进程处理
+
+submit 把文件写入队列；worker 从队列租用（lease）任务，处理期间定期续租。
+worker 崩溃或失联时租约到期，任务会被其他 worker 重新领取；
+失败的任务按指数退避重试，超过最大尝试次数后进入死信（dead），可用 requeue 重新排队。
+
+# 提交任务
+python job_queue.py submit --queue jobs.db input_dir/ "scans/*.png" --manifest files.txt
+# 启动 worker（可同时运行多个，多台机器共用队列见下文）
+python job_queue.py worker --queue jobs.db --output-dir results --concurrency 4
+python job_queue.py worker --queue jobs.db --model-host 127.0.0.1:6100 --exit-when-empty
+# 查看队列、死信任务，重新排队死信任务
+python job_queue.py status --queue jobs.db
+python job_queue.py requeue --queue jobs.db
+
+默认使用 SQLite，无需额外服务。SQLite 的并发控制依赖文件锁：
+- 所有 worker 在同一台机器上时最可靠，可用 --queue sqlite-wal://jobs.db 开启 WAL 模式提高并发
+  （WAL 依赖共享内存，不能用于网络文件系统）；
+- 默认的回滚日志模式只依赖文件锁，可以放在文件锁可靠的共享存储上（如正确配置锁服务的 NFSv4），
+  但很多网络文件系统的锁并不可靠，租约可能被重复授予。
+多台机器共用队列时建议实现 QueueBackend（如基于数据库服务）并用 register_backend 注册，
+通过 --queue <scheme>://... 选用。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+STATUS_QUEUED = "queued"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+STATUSES = (STATUS_QUEUED, STATUS_LEASED, STATUS_DONE, STATUS_DEAD)
+
+# attempts 为已领取的次数（包括当前这次）
+QueuedJob = namedtuple("QueuedJob", ["id", "path", "attempts", "max_attempts"])
+
+
+class QueueBackend:
+    """队列存储的接口，SQLiteQueue 为默认实现"""
+
+    def enqueue(self, path, max_attempts=3):
+        """加入一个任务，返回任务 id"""
+        raise NotImplementedError
+
+    def lease(self, worker_id, lease_seconds=300):
+        """领取一个可执行的任务（排队中的，或租约已过期的），没有时返回 None"""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=300):
+        """续租，租约已不属于该 worker 时返回 False"""
+        raise NotImplementedError
+
+    def complete(self, job_id, worker_id, result):
+        raise NotImplementedError
+
+    def fail(self, job_id, worker_id, error):
+        """记录失败：未超过最大尝试次数时退避后重新排队，否则进入死信"""
+        raise NotImplementedError
+
+    def requeue_dead(self, job_id=None):
+        """把死信任务重新排队（尝试次数清零），返回重新排队的数量"""
+        raise NotImplementedError
+
+    def stats(self):
+        """各状态的任务数"""
+        raise NotImplementedError
+
+    def list_jobs(self, status=None, limit=100):
+        raise NotImplementedError
+
+
+class SQLiteQueue(QueueBackend):
+    """基于 SQLite 的队列，租用在 BEGIN IMMEDIATE 事务中完成，多进程领取同一任务时只有一个成功"""
+
+    def __init__(self, path, retry_delay=30.0, wal=False):
+        """
+        Args:
+            path: 数据库文件路径
+            retry_delay: 首次失败后的重试等待（秒），之后每次翻倍
+            wal: 是否使用 WAL 模式；只能在所有 worker 位于同一台机器时使用，默认使用回滚日志模式
+        """
+        self.path = path
+        self.retry_delay = retry_delay
+        self.journal_mode = "WAL" if wal else "DELETE"
+        # 每个线程使用自己的连接
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    available_at REAL NOT NULL,
+                    lease_until REAL,
+                    worker TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return _Transaction(conn)
+
+    def enqueue(self, path, max_attempts=3):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (path, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (path, max_attempts, now, now, now)
+            )
+            return cursor.lastrowid
+
+    def lease(self, worker_id, lease_seconds=300):
+        now = time.time()
+        with self._connect() as conn:
+            # 租约过期且已用完尝试次数的任务（worker 反复崩溃）直接进入死信
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = COALESCE(error, '租约过期'), updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                (STATUS_DEAD, now, STATUS_LEASED, now)
+            )
+            row = conn.execute(
+                "SELECT id, path, attempts, max_attempts FROM jobs "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY available_at, id LIMIT 1",
+                (STATUS_QUEUED, now, STATUS_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, path, attempts, max_attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, worker = ?, updated_at = ? "
+                "WHERE id = ?",
+                (STATUS_LEASED, now + lease_seconds, worker_id, now, job_id)
+            )
+        return QueuedJob(job_id, path, attempts + 1, max_attempts)
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=300):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (now + lease_seconds, now, job_id, STATUS_LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND worker = ?",
+                (STATUS_DONE, json.dumps(result, ensure_ascii=False), now, job_id, STATUS_LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND worker = ?",
+                (job_id, STATUS_LEASED, worker_id)
+            ).fetchone()
+            if row is None:
+                # 租约已被其他 worker 接手
+                return None
+            attempts, max_attempts = row
+            if attempts >= max_attempts:
+                status, available_at = STATUS_DEAD, now
+            else:
+                status, available_at = STATUS_QUEUED, now + self.retry_delay * 2 ** (attempts - 1)
+            conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (status, available_at, str(error), now, job_id)
+            )
+            return status
+
+    def requeue_dead(self, job_id=None):
+        now = time.time()
+        with self._connect() as conn:
+            query = "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE status = ?"
+            params = [STATUS_QUEUED, now, now, STATUS_DEAD]
+            if job_id is not None:
+                query += " AND id = ?"
+                params.append(job_id)
+            return conn.execute(query, params).rowcount
+
+    def stats(self):
+        now = time.time()
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            expired = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_until < ?",
+                                   (STATUS_LEASED, now)).fetchone()[0]
+        result = {status: counts.get(status, 0) for status in STATUSES}
+        result["expired_leases"] = expired
+        return result
+
+    def list_jobs(self, status=None, limit=100):
+        with self._connect() as conn:
+            query = "SELECT id, path, status, attempts, max_attempts, worker, error FROM jobs"
+            params = []
+            if status:
+                query += " WHERE status = ?"
+                params.append(status)
+            query += " ORDER BY id LIMIT ?"
+            params.append(limit)
+            rows = conn.execute(query, params).fetchall()
+        fields = ("id", "path", "status", "attempts", "max_attempts", "worker", "error")
+        return [dict(zip(fields, row)) for row in rows]
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT，出错时回滚；事务开始即取得写锁，领取任务时不会有两个进程读到同一行"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# 队列地址的 scheme → 创建函数（参数为 scheme:// 之后的部分）
+QUEUE_BACKENDS = {
+    "sqlite": SQLiteQueue,
+    # 仅限单机：WAL 模式依赖共享内存
+    "sqlite-wal": lambda path: SQLiteQueue(path, wal=True),
+}
+
+
+def register_backend(scheme, factory):
+    """注册自定义队列存储，之后可用 --queue <scheme>://... 选用"""
+    QUEUE_BACKENDS[scheme] = factory
+
+
+def open_queue(address):
+    """按地址打开队列：'<scheme>://...'，没有 scheme 时视为 SQLite 文件路径"""
+    scheme, separator, rest = address.partition("://")
+    if not separator:
+        return SQLiteQueue(address)
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"不支持的队列类型: {scheme}")
+    return QUEUE_BACKENDS[scheme](rest)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueWorker:
+    """从队列领取任务交给 BatchCorrector.process_file 处理"""
+
+    def __init__(self, job_queue, batch, worker_id=None, lease_seconds=300, poll_interval=2.0):
+        """
+        Args:
+            job_queue: QueueBackend
+            batch: BatchCorrector，处理单个文件并返回结果记录
+            worker_id: worker 标识，默认为 主机名:进程号
+            lease_seconds: 租约时长，处理期间每 1/3 租约时长续租一次
+            poll_interval: 队列为空时的轮询间隔（秒）
+        """
+        self.queue = job_queue
+        self.batch = batch
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {"done": 0, "retried": 0, "dead": 0, "lost": 0}
+        # 已领取（包括正在领取）的任务数，用于 max_jobs 限制
+        self.claimed = 0
+
+    def _keep_lease(self, job, finished):
+        """后台续租，直到任务结束"""
+        while not finished.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(job.id, self.worker_id, self.lease_seconds):
+                print(f"  任务 {job.id} 的租约已失效")
+                return
+
+    def process(self, job):
+        print(f"领取任务 {job.id}: {job.path}（第 {job.attempts}/{job.max_attempts} 次）")
+        finished = threading.Event()
+        keeper = threading.Thread(target=self._keep_lease, args=(job, finished), daemon=True)
+        keeper.start()
+        try:
+            record = self.batch.process_file(job.path)
+        except Exception as e:
+            record = {"file": job.path, "success": False, "error": str(e)}
+        finally:
+            finished.set()
+            keeper.join()
+
+        if record.get("success"):
+            outcome = "done" if self.queue.complete(job.id, self.worker_id, record) else "lost"
+        else:
+            status = self.queue.fail(job.id, self.worker_id, record.get("error"))
+            outcome = {STATUS_QUEUED: "retried", STATUS_DEAD: "dead"}.get(status, "lost")
+        with self.lock:
+            self.stats[outcome] += 1
+        return outcome
+
+    def _loop(self, exit_when_empty, max_jobs):
+        while not self.stopping.is_set():
+            # 领取前先占一个名额，并发的领取循环合计不会超过 max_jobs
+            with self.lock:
+                if max_jobs is not None and self.claimed >= max_jobs:
+                    return
+                self.claimed += 1
+            job = self.queue.lease(self.worker_id, self.lease_seconds)
+            if job is None:
+                with self.lock:
+                    self.claimed -= 1
+                if exit_when_empty:
+                    # 还有等待重试或处理中的任务时继续等待，处理中的任务可能因租约过期回到队列
+                    counts = self.queue.stats()
+                    if not counts[STATUS_QUEUED] and not counts[STATUS_LEASED]:
+                        return
+                self.stopping.wait(self.poll_interval)
+                continue
+            self.process(job)
+
+    def run(self, concurrency=1, exit_when_empty=False, max_jobs=None):
+        """
+        持续领取并处理任务
+        Args:
+            concurrency: 同时处理的任务数（共用同一个 BatchCorrector）
+            exit_when_empty: 队列中没有可领取、也没有处理中的任务时退出
+            max_jobs: 处理这么多个任务后退出
+        """
+        print(f"worker {self.worker_id} 开始处理队列任务（并发 {concurrency}）")
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="queue-worker") as pool:
+            futures = [pool.submit(self._loop, exit_when_empty, max_jobs) for _ in range(concurrency)]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                # 已领取的任务不再续租，租约到期后由其他 worker 接手
+                print("\nworker 被中断，正在退出...")
+                self.stopping.set()
+        print(f"worker {self.worker_id} 退出: {self.stats}")
+        return self.stats
+
+
+def build_batch_corrector(args):
+    """按 worker 参数创建 BatchCorrector（与 integrated_corrector 的批量模式一致）"""
+    from batch_corrector import BatchCorrector
+    from ocr_backends import create_ocr_backend
+    from QwenRewrite import get_rewrite_func
+
+    corrector = None
+    if args.model_host:
+        from model_host import RemoteCorrector
+        corrector = RemoteCorrector(args.model_host)
+
+    ocr_func = None
+    if args.ocr_backend != "cloud":
+        ocr_func = create_ocr_backend(args.ocr_backend, lang=args.ocr_lang, min_confidence=args.ocr_min_confidence)
+
+    return BatchCorrector(
+        output_dir=args.output_dir,
+        use_models=args.models.split(",") if args.models else None,
+        corrector=corrector,
+        ocr_func=ocr_func,
+        text_threshold=args.text_threshold,
+        confusion_path=args.confusion_dict,
+        frame_batch_size=max(1, args.batch_frames),
+        merge_threshold=args.merge_threshold,
+        merge_max_gap=args.merge_max_gap,
+        rewrite_func=None if args.no_llm else get_rewrite_func(args.rewrite_mode),
+        llm=not args.no_llm,
+        network_workers=args.workers,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="持久化任务队列：提交任务、运行 worker")
+    parser.add_argument("--queue", default="jobs.db", help="队列地址：SQLite 文件路径或 <scheme>://...")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="提交文件到队列")
+    submit.add_argument("inputs", nargs="*", help="文件、目录或通配符")
+    submit.add_argument("--manifest", help="清单文件，每行一个路径、目录或通配符")
+    submit.add_argument("--recursive", action="store_true", help="递归展开目录")
+    submit.add_argument("--max-attempts", type=int, default=3, help="最多尝试次数，超过后进入死信")
+
+    worker = commands.add_parser("worker", help="从队列领取并处理任务")
+    worker.add_argument("--output-dir", default="batch_output", help="输出目录")
+    worker.add_argument("--concurrency", type=int, default=1, help="同时处理的任务数")
+    worker.add_argument("--lease-seconds", type=float, default=300, help="租约时长（秒）")
+    worker.add_argument("--poll-interval", type=float, default=2.0, help="队列为空时的轮询间隔（秒）")
+    worker.add_argument("--exit-when-empty", action="store_true", help="队列处理完后退出")
+    worker.add_argument("--max-jobs", type=int, help="处理这么多个任务后退出")
+    worker.add_argument("--models", help="逗号分隔的模型列表")
+    worker.add_argument("--model-host", help="使用 model_host.py 宿主进程中的模型")
+    worker.add_argument("--confusion-dict", help="额外的混淆集文件（confusion_miner.py 挖掘得到）")
+    worker.add_argument("--workers", type=int, default=8, help="网络请求线程数")
+    worker.add_argument("--no-llm", action="store_true", help="跳过大模型二级纠错")
+    worker.add_argument("--rewrite-mode", choices=["full", "edits"], default="full",
+                        help="二级纠错方式：full 整段改写，edits 只让大模型返回修改列表")
+    worker.add_argument("--ocr-backend", choices=["cloud", "local-only", "local-first"], default="cloud")
+    worker.add_argument("--ocr-lang", default="chi_sim", help="本地 OCR 的 Tesseract 语言包")
+    worker.add_argument("--ocr-min-confidence", type=float, default=0.6)
+    worker.add_argument("--text-threshold", type=float, default=0.002, help="视频抽帧的文字存在性预判阈值")
+    worker.add_argument("--batch-frames", type=int, default=1, help="视频每次 OCR 请求合并识别的帧数")
+    worker.add_argument("--merge-threshold", type=float, default=0.7, help="相邻文本段合并的相似度阈值")
+    worker.add_argument("--merge-max-gap", type=float, default=5.0, help="可合并文本段之间的最大时间间隔（秒）")
+
+    status = commands.add_parser("status", help="查看队列状态")
+    status.add_argument("--list", choices=STATUSES, help="列出该状态的任务")
+
+    requeue = commands.add_parser("requeue", help="把死信任务重新排队")
+    requeue.add_argument("--id", type=int, help="只重新排队该任务")
+
+    args = parser.parse_args(argv)
+    job_queue = open_queue(args.queue)
+
+    if args.command == "submit":
+        from batch_corrector import expand_inputs
+
+        files = expand_inputs(args.inputs, manifest_path=args.manifest, recursive=args.recursive)
+        if not files:
+            print("没有找到可处理的文件")
+            return 1
+        for path in files:
+            # 记录绝对路径，其他机器上的 worker 需能以同一路径访问（共享存储）
+            job_id = job_queue.enqueue(os.path.abspath(path), max_attempts=args.max_attempts)
+            print(f"  已提交 {job_id}: {path}")
+        print(f"共提交 {len(files)} 个任务到 {args.queue}")
+    elif args.command == "worker":
+        batch = build_batch_corrector(args)
+        os.makedirs(args.output_dir, exist_ok=True)
+        try:
+            QueueWorker(job_queue, batch, lease_seconds=args.lease_seconds,
+                        poll_interval=args.poll_interval).run(concurrency=args.concurrency,
+                                                              exit_when_empty=args.exit_when_empty,
+                                                              max_jobs=args.max_jobs)
+        finally:
+            batch.close()
+    elif args.command == "status":
+        print(json.dumps(job_queue.stats(), ensure_ascii=False))
+        if args.list:
+            for job in job_queue.list_jobs(args.list):
+                print(json.dumps(job, ensure_ascii=False))
+    else:
+        print(f"重新排队 {job_queue.requeue_dead(args.id)} 个死信任务")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
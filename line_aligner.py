@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+纠错结果与原文文本段的对齐
+
+大模型纠错时可能合并、拆分或丢弃行，按行号对应会让之后所有时间戳错位。
+这里把原文各段拼接后与纠错全文做字符级编辑距离对齐（带状动态规划，
+复杂度 O(n·w)），再按对齐关系把纠错文本切回各个原文段。
+重复性强的文本（如每行只差一个序号）逐字对齐容易整体错开，
+因此先用与原文段完全相同的行作为锚点，只在锚点之间做字符级对齐。
+"""
+from array import array
+from difflib import SequenceMatcher
+
+# 回溯方向
+_DIAGONAL = 0   # 匹配或替换
+_DELETE = 1     # 原文字符在纠错文本中被删除
+_INSERT = 2     # 纠错文本中插入的字符
+
+_INFINITY = 1 << 30
+
+# 对齐到的文本与原文段的相似度低于该值时认为对齐错位，保留原文段
+MIN_SIMILARITY = 0.5
+
+
+def _gap_cost(char):
+    """空白（含换行）的插入/删除不计代价，其余字符代价为1"""
+    return 0 if char.isspace() else 1
+
+
+def align_characters(source, target, band=64, boundaries=None):
+    """
+    带状编辑距离对齐
+    Args:
+        source: 原文字符串
+        target: 纠错后字符串
+        band: 对角带半宽；带的中心沿 len(target)/len(source) 的斜率移动
+        boundaries: 原文中的段边界位置集合；给定时纠错文本中的换行只有
+                    落在段边界上才不计代价，否则按普通字符计代价
+    Returns:
+        list[(i, j)]: 对齐路径，i 为原文下标、j 为纠错文本下标，
+                      其中一方为 None 表示删除或插入
+    """
+    n, m = len(source), len(target)
+    if n == 0:
+        return [(None, j) for j in range(m)]
+    if m == 0:
+        return [(i, None) for i in range(n)]
+
+    # 带宽至少要覆盖相邻两行中心的跳跃量，保证路径连通
+    width = max(band, -(-m // n) + 1)
+    span = 2 * width + 1
+
+    def center(i):
+        return (i * m) // n
+
+    def insert_cost(i, char):
+        if char == "\n" and boundaries is not None and i not in boundaries:
+            return 1
+        return _gap_cost(char)
+
+    costs_prev = array("l", [_INFINITY]) * span
+    moves = array("b", [-1]) * ((n + 1) * span)
+
+    # 第 0 行：只能连续插入
+    base = center(0) - width
+    running = 0
+    for j in range(0, min(m, base + span - 1) + 1):
+        if j > 0:
+            running += insert_cost(0, target[j - 1])
+        k = j - base
+        if 0 <= k < span:
+            costs_prev[k] = running
+            moves[k] = _INSERT
+
+    for i in range(1, n + 1):
+        costs_cur = array("l", [_INFINITY]) * span
+        base = center(i) - width
+        prev_base = center(i - 1) - width
+        source_char = source[i - 1]
+        delete_cost = _gap_cost(source_char)
+        row = i * span
+        for k in range(span):
+            j = base + k
+            if j < 0 or j > m:
+                continue
+            best = _INFINITY
+            move = -1
+            # 删除：来自 (i-1, j)
+            pk = j - prev_base
+            if 0 <= pk < span and costs_prev[pk] < _INFINITY:
+                best = costs_prev[pk] + delete_cost
+                move = _DELETE
+            if j > 0:
+                # 匹配/替换：来自 (i-1, j-1)
+                pk = j - 1 - prev_base
+                if 0 <= pk < span and costs_prev[pk] < _INFINITY:
+                    cost = costs_prev[pk] + (0 if source_char == target[j - 1] else 1)
+                    if cost < best or (cost == best and move != _DIAGONAL):
+                        best = cost
+                        move = _DIAGONAL
+                # 插入：来自 (i, j-1)
+                if k > 0 and costs_cur[k - 1] < _INFINITY:
+                    cost = costs_cur[k - 1] + insert_cost(i, target[j - 1])
+                    if cost < best:
+                        best = cost
+                        move = _INSERT
+            costs_cur[k] = best
+            moves[row + k] = move
+        costs_prev = costs_cur
+
+    # 回溯
+    path = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        k = j - (center(i) - width)
+        move = moves[i * span + k] if 0 <= k < span else -1
+        if move == _DIAGONAL:
+            path.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif move == _DELETE:
+            path.append((i - 1, None))
+            i -= 1
+        elif move == _INSERT:
+            path.append((None, j - 1))
+            j -= 1
+        else:
+            raise ValueError("对齐失败：带宽不足，请增大 band")
+    path.reverse()
+    return path
+
+
+def align_to_segments(source_segments, corrected_text, band=64, min_similarity=MIN_SIMILARITY):
+    """
+    把纠错后的全文切回各个原文段：与原文段完全相同的行直接对应，其余部分按字符对齐
+    Args:
+        source_segments: list[str]，原文各段（与时间戳一一对应）
+        corrected_text: 纠错后的全文，行数不必与原文段数一致
+        band: 对角带半宽
+        min_similarity: 字符对齐得到的文本与原文段的相似度低于该值时保留原文段
+    Returns:
+        list[str]: 每个原文段对应的纠错文本；某段在纠错文本中完全缺失或对齐不可信时保留原文
+    """
+    source_segments = list(source_segments)
+    corrected_lines = corrected_text.split("\n")
+    matcher = SequenceMatcher(None, [segment.strip() for segment in source_segments],
+                              [line.strip() for line in corrected_lines], autojunk=False)
+    aligned = []
+    source_start = corrected_start = 0
+    for source_anchor, corrected_anchor, size in matcher.get_matching_blocks():
+        # 两个锚点之间的原文段和纠错行
+        gap = _align_characters_to_segments(source_segments[source_start:source_anchor],
+                                            "\n".join(corrected_lines[corrected_start:corrected_anchor]), band)
+        for segment, text in zip(source_segments[source_start:source_anchor], gap):
+            similar = SequenceMatcher(None, segment, text, autojunk=False).ratio() >= min_similarity
+            aligned.append(text if similar else segment)
+        aligned.extend(line.strip() or segment for segment, line in
+                       zip(source_segments[source_anchor:source_anchor + size],
+                           corrected_lines[corrected_anchor:corrected_anchor + size]))
+        source_start, corrected_start = source_anchor + size, corrected_anchor + size
+    return aligned
+
+
+def _align_characters_to_segments(source_segments, corrected_text, band):
+    """按字符对齐把纠错文本切回各个原文段；某段在纠错文本中完全缺失时保留原文"""
+    source = "".join(source_segments)
+    if not source:
+        return list(source_segments)
+
+    # 原文每个字符所属的段号，以及每段的结束位置
+    owner = []
+    for index, segment in enumerate(source_segments):
+        owner.extend([index] * len(segment))
+    segment_ends = {0}
+    position = 0
+    for segment in source_segments:
+        position += len(segment)
+        segment_ends.add(position)
+
+    pieces = [[] for _ in source_segments]
+    matched = [0] * len(source_segments)
+    current = 0             # 插入字符归属的段
+    at_boundary = True      # 上一个原文字符恰好是某段的末尾
+    for i, j in align_characters(source, corrected_text, band=band, boundaries=segment_ends):
+        if i is not None:
+            current = owner[i]
+            at_boundary = (i + 1) in segment_ends
+            if j is not None:
+                pieces[current].append(corrected_text[j])
+                if corrected_text[j] == source[i]:
+                    matched[current] += 1
+            continue
+        char = corrected_text[j]
+        # 段边界处插入的换行表示进入下一段
+        if char == "\n" and at_boundary and current + 1 < len(source_segments) and pieces[current]:
+            current += 1
+            at_boundary = False
+        pieces[current].append(char)
+
+    pieces = ["".join(piece) for piece in pieces]
+    _release_dropped_segments(source_segments, pieces, matched)
+
+    aligned = []
+    for segment, piece in zip(source_segments, pieces):
+        text = "".join(part.strip() for part in piece.split("\n"))
+        aligned.append(text if text else segment)
+    return aligned
+
+
+def _release_dropped_segments(source_segments, pieces, matched):
+    """
+    处理被纠错文本整段丢弃的原文段
+
+    编辑距离对一整段的删除位置不敏感，相邻段的个别字符可能被对齐到被丢弃的段上。
+    若某段对齐到的内容很短且几乎不与原文相同，就视为被丢弃：换行之前的字符
+    还给上一段，换行之后的字符交给下一段，该段本身保留原文。
+    """
+    for index, (segment, piece) in enumerate(zip(source_segments, pieces)):
+        content = piece.replace("\n", "").strip()
+        if not content or len(content) * 2 > len(segment) or matched[index] * 2 > len(segment):
+            continue
+        previous = next((k for k in range(index - 1, -1, -1) if pieces[k].strip()), None)
+        following = next((k for k in range(index + 1, len(pieces)) if pieces[k].strip()), None)
+        if previous is None and following is None:
+            continue
+        head, _, tail = piece.partition("\n")
+        pieces[index] = ""
+        if previous is None:
+            head, tail = "", head + tail
+        if following is None:
+            head, tail = head + tail, ""
+        if head.strip():
+            pieces[previous] += head
+        if tail.strip():
+            pieces[following] = tail + pieces[following]
@@ -1,9 +1,10 @@
 import subprocess
 import sys
 import os
-import cv2
 from pathlib import Path
 
+from line_aligner import align_to_segments
+
 # 设置控制台编码为UTF-8（解决Windows中文显示问题）
 import locale
 if sys.platform == "win32":
@@ -321,22 +322,13 @@ def create_timestamped_correction():
     with open("corrected_output.txt", "r", encoding='utf-8') as f:
         corrected_content = f.read().strip()
     
-    # 处理纠错结果 - 可能是单行或多行
-    if '\n' in corrected_content:
-        corrected_lines = corrected_content.split('\n')
-    else:
-        # 如果是单行文本，按原文分割数量来处理
-        corrected_lines = [corrected_content] * len(timestamps_data)
+    # 按字符对齐把纠错结果切回各时间段，行数不一致（合并/拆分/丢行）时时间戳也不会错位
+    aligned_lines = align_to_segments([text for _, text in timestamps_data], corrected_content)
     
     # 匹配纠错结果与时间戳
     corrected_with_timestamps = []
     
-    for i, (timestamp_str, original_text) in enumerate(timestamps_data):
-        if i < len(corrected_lines):
-            corrected_text = corrected_lines[i].strip()
-        else:
-            corrected_text = corrected_content.strip()  # 使用完整的纠错结果
-        
+    for (timestamp_str, original_text), corrected_text in zip(timestamps_data, aligned_lines):
         # 检查是否有修改
         if corrected_text != original_text:
             corrected_with_timestamps.append(f"[{timestamp_str}] 原文: {original_text}")
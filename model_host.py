@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+模型宿主进程：同一台机器上的多个纠错 worker 共享一份常驻模型
+
+# 启动宿主（加载一次模型，fork 出 4 个服务进程，模型权重以写时复制方式共享）
+python model_host.py --address 127.0.0.1:6100 --models kenlm,macbert,ernie,confusion --processes 4
+
+# worker 通过 IPC 调用宿主，不再各自加载模型
+python correction_server.py --model-host 127.0.0.1:6100
+python integrated_corrector.py --batch input_dir/ --model-host 127.0.0.1:6100
+
+地址可以是 host:port（TCP）或文件路径（Unix 域套接字）。
+连接会反序列化（unpickle）请求，认证密钥决定了谁能在宿主进程中执行代码：
+设置了环境变量 MODEL_HOST_AUTHKEY 时宿主与 worker 都使用它（跨机器时必须设置）；
+否则宿主启动时随机生成密钥，写入只有当前用户可读（0600）的密钥文件，同一台机器上的 worker 从该文件读取。
+密钥文件默认为 Unix 套接字路径加 .key，TCP 地址为 ~/.model_host/<host>_<port>.key，可用 --authkey-file 指定。
+"""
+import os
+import gc
+import sys
+import time
+import re
+import argparse
+import threading
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Listener
+
+from deadline_scheduler import SKIP_BUDGET, SKIP_DEADLINE, SKIP_ERROR, LatencyTracker
+
+AUTHKEY_ENV = "MODEL_HOST_AUTHKEY"
+
+# 允许远程调用的方法
+REMOTE_METHODS = ("correct_single_model", "correct_text", "correct_text_multi", "correct_lines",
+                  "correct_with_deadline", "health")
+
+
+def parse_address(address):
+    """'host:port' 解析为 TCP 地址，其余视为 Unix 域套接字路径"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def default_authkey_file(address):
+    """宿主地址对应的默认密钥文件路径"""
+    if isinstance(address, str):
+        return address + ".key"
+    host, port = address
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{host}_{port}")
+    return os.path.join(os.path.expanduser("~"), ".model_host", name + ".key")
+
+
+def create_authkey(address, authkey_file=None):
+    """
+    宿主端：优先使用环境变量中的密钥，否则随机生成并写入 0600 的密钥文件
+    Returns:
+        bytes: 认证密钥
+    """
+    key = os.getenv(AUTHKEY_ENV)
+    if key:
+        return key.encode("utf-8")
+    authkey = os.urandom(32)
+    path = authkey_file or default_authkey_file(address)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    # 先删除旧文件再以 O_EXCL 创建，保证文件从创建起就是 0600，不会沿用别人预先放好的文件
+    if os.path.lexists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey.hex().encode("ascii"))
+    print(f"认证密钥已写入 {path}")
+    return authkey
+
+
+def load_authkey(address, authkey_file=None):
+    """
+    worker 端：优先使用环境变量中的密钥，否则读取宿主写出的密钥文件
+    Returns:
+        bytes: 认证密钥
+    """
+    key = os.getenv(AUTHKEY_ENV)
+    if key:
+        return key.encode("utf-8")
+    path = authkey_file or default_authkey_file(address)
+    try:
+        with open(path, "rb") as f:
+            return bytes.fromhex(f.read().decode("ascii").strip())
+    except FileNotFoundError:
+        raise RuntimeError(f"找不到模型宿主的密钥文件 {path}：请先启动宿主，"
+                           f"或在宿主和 worker 上设置相同的环境变量 {AUTHKEY_ENV}") from None
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB），读取不到时返回 None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class ModelHost:
+    """持有一个 TextFileCorrector，在监听地址上响应纠错请求"""
+
+    def __init__(self, corrector, address, authkey=None, authkey_file=None):
+        """
+        Args:
+            authkey: 认证密钥，默认见 create_authkey
+            authkey_file: 随机生成密钥时写入的文件，默认见 default_authkey_file
+        """
+        self.corrector = corrector
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey = authkey
+        self.authkey_file = authkey_file
+        self.listener = None
+        self.started = time.time()
+        self.requests = 0
+        # 模型不保证线程安全，同一进程内的调用串行执行
+        self.lock = threading.Lock()
+
+    def correct_single_model(self, text, model_name):
+        return self.corrector.correct_single_model(text, model_name)
+
+    def correct_text(self, text, strategy="voting", with_details=False):
+        details = {} if with_details else None
+        target = self.corrector.correct_text(text, strategy=strategy, details=details)
+        return (target, details) if with_details else target
+
+    def correct_text_multi(self, text, strategies=("voting", "pipeline"), with_details=False):
+        details = {} if with_details else None
+        outputs = self.corrector.correct_text_multi(text, list(strategies), details=details)
+        return (outputs, details) if with_details else outputs
+
+    def correct_lines(self, lines, strategy="voting"):
+        return [self.corrector.correct_text(line, strategy=strategy) if line.strip() else line
+                for line in lines]
+
+    def correct_with_deadline(self, text, timeout=None):
+        # 两端的 time.monotonic() 不可比较，客户端传来的是剩余秒数
+        return self.corrector.correct_with_deadline(text, timeout=timeout)
+
+    def health(self):
+        return {
+            "pid": os.getpid(),
+            "models": list(self.corrector.available_models),
+            "requests": self.requests,
+            "uptime": round(time.time() - self.started, 1),
+            "rss_mb": current_rss_mb(),
+        }
+
+    def _handle_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if method not in REMOTE_METHODS:
+                    conn.send(("error", f"不支持的方法: {method}"))
+                    continue
+                try:
+                    with self.lock:
+                        self.requests += 1
+                        result = getattr(self, method)(*args, **kwargs)
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+
+    def serve_forever(self):
+        """接受连接，每个连接一个线程"""
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError) as e:
+                # 认证失败等单个连接的错误不影响后续连接
+                print(f"[{os.getpid()}] 连接失败: {e}")
+                continue
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def run(self, processes=1):
+        """
+        开始监听。processes > 1 时在模型加载完成后 fork 出多个服务进程，
+        它们共享同一个监听套接字和同一份（写时复制的）模型内存
+        """
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        if self.authkey is None:
+            self.authkey = create_authkey(self.address, self.authkey_file)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        print(f"模型宿主已启动: {self.address}，模型: {self.corrector.available_models}，"
+              f"常驻内存 {current_rss_mb()}MB")
+
+        if processes <= 1:
+            try:
+                self.serve_forever()
+            except KeyboardInterrupt:
+                print("\n模型宿主已停止")
+            finally:
+                self.listener.close()
+            return
+
+        # 把加载阶段产生的对象移出垃圾回收跟踪，避免子进程的 GC 写这些页面触发复制
+        gc.collect()
+        gc.freeze()
+        context = get_context("fork")
+        workers = [context.Process(target=self.serve_forever, name=f"model-host-{index}", daemon=True)
+                   for index in range(processes)]
+        for worker in workers:
+            worker.start()
+        print(f"已 fork {processes} 个服务进程: {[worker.pid for worker in workers]}")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            print("\n模型宿主已停止")
+        finally:
+            for worker in workers:
+                worker.terminate()
+            self.listener.close()
+
+
+class RemoteCorrectorError(RuntimeError):
+    """模型宿主返回的错误"""
+
+
+class RemoteCorrector:
+    """
+    模型宿主的客户端，提供与 TextFileCorrector 相同的纠错接口，
+    可直接传给 CorrectionService 和 BatchCorrector 的 corrector 参数
+    """
+
+    def __init__(self, address, authkey=None, authkey_file=None, connect_timeout=30.0):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey_file = authkey_file
+        self.authkey = authkey
+        self.lock = threading.Lock()
+        self.conn = None
+        self.line_profiler = None
+        # 大模型阶段在本进程运行，其耗时估计也在本进程记录
+        self.latency = LatencyTracker()
+        self._connect(connect_timeout)
+        self.available_models = self.health()["models"]
+
+    def _connect(self, timeout=0.0):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                # 宿主重启后会生成新的密钥，重连时重新读取密钥文件
+                authkey = self.authkey or load_authkey(self.address, self.authkey_file)
+                self.conn = Client(self.address, authkey=authkey)
+                return
+            except (ConnectionRefusedError, FileNotFoundError, RuntimeError):
+                # 宿主可能还在加载模型
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _ensure_connection(self):
+        """
+        发送请求前检查连接：没有请求在途时连接上不应有可读数据，
+        可读说明宿主已关闭连接（重启等），此时重新建立连接
+        """
+        if self.conn is not None:
+            try:
+                stale = self.conn.poll()
+            except (EOFError, OSError):
+                stale = True
+            if stale:
+                self.conn.close()
+                self.conn = None
+        if self.conn is None:
+            self._connect()
+
+    def _call(self, method, *args, **kwargs):
+        with self.lock:
+            self._ensure_connection()
+            try:
+                self.conn.send((method, args, kwargs))
+                status, result = self.conn.recv()
+            except (EOFError, OSError) as e:
+                # 请求发出后宿主可能已经执行过，不能重发；丢弃连接，下次调用时重连
+                self.conn.close()
+                self.conn = None
+                raise RemoteCorrectorError(f"与模型宿主的连接中断: {e}") from e
+        if status != "ok":
+            raise RemoteCorrectorError(result)
+        return result
+
+    def correct_single_model(self, text, model_name):
+        return self._call("correct_single_model", text, model_name)
+
+    def correct_text(self, text, strategy="voting", details=None):
+        if details is None:
+            return self._call("correct_text", text, strategy=strategy)
+        target, remote_details = self._call("correct_text", text, strategy=strategy, with_details=True)
+        details.update(remote_details)
+        return target
+
+    def correct_text_multi(self, text, strategies=("voting", "pipeline"), details=None):
+        if details is None:
+            return self._call("correct_text_multi", text, strategies=list(strategies))
+        outputs, remote_details = self._call("correct_text_multi", text, strategies=list(strategies),
+                                             with_details=True)
+        details.update(remote_details)
+        return outputs
+
+    def correct_lines(self, lines, strategy="voting"):
+        """整批发送，减少往返次数"""
+        return self._call("correct_lines", list(lines), strategy=strategy)
+
+    def correct_with_deadline(self, text, timeout=None, deadline=None, rewrite=None):
+        """
+        与 TextFileCorrector.correct_with_deadline 相同：模型阶段在宿主中按剩余时间调度，
+        大模型阶段（rewrite）在本进程运行
+        """
+        started = time.monotonic()
+        if deadline is None:
+            deadline = started + timeout if timeout is not None else float('inf')
+        remaining = None if deadline == float('inf') else max(0.0, deadline - started)
+        result = self._call("correct_with_deadline", text, timeout=remaining)
+
+        if rewrite is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                result["skipped"]["llm"] = SKIP_DEADLINE
+            elif self.latency.estimate("llm") > remaining:
+                result["skipped"]["llm"] = SKIP_BUDGET
+            else:
+                start_time = time.time()
+                try:
+                    target = rewrite(result["target"]).strip()
+                    self.latency.observe("llm", time.time() - start_time)
+                    result["target"] = target or result["target"]
+                    result["stages"].append("llm")
+                except Exception as e:
+                    print(f"  阶段 llm 出错: {e}")
+                    result["skipped"]["llm"] = SKIP_ERROR
+        finished = time.monotonic()
+        result["elapsed"] = round(finished - started, 4)
+        result["deadline_met"] = finished <= deadline
+        return result
+
+    def health(self):
+        return self._call("health")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="纠错模型宿主进程")
+    parser.add_argument("--address", default="127.0.0.1:6100", help="监听地址，host:port 或 Unix 套接字路径")
+    parser.add_argument("--models", default="kenlm,macbert,ernie,confusion", help="逗号分隔的模型列表")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="加载完模型后 fork 出的服务进程数（仅支持 fork 的系统）")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch", help="MacBERT 推理后端")
+    parser.add_argument("--onnx-dir", default="models/macbert_onnx", help="ONNX 模型目录")
+    parser.add_argument("--confusion-dict", help="额外的混淆集文件（confusion_miner.py 挖掘得到）")
+    parser.add_argument("--authkey-file", help="随机生成的认证密钥写入的文件（未设置 MODEL_HOST_AUTHKEY 时）")
+    args = parser.parse_args()
+
+    from text_file_corrector import TextFileCorrector
+
+    corrector = TextFileCorrector(use_models=[name.strip() for name in args.models.split(",") if name.strip()],
+                                  backend=args.backend, onnx_dir=args.onnx_dir, confusion_path=args.confusion_dict)
+    if not corrector.available_models:
+        print("错误：没有可用的纠错模型，请检查模型安装")
+        sys.exit(1)
+    ModelHost(corrector, args.address, authkey_file=args.authkey_file).run(processes=args.processes)
+
+
+if __name__ == "__main__":
+    main()
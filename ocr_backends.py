@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+OCR 后端
+
+- cloud：通义千问 qwen-vl-ocr（Recognition.py），需要网络和 API Key
+- local-only：本地 Tesseract（chi_sim），离线运行，适合批量任务
+- local-first：先用本地引擎识别，置信度低于阈值时再请求云端
+
+# 视频离线识别
+python integrated_corrector.py video.mp4 --ocr-backend local-only
+# 本地优先，置信度低于 0.7 的帧交给云端
+python integrated_corrector.py video.mp4 --ocr-backend local-first --ocr-min-confidence 0.7
+
+本地引擎需要安装 tesseract 及中文语言包，以及 pip install pytesseract pillow。
+"""
+import re
+from collections import namedtuple
+
+from pipeline_metrics import metrics
+
+# 与 Recognition.py 的提示词约定一致：图片中没有文字时的输出
+NO_TEXT = "无文字内容"
+
+OCR_POLICIES = ("cloud", "local-only", "local-first")
+
+# text: 识别文本（无文字时为 NO_TEXT）；confidence: 0-1，云端结果为 None；backend: 实际给出结果的后端
+OCRResult = namedtuple("OCRResult", ["text", "confidence", "backend"])
+
+
+class OCRBackend:
+    """OCR 后端基类：子类实现 recognize，按需覆盖 recognize_batch"""
+
+    name = "base"
+
+    def recognize(self, image_path):
+        """识别单张图片，返回 OCRResult；识别失败返回 None"""
+        raise NotImplementedError
+
+    def recognize_batch(self, image_paths):
+        """识别多张图片，返回与输入顺序一致的 OCRResult 列表（失败的项为 None）"""
+        return [self.recognize(path) for path in image_paths]
+
+    def __call__(self, image_path):
+        """作为 ocr_func 使用时只返回文本"""
+        result = self.recognize(image_path)
+        return result.text if result else None
+
+
+class QwenOCRBackend(OCRBackend):
+    """通义千问 OCR"""
+
+    name = "qwen"
+
+    def __init__(self, runner=None):
+        """
+        Args:
+            runner: 输入图片路径列表、返回识别文本列表（失败返回 None）的函数，
+                    integrated_corrector 传入调用 Recognition.py 子进程的函数；默认在进程内调用
+        """
+        self.runner = runner or self._run_in_process
+
+    @staticmethod
+    def _run_in_process(image_paths):
+        from Recognition import recognize_image, recognize_images_batch
+
+        if len(image_paths) == 1:
+            return [recognize_image(image_paths[0])]
+        return recognize_images_batch(image_paths)
+
+    def recognize(self, image_path):
+        return self.recognize_batch([image_path])[0]
+
+    def recognize_batch(self, image_paths):
+        texts = self.runner(list(image_paths))
+        # 多帧结果无法拆分时，退回逐张识别
+        if texts is None and len(image_paths) > 1:
+            print(f"  多帧识别失败，改为逐帧识别")
+            texts = []
+            for path in image_paths:
+                single = self.runner([path])
+                texts.append(single[0] if single else None)
+        if texts is None:
+            return [None] * len(image_paths)
+        metrics.incr("ocr_cloud_images", len(image_paths))
+        return [OCRResult(text, None, self.name) if text is not None else None for text in texts]
+
+
+class TesseractOCRBackend(OCRBackend):
+    """本地 Tesseract OCR，按词置信度的平均值给出整张图片的置信度"""
+
+    name = "tesseract"
+
+    def __init__(self, lang="chi_sim", config="--psm 6"):
+        import pytesseract
+
+        # 提前确认 tesseract 可执行文件可用
+        pytesseract.get_tesseract_version()
+        self.pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def recognize(self, image_path):
+        with metrics.stage("ocr_local"):
+            data = self.pytesseract.image_to_data(image_path, lang=self.lang, config=self.config,
+                                                  output_type=self.pytesseract.Output.DICT)
+        metrics.incr("ocr_local_images")
+
+        lines = {}
+        confidences = []
+        for word, conf, block, paragraph, line in zip(data["text"], data["conf"], data["block_num"],
+                                                      data["par_num"], data["line_num"]):
+            word = word.strip()
+            if not word or float(conf) < 0:
+                continue
+            confidences.append(float(conf) / 100)
+            lines.setdefault((block, paragraph, line), []).append(word)
+
+        if not lines:
+            return OCRResult(NO_TEXT, None, self.name)
+        text = "\n".join(_join_words(words) for words in lines.values())
+        return OCRResult(text, sum(confidences) / len(confidences), self.name)
+
+
+def _join_words(words):
+    """相邻的两个英文/数字词之间加空格，中文之间不加"""
+    text = words[0]
+    for word in words[1:]:
+        if re.match(r"[A-Za-z0-9]", word) and re.search(r"[A-Za-z0-9]$", text):
+            text += " "
+        text += word
+    return text
+
+
+class RoutingOCRBackend(OCRBackend):
+    """本地优先：本地识别置信度低于阈值时请求云端"""
+
+    name = "local-first"
+
+    def __init__(self, local, cloud, min_confidence=0.6):
+        self.local = local
+        self.cloud = cloud
+        self.min_confidence = min_confidence
+
+    def _needs_cloud(self, result):
+        # 本地判定无文字（没有任何词）时不再请求云端
+        if result is None:
+            return True
+        return result.confidence is not None and result.confidence < self.min_confidence
+
+    def recognize_batch(self, image_paths):
+        results = []
+        for path in image_paths:
+            try:
+                results.append(self.local.recognize(path))
+            except Exception as e:
+                print(f"  本地识别失败: {e}")
+                results.append(None)
+
+        fallback = [index for index, result in enumerate(results) if self._needs_cloud(result)]
+        if fallback:
+            metrics.incr("ocr_cloud_fallbacks", len(fallback))
+            cloud_results = self.cloud.recognize_batch([image_paths[index] for index in fallback])
+            for index, cloud_result in zip(fallback, cloud_results):
+                # 云端也失败时保留本地结果
+                if cloud_result is not None:
+                    results[index] = cloud_result
+        return results
+
+    def recognize(self, image_path):
+        return self.recognize_batch([image_path])[0]
+
+
+def create_ocr_backend(policy="cloud", cloud_runner=None, lang="chi_sim", min_confidence=0.6):
+    """
+    按路由策略创建 OCR 后端
+    Args:
+        policy: 'cloud'、'local-only' 或 'local-first'
+        cloud_runner: 云端识别的执行函数，见 QwenOCRBackend
+        lang: Tesseract 语言包
+        min_confidence: local-first 下请求云端的置信度阈值
+    """
+    if policy not in OCR_POLICIES:
+        raise ValueError(f"不支持的 OCR 策略: {policy}")
+    if policy == "cloud":
+        return QwenOCRBackend(cloud_runner)
+    local = TesseractOCRBackend(lang=lang)
+    if policy == "local-only":
+        return local
+    return RoutingOCRBackend(local, QwenOCRBackend(cloud_runner), min_confidence=min_confidence)
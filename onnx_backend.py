@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+MacBERT 的 ONNX Runtime 推理后端（可选 INT8 动态量化）
+
+# 导出模型（默认同时生成 INT8 量化版本）
+python onnx_backend.py export --output-dir models/macbert_onnx
+
+# 在验证集上对比 PyTorch 与 ONNX 的输出是否一致，并给出吞吐
+python onnx_backend.py validate --onnx-dir models/macbert_onnx --threads 4 --lines 300
+python onnx_backend.py validate --onnx-dir models/macbert_onnx --input noisy.txt --reference clean.txt
+
+在纠错器中使用：
+TextFileCorrector(use_models=['macbert', 'confusion'], backend='onnx', onnx_dir='models/macbert_onnx')
+
+导出需要 torch、transformers、onnx；推理只需要 onnxruntime 和 transformers 的分词器，不加载 torch。
+ERNIE-CSC 依赖 paddlenlp 的检测+纠正双头结构和拼音输入，暂不提供 ONNX 版本，仍走 pycorrector 默认路径。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+DEFAULT_MACBERT_MODEL = "shibing624/macbert4csc-base-chinese"
+FP32_MODEL_NAME = "macbert.onnx"
+INT8_MODEL_NAME = "macbert.int8.onnx"
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def is_chinese_char(char):
+    return "一" <= char <= "鿿"
+
+
+def export_macbert_onnx(output_dir, model_name=DEFAULT_MACBERT_MODEL, quantize=True, opset=14):
+    """
+    把 MacBERT 导出为 ONNX，并可选地做 INT8 动态量化
+    Args:
+        output_dir: 输出目录（同时保存分词器）
+        model_name: Hugging Face 模型名或本地目录
+        quantize: 是否额外生成 INT8 量化模型
+    Returns:
+        str: 推荐使用的模型路径（量化时为 INT8 模型）
+    """
+    import torch
+    from transformers import BertForMaskedLM, BertTokenizerFast
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = BertTokenizerFast.from_pretrained(model_name)
+    model = BertForMaskedLM.from_pretrained(model_name)
+    model.eval()
+    # 导出时只保留 logits 一个输出
+    model.config.return_dict = False
+
+    dummy = tokenizer(["今天天气很好"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, FP32_MODEL_NAME)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES}
+    dynamic_axes["logits"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in INPUT_NAMES),
+            fp32_path,
+            input_names=INPUT_NAMES,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+    print(f"✓ 已导出 ONNX 模型: {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(output_dir, INT8_MODEL_NAME)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✓ 已生成 INT8 量化模型: {int8_path}")
+    return int8_path
+
+
+def find_onnx_model(onnx_dir, prefer_int8=True):
+    """在导出目录中查找模型文件，默认优先使用量化版本"""
+    names = [INT8_MODEL_NAME, FP32_MODEL_NAME] if prefer_int8 else [FP32_MODEL_NAME, INT8_MODEL_NAME]
+    for name in names:
+        path = os.path.join(onnx_dir, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"{onnx_dir} 中没有找到 ONNX 模型，请先运行 python onnx_backend.py export")
+
+
+class OnnxMacBertCorrector:
+    """用 ONNX Runtime 推理的 MacBERT 纠错器，返回格式与 pycorrector.MacBertCorrector 一致"""
+
+    def __init__(self, onnx_dir, intra_op_threads=None, prefer_int8=True, max_length=128, batch_size=32):
+        """
+        Args:
+            onnx_dir: export_macbert_onnx 的输出目录
+            intra_op_threads: ONNX Runtime 单个算子内部的线程数，None 表示由运行时决定
+            prefer_int8: 目录中同时存在两种模型时优先使用 INT8 量化版本
+            max_length: 单句最大 token 数，超出部分保持原样
+            batch_size: correct_batch 每次送入模型的句子数
+        """
+        import onnxruntime as ort
+        from transformers import BertTokenizerFast
+
+        self.model_path = find_onnx_model(onnx_dir, prefer_int8)
+        self.tokenizer = BertTokenizerFast.from_pretrained(onnx_dir)
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.session_inputs = {item.name for item in self.session.get_inputs()}
+
+    def correct(self, sentence):
+        return self.correct_batch([sentence])[0]
+
+    def correct_batch(self, sentences):
+        results = []
+        for start in range(0, len(sentences), self.batch_size):
+            results.extend(self._correct_chunk(sentences[start:start + self.batch_size]))
+        return results
+
+    def _correct_chunk(self, sentences):
+        encoded = self.tokenizer(sentences, padding=True, truncation=True, max_length=self.max_length,
+                                 return_offsets_mapping=True, return_tensors="np")
+        offsets = encoded.pop("offset_mapping")
+        feeds = {name: encoded[name].astype("int64") for name in INPUT_NAMES if name in self.session_inputs}
+        logits = self.session.run(["logits"], feeds)[0]
+        predictions = logits.argmax(axis=-1)
+
+        unk_id = self.tokenizer.unk_token_id
+        results = []
+        for row, sentence in enumerate(sentences):
+            chars = list(sentence)
+            errors = []
+            for position, (start, end) in enumerate(offsets[row]):
+                # 只对单个汉字 token 做替换，特殊符号、英文子词和未登录字保持原样
+                if end - start != 1 or encoded["input_ids"][row][position] == unk_id:
+                    continue
+                original = sentence[start]
+                predicted = self.tokenizer.convert_ids_to_tokens(int(predictions[row][position]))
+                if (len(predicted) == 1 and predicted != original
+                        and is_chinese_char(original) and is_chinese_char(predicted)):
+                    chars[start] = predicted
+                    errors.append((original, predicted, start))
+            results.append({"source": sentence, "target": "".join(chars), "errors": errors})
+        return results
+
+
+def validate_equivalence(reference, candidate, lines, clean_lines=None, show_mismatches=10):
+    """
+    在验证集上比较两个纠错器的输出
+    Args:
+        reference: 基准纠错器（通常是 pycorrector 的 MacBertCorrector）
+        candidate: 待验证的纠错器（OnnxMacBertCorrector）
+        lines: 待纠错的句子
+        clean_lines: 对应的正确句子（可选），给出时额外统计两者的整行纠正率
+    Returns:
+        dict: 一致率、吞吐、加速比以及部分不一致的样例
+    """
+    lines = list(lines)
+    if not lines:
+        raise ValueError("验证集为空，至少需要一句")
+
+    def run(corrector):
+        start = time.perf_counter()
+        if hasattr(corrector, "correct_batch"):
+            outputs = [item["target"] for item in corrector.correct_batch(lines)]
+        else:
+            outputs = [corrector.correct(line)["target"] for line in lines]
+        return outputs, time.perf_counter() - start
+
+    # 先各跑一句预热，避免首次推理的初始化开销计入吞吐
+    reference.correct(lines[0])
+    candidate.correct(lines[0])
+    reference_outputs, reference_time = run(reference)
+    candidate_outputs, candidate_time = run(candidate)
+
+    mismatches = [{"source": line, "reference": ref, "candidate": cand}
+                  for line, ref, cand in zip(lines, reference_outputs, candidate_outputs) if ref != cand]
+    report = {
+        "lines": len(lines),
+        "identical": len(lines) - len(mismatches),
+        "agreement_rate": round((len(lines) - len(mismatches)) / len(lines), 4),
+        "reference_lines_per_second": round(len(lines) / reference_time, 3),
+        "candidate_lines_per_second": round(len(lines) / candidate_time, 3),
+        "speedup": round(reference_time / candidate_time, 3) if candidate_time > 0 else None,
+        "mismatches": mismatches[:show_mismatches],
+    }
+    if clean_lines:
+        report["reference_exact_match_rate"] = round(
+            sum(out == clean for out, clean in zip(reference_outputs, clean_lines)) / len(lines), 4)
+        report["candidate_exact_match_rate"] = round(
+            sum(out == clean for out, clean in zip(candidate_outputs, clean_lines)) / len(lines), 4)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MacBERT ONNX 推理后端")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出 ONNX 模型")
+    export_parser.add_argument("--output-dir", default="models/macbert_onnx", help="输出目录")
+    export_parser.add_argument("--model", default=DEFAULT_MACBERT_MODEL, help="模型名或本地目录")
+    export_parser.add_argument("--no-quantize", action="store_true", help="不生成 INT8 量化模型")
+
+    validate_parser = subparsers.add_parser("validate", help="与 PyTorch 版本对比输出和吞吐")
+    validate_parser.add_argument("--onnx-dir", default="models/macbert_onnx", help="ONNX 模型目录")
+    validate_parser.add_argument("--fp32", action="store_true", help="使用未量化的模型")
+    validate_parser.add_argument("--threads", type=int, default=None, help="intra-op 线程数（两个后端相同）")
+    validate_parser.add_argument("--input", help="验证句子文件，每行一句；缺省时用合成语料")
+    validate_parser.add_argument("--reference", help="与 --input 逐行对应的正确句子文件")
+    validate_parser.add_argument("--lines", type=int, default=200, help="合成语料行数")
+    validate_parser.add_argument("--min-agreement", type=float, default=None,
+                                 help="一致率低于该值时以非零状态退出")
+    validate_parser.add_argument("--output", help="把验证报告写入该 JSON 文件")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_macbert_onnx(args.output_dir, args.model, quantize=not args.no_quantize)
+        return
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        clean_lines = None
+        if args.reference:
+            with open(args.reference, "r", encoding="utf-8") as f:
+                clean_lines = [line.strip() for line in f if line.strip()]
+    else:
+        from benchmark import generate_corpus
+        lines, clean_lines = generate_corpus(args.lines)
+
+    if not lines:
+        print("错误：验证集为空")
+        sys.exit(1)
+
+    from text_file_corrector import load_pycorrector_class
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    reference = load_pycorrector_class("MacBertCorrector")()
+    candidate = OnnxMacBertCorrector(args.onnx_dir, intra_op_threads=args.threads, prefer_int8=not args.fp32)
+    print(f"验证模型: {candidate.model_path}，共 {len(lines)} 句")
+
+    report = validate_equivalence(reference, candidate, lines, clean_lines)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.min_agreement is not None and report["agreement_rate"] < args.min_agreement:
+        print(f"一致率 {report['agreement_rate']} 低于要求的 {args.min_agreement}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
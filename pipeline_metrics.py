@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+流水线各阶段的耗时与吞吐统计
+
+记录抽帧解码、JPEG 编码、OCR 请求、文本合并、各 pycorrector 模型、大模型改写等阶段的
+调用次数、耗时分布（p50/p95/p99）、上传字节数和 token 用量，可导出为 JSON 或 Prometheus 文本格式。
+
+用法:
+    from pipeline_metrics import metrics
+
+    with metrics.stage("ocr_request"):
+        ...
+    metrics.add_bytes("ocr_request", len(payload))
+    print(metrics.to_prometheus())
+"""
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+
+class Histogram:
+    """耗时分布，超过 max_samples 后改为蓄水池抽样，内存占用固定"""
+
+    def __init__(self, max_samples=2048):
+        self.max_samples = max_samples
+        self.samples = []
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self.max_samples:
+                self.samples[index] = value
+
+    def percentile(self, p):
+        """第 p 百分位（0-100），无样本时返回 None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class PipelineMetrics:
+    """线程安全的阶段统计"""
+
+    def __init__(self, prefix="pipeline"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started_at = time.time()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started_at = time.time()
+
+    def observe(self, stage, seconds):
+        """记录一次阶段耗时（秒）"""
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name, value=1):
+        """累加计数器"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, stage):
+        """统计 with 代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def add_bytes(self, stage, num_bytes):
+        """记录某阶段上传/写出的字节数"""
+        self.incr(f"{stage}_bytes", num_bytes)
+
+    def add_usage(self, stage, usage):
+        """
+        记录一次大模型请求的 token 用量
+        Args:
+            usage: OpenAI 兼容接口返回的 completion.usage（对象或字典），为 None 时忽略
+        """
+        if usage is None:
+            return
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            value = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+            if value:
+                self.incr(f"{stage}_{field}", value)
+
+    def merge_counters(self, counters):
+        """合并来自子进程等其他来源的计数器"""
+        for name, value in counters.items():
+            self.incr(name, value)
+
+    def snapshot(self):
+        """当前统计的字典形式"""
+        with self.lock:
+            return {
+                "elapsed": round(time.time() - self.started_at, 6),
+                "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def to_json(self, file_path=None):
+        """导出为 JSON 字符串，给定 file_path 时同时写入文件"""
+        content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        if file_path:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(content)
+        return content
+
+    def to_prometheus(self, file_path=None):
+        """导出为 Prometheus 文本格式，给定 file_path 时同时写入文件"""
+        snapshot = self.snapshot()
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Wall time spent in each pipeline stage.", f"# TYPE {name} summary"]
+        for stage, summary in sorted(snapshot["stages"].items()):
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                if summary[key] is not None:
+                    lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {summary[key]:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {summary["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {summary["count"]}')
+        for counter, value in sorted(snapshot["counters"].items()):
+            counter_name = f"{self.prefix}_{counter}_total"
+            lines.append(f"# TYPE {counter_name} counter")
+            lines.append(f"{counter_name} {value}")
+        content = "\n".join(lines) + "\n"
+        if file_path:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(content)
+        return content
+
+
+# 进程内默认的全局统计实例
+metrics = PipelineMetrics()
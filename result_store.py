@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+逐模型纠错结果的紧凑存储
+
+correct_single_model 每行每个模型返回一个字典，整份语料保留下来内存放不下。
+这里按列存储：模型名和状态驻留为小整数，耗时为 float32，原文每行只存一份，
+未改动的结果不存 target、没有错误的不存 errors。
+指定 parquet_path 时每积累 chunk_rows 行就写出一个 row group 并清空内存，可以处理任意大的语料。
+
+store = ResultStore(parquet_path="results.parquet")
+corrector.correct_file("input.txt", result_store=store)
+store.close()
+query_parquet("results.parquet", model="macbert", changed_only=True)
+
+Parquet 输出需要 pip install pyarrow。
+"""
+import json
+from array import array
+from collections import namedtuple
+
+# correct_single_model 的 status："成功"、"不可用"，或 "错误: <异常信息>"（只保留类别）
+STATUSES = ("成功", "错误", "不可用")
+
+ResultRow = namedtuple("ResultRow", ["line_number", "source", "model", "target", "errors", "seconds", "status"])
+
+
+def _status_id(status):
+    if status in STATUSES:
+        return STATUSES.index(status)
+    return STATUSES.index("错误")
+
+
+def _result_seconds(result):
+    """优先取数值耗时，旧格式只有 "0.123s" 这样的字符串"""
+    if result.get("seconds") is not None:
+        return result["seconds"]
+    time_text = result.get("time")
+    return float(time_text.rstrip("s")) if time_text else 0.0
+
+
+class ResultStore:
+    """列式的逐行、逐模型纠错结果"""
+
+    def __init__(self, parquet_path=None, chunk_rows=100000):
+        """
+        Args:
+            parquet_path: 流式写出的 Parquet 文件路径，None 表示全部保留在内存
+            chunk_rows: 写出 Parquet 时每个 row group 的行数
+        """
+        self.parquet_path = parquet_path
+        self.chunk_rows = chunk_rows
+        self.models = []
+        self._model_ids = {}
+        self.writer = None
+        self.rows_written = 0
+        self._clear()
+
+    def _clear(self):
+        # 每行原文一份
+        self.line_numbers = array("l")
+        self.sources = []
+        # 每个 (行, 模型) 结果一份
+        self.line_index = array("l")
+        self.model_ids = array("B")
+        self.status_ids = array("B")
+        self.seconds = array("f")
+        self.targets = []
+        self.errors = []
+
+    def _intern_model(self, model_name):
+        model_id = self._model_ids.get(model_name)
+        if model_id is None:
+            model_id = self._model_ids[model_name] = len(self.models)
+            self.models.append(model_name)
+        return model_id
+
+    def __len__(self):
+        return len(self.model_ids)
+
+    def add_line(self, line_number, source, results):
+        """
+        记录一行的各模型结果
+        Args:
+            line_number: 行号
+            source: 原文
+            results: {模型名: correct_single_model 返回的字典}
+        """
+        index = len(self.sources)
+        self.line_numbers.append(line_number)
+        self.sources.append(source)
+        for model_name, result in results.items():
+            target = result.get("target", source)
+            self.line_index.append(index)
+            self.model_ids.append(self._intern_model(model_name))
+            self.status_ids.append(_status_id(result.get("status", "成功")))
+            self.seconds.append(_result_seconds(result))
+            self.targets.append(target if target != source else None)
+            self.errors.append([list(error) for error in result["errors"]] if result.get("errors") else None)
+        if self.parquet_path and len(self) >= self.chunk_rows:
+            self.flush()
+
+    def _row(self, row):
+        index = self.line_index[row]
+        source = self.sources[index]
+        target = self.targets[row]
+        return ResultRow(self.line_numbers[index], source, self.models[self.model_ids[row]],
+                         source if target is None else target, self.errors[row] or [],
+                         self.seconds[row], STATUSES[self.status_ids[row]])
+
+    def rows(self):
+        """逐条返回内存中的结果（未改动的 target 还原为原文）"""
+        for row in range(len(self)):
+            yield self._row(row)
+
+    def query(self, model=None, changed_only=False):
+        """按模型、是否有改动筛选内存中的结果"""
+        model_id = self._model_ids.get(model) if model is not None else None
+        if model is not None and model_id is None:
+            return []
+        selected = []
+        for row in range(len(self)):
+            if model_id is not None and self.model_ids[row] != model_id:
+                continue
+            if changed_only and self.targets[row] is None:
+                continue
+            selected.append(self._row(row))
+        return selected
+
+    def model_stats(self):
+        """各模型的结果数、改动数和总耗时（仅内存中的结果）"""
+        stats = {model: {"results": 0, "changed": 0, "seconds": 0.0} for model in self.models}
+        for row in range(len(self)):
+            entry = stats[self.models[self.model_ids[row]]]
+            entry["results"] += 1
+            entry["changed"] += self.targets[row] is not None
+            entry["seconds"] += self.seconds[row]
+        return stats
+
+    def _to_table(self):
+        import pyarrow as pa
+
+        line_numbers = [self.line_numbers[index] for index in self.line_index]
+        sources = [self.sources[index] for index in self.line_index]
+        return pa.table({
+            "line_number": pa.array(line_numbers, type=pa.int64()),
+            "source": pa.array(sources, type=pa.string()),
+            "model": pa.DictionaryArray.from_arrays(pa.array(self.model_ids, type=pa.int8()),
+                                                    pa.array(self.models, type=pa.string())),
+            "target": pa.array([source if target is None else target for source, target in zip(sources, self.targets)],
+                               type=pa.string()),
+            "changed": pa.array([target is not None for target in self.targets], type=pa.bool_()),
+            "errors": pa.array([json.dumps(errors, ensure_ascii=False) if errors else None for errors in self.errors],
+                               type=pa.string()),
+            "seconds": pa.array(self.seconds, type=pa.float32()),
+            "status": pa.DictionaryArray.from_arrays(pa.array(self.status_ids, type=pa.int8()),
+                                                     pa.array(STATUSES, type=pa.string())),
+        })
+
+    def flush(self):
+        """把内存中的结果作为一个 row group 写入 Parquet 并清空"""
+        if not self.parquet_path or not len(self):
+            return
+        import pyarrow.parquet as pq
+
+        table = self._to_table()
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.parquet_path, table.schema)
+        self.writer.write_table(table)
+        self.rows_written += len(self)
+        self._clear()
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def query_parquet(parquet_path, model=None, changed_only=False, columns=None):
+    """
+    从 Parquet 文件中读取结果，筛选条件下推到 row group
+    Returns:
+        pyarrow.Table
+    """
+    import pyarrow.parquet as pq
+
+    filters = []
+    if model is not None:
+        filters.append(("model", "=", model))
+    if changed_only:
+        filters.append(("changed", "=", True))
+    return pq.read_table(parquet_path, columns=columns, filters=filters or None)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+视频OCR文本段的模糊合并
+
+同一条字幕在相邻的多帧中会被重复识别，且每次的OCR噪声不同。
+这里按归一化编辑距离把时间上相邻、内容相似的文本段合并为一段，
+并保留每段的起止时间。候选段通过 MinHash/LSH 检索，整体接近线性时间。
+"""
+import re
+import zlib
+import random
+from collections import Counter
+
+# 比较相似度时忽略的字符：空白和常见中英文标点
+IGNORED_CHARS_PATTERN = re.compile(r"[\s，。、；：？！“”‘’（）《》【】…—,.;:?!\"'()\[\]<>\-]+")
+
+# Mersenne 素数，用于 MinHash 的线性哈希
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_for_compare(text):
+    """去除空白和标点，得到用于比较的文本"""
+    return IGNORED_CHARS_PATTERN.sub("", text)
+
+
+def char_ngrams(text, n=2):
+    """提取字符 n-gram 集合（文本短于 n 时返回整个文本）"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    计算编辑距离，只在宽度为 max_distance 的对角带内计算
+    Returns:
+        int: 编辑距离；超过 max_distance 时返回 max_distance + 1
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if not a or not b:
+        return max(len(a), len(b))
+
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j - 1] + cost, previous[j] + 1, current[j - 1] + 1)
+            current[j] = value if value <= max_distance else too_far
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return too_far
+        previous = current
+    return previous[len(b)]
+
+
+def text_similarity(a, b, threshold=0.0):
+    """
+    归一化编辑相似度 1 - d / max(len)
+    低于 threshold 时可提前终止并返回 0.0
+    """
+    a = normalize_for_compare(a)
+    b = normalize_for_compare(b)
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 1.0
+    max_distance = int((1 - threshold) * longest)
+    distance = bounded_edit_distance(a, b, max_distance)
+    if distance > max_distance:
+        return 0.0
+    return 1 - distance / longest
+
+
+class MinHashLSH:
+    """基于字符 n-gram 的 MinHash 局部敏感哈希索引"""
+
+    def __init__(self, num_perm=32, bands=16, ngram=2, seed=1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        rng = random.Random(seed)
+        self.hash_params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                            for _ in range(num_perm)]
+        self.buckets = [{} for _ in range(bands)]
+
+    def signature(self, text):
+        """计算文本的 MinHash 签名"""
+        grams = char_ngrams(normalize_for_compare(text), self.ngram)
+        if not grams:
+            return None
+        hashed = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in self.hash_params]
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def insert(self, key, signature):
+        """把 key 加入索引"""
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+    def query(self, signature):
+        """返回与签名至少有一个 band 相同的候选 key（按插入顺序）"""
+        if signature is None:
+            return []
+        seen = set()
+        candidates = []
+        for band, band_key in self._band_keys(signature):
+            for key in self.buckets[band].get(band_key, ()):
+                if key not in seen:
+                    seen.add(key)
+                    candidates.append(key)
+        return candidates
+
+    def remove(self, key, signature):
+        """从索引中移除 key"""
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self.buckets[band].get(band_key)
+            if bucket and key in bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+
+def merge_segments(segments, similarity_threshold=0.7, max_gap=5.0):
+    """
+    合并时间上相邻、内容相似的OCR文本段
+    Args:
+        segments: list[(text, timestamp)]，按时间排序
+        similarity_threshold: 归一化编辑相似度阈值，达到即视为同一段文字
+        max_gap: 与已有段最后一次出现的最大间隔（秒），超过后不再合并
+    Returns:
+        list[(text, start, end)]: 合并后的文本段，text 取该段中出现次数最多的识别结果
+    """
+    lsh = MinHashLSH()
+    clusters = []       # 每段: {"variants": Counter, "start", "end", "signature"}
+    active = set()      # 仍在 max_gap 之内、可继续合并的段
+
+    for text, timestamp in segments:
+        # 超出时间窗口的段从索引中移除，保持候选集合很小
+        for index in [i for i in active if timestamp - clusters[i]["end"] > max_gap]:
+            active.discard(index)
+            lsh.remove(index, clusters[index]["signature"])
+
+        signature = lsh.signature(text)
+        candidates = lsh.query(signature)
+        # 紧邻的上一段总是参与比较，避免极短文本在 LSH 中漏检
+        if clusters and len(clusters) - 1 in active and len(clusters) - 1 not in candidates:
+            candidates.append(len(clusters) - 1)
+
+        best_index = None
+        best_score = similarity_threshold
+        for index in candidates:
+            representative = clusters[index]["variants"].most_common(1)[0][0]
+            score = text_similarity(text, representative, similarity_threshold)
+            if score >= best_score:
+                best_index = index
+                best_score = score
+
+        if best_index is not None:
+            cluster = clusters[best_index]
+            cluster["variants"][text] += 1
+            cluster["end"] = max(cluster["end"], timestamp)
+        else:
+            clusters.append({
+                "variants": Counter({text: 1}),
+                "start": timestamp,
+                "end": timestamp,
+                "signature": signature,
+            })
+            active.add(len(clusters) - 1)
+            lsh.insert(len(clusters) - 1, signature)
+
+    return [(cluster["variants"].most_common(1)[0][0], cluster["start"], cluster["end"])
+            for cluster in clusters]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+长行切分与拼接
+
+OCR 得到的长行超过 Transformer 模型的最大序列长度时会被截断，注意力开销也随长度平方增长。
+这里在中文标点处把长行切成不超过模型长度的窗口；找不到标点时硬切，
+并在窗口两侧各带 overlap 个字的上下文，拼接时只保留每个窗口中心（core）部分的纠错结果。
+"""
+import difflib
+from collections import namedtuple
+
+# 优先在句末标点处切分，其次是句内停顿
+SENTENCE_END_PUNCTUATION = "。！？!?；;…"
+CLAUSE_PUNCTUATION = "，,、：:）)」』》”’"
+ALL_PUNCTUATION = SENTENCE_END_PUNCTUATION + CLAUSE_PUNCTUATION
+
+# start/end 为送入模型的窗口，core_start/core_end 为该窗口负责输出的部分；各窗口的 core 首尾相接覆盖整行
+Window = namedtuple("Window", ["start", "end", "core_start", "core_end"])
+
+
+def _find_cut(text, start, limit):
+    """在 (start, limit] 内找最靠后的切分点（标点之后），找不到返回 None"""
+    for punctuation in (SENTENCE_END_PUNCTUATION, CLAUSE_PUNCTUATION):
+        for position in range(limit, start, -1):
+            if text[position - 1] in punctuation:
+                return position
+    return None
+
+
+def split_windows(text, max_length=128, overlap=16):
+    """
+    把文本切成不超过 max_length 的窗口
+    Args:
+        text: 待切分文本
+        max_length: 窗口最大长度（含上下文）
+        overlap: 硬切处两侧窗口各自附带的上下文长度
+    Returns:
+        list[Window]: 不需要切分时只有一个覆盖整行的窗口
+    """
+    if not max_length or len(text) <= max_length:
+        return [Window(0, len(text), 0, len(text))]
+    overlap = max(0, min(overlap, (max_length - 1) // 3))
+
+    windows = []
+    core_start = 0
+    while core_start < len(text):
+        # 上一个窗口是硬切的，本窗口左侧需要带上下文
+        left = overlap if core_start > 0 and text[core_start - 1] not in ALL_PUNCTUATION else 0
+        start = core_start - left
+        limit = min(start + max_length, len(text))
+        cut = limit if limit == len(text) else _find_cut(text, core_start, limit)
+        if cut is not None:
+            # 在标点处切分，与后一句相互独立，右侧不需要上下文
+            windows.append(Window(start, cut, core_start, cut))
+            core_start = cut
+            continue
+        # 硬切：core 缩短，给右侧上下文留出空间
+        core_end = start + max_length - overlap
+        windows.append(Window(start, min(len(text), core_end + overlap), core_start, core_end))
+        core_start = core_end
+    return windows
+
+
+def _shift_error(error, offset):
+    """把 errors 中一条记录的位置字段（第 3 项起的整数）加上偏移"""
+    shifted = [item + offset if index >= 2 and isinstance(item, int) and not isinstance(item, bool) else item
+               for index, item in enumerate(error)]
+    return type(error)(shifted)
+
+
+def _map_position(opcodes, position, target_length):
+    """按字符对齐把 source 中的位置映射到 target；边界处的插入归入右侧窗口"""
+    for tag, i1, i2, j1, j2 in opcodes:
+        if position == i1:
+            return j1
+        if i1 < position < i2:
+            return j1 + (position - i1) if tag == "equal" else min(j1 + (position - i1), j2)
+    return target_length
+
+
+def stitch_results(text, windows, results):
+    """
+    把各窗口的纠错结果拼回整行
+    Args:
+        text: 原始整行
+        windows: split_windows 的结果
+        results: 与 windows 一一对应的结果字典（含 target、errors）
+    Returns:
+        dict: {"source", "target", "errors"}，errors 中的位置已换算到整行原文
+    """
+    pieces = []
+    errors = []
+    for window, result in zip(windows, results):
+        source = text[window.start:window.end]
+        target = result.get("target", source)
+        local_start, local_end = window.core_start - window.start, window.core_end - window.start
+        if (local_start, local_end) == (0, len(source)):
+            pieces.append(target)
+        elif len(target) == len(source):
+            pieces.append(target[local_start:local_end])
+        else:
+            # 纠错改变了长度：借助字符对齐估计 core 在 target 中的范围。
+            # 硬切边界恰好落在改动附近时，两侧窗口的对齐可能不一致，结果只是近似
+            # （需要切分的 MacBERT/ERNIE 都是逐字替换，正常不会走到这里）
+            opcodes = difflib.SequenceMatcher(None, source, target, autojunk=False).get_opcodes()
+            pieces.append(target[_map_position(opcodes, local_start, len(target)):
+                                 _map_position(opcodes, local_end, len(target))])
+
+        for error in result.get("errors") or []:
+            if not isinstance(error, (tuple, list)) or len(error) < 3:
+                errors.append(error)
+                continue
+            # 位置以窗口原文为准；只保留落在 core 内的错误，重叠区的错误由相邻窗口负责
+            if isinstance(error[2], int) and not local_start <= error[2] < local_end:
+                continue
+            errors.append(_shift_error(error, window.start))
+    return {"source": text, "target": "".join(pieces), "errors": errors}
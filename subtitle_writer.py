@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+视频识别结果的结构化输出
+
+提供 SRT、WebVTT 字幕和 JSONL 记录三种写出器。每写入一条即刷新到磁盘，
+下游可以在任务进行中边写边读，无需等待整个视频处理完成。
+"""
+import json
+
+
+def format_timestamp(seconds, decimal_marker=","):
+    """把秒数格式化为 HH:MM:SS,mmm（SRT）或 HH:MM:SS.mmm（WebVTT）"""
+    milliseconds = max(0, int(round(seconds * 1000)))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def subtitle_intervals(segments, min_duration=1.0):
+    """
+    把 (start, end) 时间段整理为可显示的字幕区间
+    只在单帧出现的文本 start == end，这里至少延长到 min_duration，
+    但不超过下一段的开始时间
+    Args:
+        segments: list[(start, end)]，按时间排序
+    Returns:
+        list[(start, end)]
+    """
+    intervals = []
+    for i, (start, end) in enumerate(segments):
+        end = max(end, start + min_duration)
+        if i + 1 < len(segments):
+            next_start = segments[i + 1][0]
+            if next_start > start:
+                end = min(end, next_start)
+        intervals.append((start, end))
+    return intervals
+
+
+class _StreamingWriter:
+    """逐条写入并立即刷新的文本文件写出器"""
+
+    def __init__(self, file_path, encoding="utf-8"):
+        self.file_path = file_path
+        self.file = open(file_path, "w", encoding=encoding)
+        self.count = 0
+
+    def _write(self, content):
+        self.file.write(content)
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SrtWriter(_StreamingWriter):
+    """SRT 字幕写出器"""
+
+    def write_cue(self, start, end, text):
+        """写入一条字幕"""
+        self._write(
+            f"{self.count + 1}\n"
+            f"{format_timestamp(start)} --> {format_timestamp(end)}\n"
+            f"{text}\n\n"
+        )
+
+
+class VttWriter(_StreamingWriter):
+    """WebVTT 字幕写出器"""
+
+    def __init__(self, file_path, encoding="utf-8"):
+        super().__init__(file_path, encoding=encoding)
+        self.file.write("WEBVTT\n\n")
+        self.file.flush()
+
+    def write_cue(self, start, end, text):
+        """写入一条字幕"""
+        self._write(
+            f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n"
+            f"{text}\n\n"
+        )
+
+
+class JsonlWriter(_StreamingWriter):
+    """JSONL 记录写出器，每行一个 JSON 对象"""
+
+    def write(self, record):
+        """写入一条记录"""
+        self._write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def read_jsonl(file_path, encoding="utf-8"):
+    """读取 JSONL 文件，返回记录列表（跳过空行）"""
+    records = []
+    with open(file_path, "r", encoding=encoding) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
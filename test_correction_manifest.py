@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""增量纠错清单：同一配置连续运行两次时，第二次复用所有未改动的行"""
+from text_file_corrector import TextFileCorrector
+
+
+def test_second_incremental_run_reuses_manifest(tmp_path):
+    input_path = tmp_path / "input.txt"
+    output_path = tmp_path / "output.txt"
+    input_path.write_text("我们因该去学校\n今天天气很好\n\n这件事很中要\n", encoding="utf-8")
+
+    corrector = TextFileCorrector(use_models=['confusion'])
+    first = corrector.correct_file(str(input_path), str(output_path), show_progress=False, incremental=True)
+    assert first["incremental"]["reused_lines"] == 0
+    assert first["incremental"]["corrected_lines"] == 3
+
+    # 新建纠错器，配置从清单文件读回后比较
+    corrector = TextFileCorrector(use_models=['confusion'])
+    second = corrector.correct_file(str(input_path), str(output_path), show_progress=False, incremental=True)
+    assert second["incremental"]["reused_lines"] == 3
+    assert second["incremental"]["corrected_lines"] == 0
+    assert output_path.read_text(encoding="utf-8").splitlines()[0] == "我们应该去学校"
+
+
+def test_changed_confusion_dict_invalidates_manifest(tmp_path):
+    input_path = tmp_path / "input.txt"
+    output_path = tmp_path / "output.txt"
+    confusion_path = tmp_path / "learned.txt"
+    input_path.write_text("我们因该去学校\n", encoding="utf-8")
+    confusion_path.write_text("学效 学校\n", encoding="utf-8")
+
+    TextFileCorrector(use_models=['confusion']).correct_file(
+        str(input_path), str(output_path), show_progress=False, incremental=True)
+    corrector = TextFileCorrector(use_models=['confusion'], confusion_path=str(confusion_path))
+    result = corrector.correct_file(str(input_path), str(output_path), show_progress=False, incremental=True)
+    assert result["incremental"]["reused_lines"] == 0
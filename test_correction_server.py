@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""常驻纠错服务：微批去重、队列满拒绝、截止时间调度和 HTTP 接口"""
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from correction_server import CorrectionService, make_handler
+from text_file_corrector import TextFileCorrector
+
+
+@pytest.fixture(scope="module")
+def corrector():
+    return TextFileCorrector(use_models=['confusion'])
+
+
+def make_service(corrector, rewritten=None, **kwargs):
+    """OCR 和大模型都用桩函数，大模型收到的文本记入 rewritten"""
+    def rewrite(text):
+        if rewritten is not None:
+            rewritten.append(text)
+        return text + "。"
+    return CorrectionService(corrector=corrector, ocr_func=lambda path: "我们因该去学校",
+                             rewrite_func=rewrite, **kwargs)
+
+
+def test_micro_batch_deduplicates_lines_across_jobs(corrector):
+    service = make_service(corrector, batch_wait=0.5)
+    # 工作线程启动前提交，保证三个任务进入同一个微批
+    jobs = [service.submit("text", "我们因该去学校\n今天天气很好") for _ in range(2)]
+    jobs.append(service.submit("image", "image.png"))
+    service.start()
+    try:
+        results = [job.wait(10) for job in jobs]
+    finally:
+        service.stop()
+
+    assert all(result["success"] and result["batch_size"] == 3 for result in results)
+    assert results[0]["text"] == "我们应该去学校\n今天天气很好"
+    assert results[2]["text"] == "我们应该去学校"
+    assert service.stats["batches"] == 1
+    assert service.stats["lines"] == 5
+    assert service.stats["unique_lines"] == 2
+
+
+def test_full_queue_rejects_new_jobs(corrector):
+    service = make_service(corrector, max_queue_size=1)
+    service.submit("text", "今天天气很好")
+    with pytest.raises(queue.Full):
+        service.submit("text", "今天天气很好")
+    service.stop()
+
+
+def test_deadline_job_runs_rewrite_when_time_allows(corrector):
+    rewritten = []
+    service = make_service(corrector, rewritten)
+    service.start()
+    try:
+        result = service.run("text", "我们因该去学校", llm=True, timeout=10, deadline_ms=60000)
+    finally:
+        service.stop()
+
+    assert result["success"] and result["deadline_met"]
+    assert "llm" not in result["skipped_stages"]
+    assert rewritten == ["我们应该去学校"]
+    assert result["text"] == "我们应该去学校。"
+
+
+def test_deadline_job_skips_rewrite_that_cannot_finish_in_time():
+    # 单独的纠错器，避免实测延迟影响其他用例
+    corrector = TextFileCorrector(use_models=['confusion'])
+    corrector.latency.observe("llm", 100.0)
+    rewritten = []
+    service = make_service(corrector, rewritten)
+    service.start()
+    try:
+        result = service.run("text", "我们因该去学校", llm=True, timeout=10, deadline_ms=1000)
+    finally:
+        service.stop()
+
+    assert result["success"]
+    assert result["skipped_stages"]["llm"] == "budget"
+    assert rewritten == []
+    assert result["text"] == "我们应该去学校"
+
+
+def test_deadline_rejects_other_strategies(corrector):
+    service = make_service(corrector)
+    with pytest.raises(ValueError):
+        service.submit("text", "我们因该去学校", strategy="voting", deadline_ms=300)
+
+
+@pytest.fixture
+def server_url(corrector):
+    service = make_service(corrector)
+    service.start()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service, job_timeout=10))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.stop()
+
+
+def post_job(url, request):
+    data = json.dumps(request, ensure_ascii=False).encode("utf-8")
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url + "/jobs", data=data), timeout=10) as response:
+            return response.status, json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf-8"))
+
+
+def test_http_job_returns_corrected_text(server_url):
+    status, result = post_job(server_url, {"type": "text", "text": "我们因该去学校"})
+    assert status == 200
+    assert result["text"] == "我们应该去学校"
+    assert "correction" in result["timings"]
+
+
+@pytest.mark.parametrize("request_body", [
+    {"type": "text"},
+    {"type": "audio", "path": "a.wav"},
+    {"type": "text", "text": "我们因该去学校", "strategy": "bogus"},
+])
+def test_http_rejects_malformed_jobs(server_url, request_body):
+    status, result = post_job(server_url, request_body)
+    assert status == 400
+    assert "error" in result
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""SQLite 任务队列：租用、租约过期、失败重试和死信"""
+from job_queue import STATUS_DEAD, STATUS_DONE, STATUS_QUEUED, SQLiteQueue
+
+
+def make_queue(tmp_path, retry_delay=0.0, name="jobs.db"):
+    return SQLiteQueue(str(tmp_path / name), retry_delay=retry_delay)
+
+
+def test_lease_hands_each_job_to_one_worker(tmp_path):
+    job_queue = make_queue(tmp_path)
+    job_id = job_queue.enqueue("a.png")
+
+    job = job_queue.lease("worker-1")
+    assert (job.id, job.path, job.attempts) == (job_id, "a.png", 1)
+    assert job_queue.lease("worker-2") is None
+    # 只有持有租约的 worker 能续约、完成任务
+    assert not job_queue.heartbeat(job_id, "worker-2")
+    assert not job_queue.complete(job_id, "worker-2", {"text": "b"})
+    assert job_queue.complete(job_id, "worker-1", {"text": "a"})
+    assert job_queue.stats()[STATUS_DONE] == 1
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    job_queue = make_queue(tmp_path)
+    job_id = job_queue.enqueue("a.png")
+    job_queue.lease("worker-1", lease_seconds=-1)
+    assert job_queue.stats()["expired_leases"] == 1
+
+    job = job_queue.lease("worker-2")
+    assert (job.id, job.attempts) == (job_id, 2)
+    # 原 worker 的结果不再生效
+    assert not job_queue.complete(job_id, "worker-1", {"text": "a"})
+    assert job_queue.fail(job_id, "worker-1", "late") is None
+    assert job_queue.complete(job_id, "worker-2", {"text": "a"})
+
+
+def test_failed_job_is_retried_after_backoff(tmp_path):
+    job_queue = make_queue(tmp_path, retry_delay=3600)
+    job_id = job_queue.enqueue("a.png")
+    job_queue.lease("worker-1")
+
+    assert job_queue.fail(job_id, "worker-1", "识别失败") == STATUS_QUEUED
+    # 退避时间内不会再次领取
+    assert job_queue.lease("worker-1") is None
+
+    job_queue = make_queue(tmp_path, name="no_delay.db")
+    job_id = job_queue.enqueue("b.png")
+    job_queue.lease("worker-1")
+    job_queue.fail(job_id, "worker-1", "识别失败")
+    assert job_queue.lease("worker-1").attempts == 2
+
+
+def test_exhausted_attempts_go_to_dead_letter(tmp_path):
+    job_queue = make_queue(tmp_path)
+    job_id = job_queue.enqueue("a.png", max_attempts=2)
+    for expected in (STATUS_QUEUED, STATUS_DEAD):
+        job_queue.lease("worker-1")
+        assert job_queue.fail(job_id, "worker-1", "识别失败") == expected
+    assert job_queue.lease("worker-1") is None
+    assert job_queue.list_jobs(STATUS_DEAD)[0]["error"] == "识别失败"
+
+    assert job_queue.requeue_dead(job_id) == 1
+    assert job_queue.lease("worker-1").attempts == 1
+
+
+def test_worker_crashing_on_last_attempt_goes_to_dead_letter(tmp_path):
+    job_queue = make_queue(tmp_path)
+    job_queue.enqueue("a.png", max_attempts=1)
+    job_queue.lease("worker-1", lease_seconds=-1)
+
+    assert job_queue.lease("worker-2") is None
+    dead = job_queue.list_jobs(STATUS_DEAD)
+    assert len(dead) == 1 and dead[0]["error"] == "租约过期"
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""纠错结果与原文段对齐：行被合并或丢弃时不错位"""
+from line_aligner import align_to_segments
+
+
+def test_dropped_lines_in_repetitive_text_do_not_shift_segments():
+    segments = [f"第{n}行文字内容" for n in range(1, 201)]
+    dropped = set(range(50, 60))
+    corrected = "\n".join(line for n, line in enumerate(segments, 1) if n not in dropped)
+
+    aligned = align_to_segments(segments, corrected)
+    assert aligned[57] != "第49行文字内容"
+    assert aligned == segments
+
+
+def test_corrections_are_split_back_to_segments():
+    segments = ["今天天汽很好", "我们因该去学效", "再见"]
+    aligned = align_to_segments(segments, "今天天气很好。我们应该去学校\n再见")
+    assert aligned == ["今天天气很好。", "我们应该去学校", "再见"]
+
+
+def test_low_similarity_span_keeps_segment():
+    segments = ["第一段", "第二段文字", "第三段"]
+    aligned = align_to_segments(segments, "第一段\n完全无关的内容\n第三段", min_similarity=0.5)
+    assert aligned == ["第一段", "第二段文字", "第三段"]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""修改列表模式：本地校验位置和重叠，回复无法解析时按预算决定是否整段改写"""
+from types import SimpleNamespace
+
+import pytest
+
+import QwenRewrite
+from QwenRewrite import apply_edits
+from token_budget import ledger
+
+
+def test_offset_selects_among_repeated_fragments():
+    lines = ["的的确确的"]
+    result, applied, rejected = apply_edits(lines, [{"id": 1, "from": "的", "to": "地", "offset": 4}])
+    assert (result, applied, rejected) == (["的的确确地"], 1, 0)
+
+
+@pytest.mark.parametrize("offset", [None, -1, 99, True, "4", 2])
+def test_ambiguous_fragment_without_valid_offset_is_rejected(offset):
+    edit = {"id": 1, "from": "的", "to": "地"}
+    if offset is not None:
+        edit["offset"] = offset
+    result, applied, rejected = apply_edits(["的的确确的"], [edit])
+    assert (result, applied, rejected) == (["的的确确的"], 0, 1)
+
+
+def test_overlapping_edits_keep_the_first():
+    edits = [
+        {"id": 1, "from": "因该", "to": "应该"},
+        {"id": 1, "from": "该去", "to": "改去"},
+        {"id": 1, "from": "学效", "to": "学校"},
+    ]
+    result, applied, rejected = apply_edits(["我们因该去学效"], edits)
+    assert (result, applied, rejected) == (["我们应该去学校"], 2, 1)
+
+
+def test_invalid_edits_are_rejected():
+    edits = [
+        {"id": 2, "from": "因该", "to": "应该"},
+        {"id": 1, "from": "不存在", "to": "x"},
+        {"id": 1, "from": "因该", "to": "因该"},
+        {"id": "x", "from": "因该", "to": "应该"},
+        {"from": "因该", "to": "应该"},
+    ]
+    result, applied, rejected = apply_edits(["我们因该去学校"], edits)
+    assert (result, applied, rejected) == (["我们因该去学校"], 0, 5)
+
+
+@pytest.fixture
+def unparseable_reply(monkeypatch):
+    """模型返回无法解析的修改列表，整段改写被调用时记入 calls"""
+    completion = SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content="好的"))])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: completion)))
+    calls = []
+    monkeypatch.setattr(QwenRewrite, "get_client", lambda: client)
+    monkeypatch.setattr(QwenRewrite, "rewrite_text", lambda text: calls.append(text) or "整段改写")
+    return calls
+
+
+def test_fallback_rewrites_when_budget_allows(monkeypatch, unparseable_reply):
+    monkeypatch.setattr(ledger, "max_tokens", None)
+    assert QwenRewrite.rewrite_text_edits("我们因该去学校") == "整段改写"
+    assert unparseable_reply == ["我们因该去学校"]
+
+
+def test_fallback_is_skipped_when_budget_is_exhausted(monkeypatch, unparseable_reply):
+    monkeypatch.setattr(ledger, "max_tokens", 50)
+    skipped = QwenRewrite.metrics.counters.get("llm_edit_fallbacks_skipped", 0)
+    assert QwenRewrite.rewrite_text_edits("我们因该去学校") == "我们因该去学校"
+    assert unparseable_reply == []
+    assert QwenRewrite.metrics.counters["llm_edit_fallbacks_skipped"] == skipped + 1
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""文本纠错器：无误行缓存命中时仍记录各模型的结果"""
+from result_store import ResultStore
+from text_file_corrector import TextFileCorrector
+
+
+def test_clean_cache_hits_keep_model_results(tmp_path):
+    input_path = tmp_path / "input.txt"
+    output_path = tmp_path / "output.txt"
+    input_path.write_text("今天天气很好\n今天天气很好\n", encoding="utf-8")
+
+    corrector = TextFileCorrector(use_models=['confusion'])
+    store = ResultStore()
+    corrector.correct_file(str(input_path), str(output_path), show_progress=False, result_store=store)
+
+    assert corrector.route_stats['clean_cache'] == 1
+    rows = list(store.rows())
+    assert [(row.line_number, row.model, row.target, row.status) for row in rows] == [
+        (1, 'confusion', "今天天气很好", "成功"),
+        (2, 'confusion', "今天天气很好", "成功"),
+    ]
+    assert rows[1].seconds == 0.0
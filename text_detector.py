@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+抽帧后的文字存在性预判
+
+在 OCR 之前用形态学梯度找出"像文字行"的区域：笔画边缘密集、呈横向排列、高度适中。
+文字行区域占画面的比例低于阈值的帧直接跳过，不再保存和发送 OCR 请求。
+
+阈值取 0.002 左右（文字行占画面 0.2%）通常能跳过纯画面帧而不漏掉字幕；
+可用 python text_detector.py 帧目录/*.jpg 查看各帧得分后调整。
+"""
+import sys
+
+# 计算得分前把画面缩放到的宽度，降低开销且让核大小与分辨率无关
+DETECT_WIDTH = 480
+DEFAULT_TEXT_THRESHOLD = 0.002
+
+
+def text_score(frame):
+    """
+    估计画面中文字行区域所占的比例
+    Args:
+        frame: BGR 或灰度图像（numpy 数组）
+    Returns:
+        float: 0-1，越大越可能有文字
+    """
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    height, width = gray.shape[:2]
+    if width > DETECT_WIDTH:
+        height = int(height * DETECT_WIDTH / width)
+        width = DETECT_WIDTH
+        gray = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+    # 形态学梯度突出笔画边缘，Otsu 二值化；纯色画面梯度全为 0，不会产生前景
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if cv2.countNonZero(binary) == 0:
+        return 0.0
+    # 横向闭运算把同一行的字连成一片
+    connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    text_area = 0
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        # 文字行：高度适中、宽大于高、区域内笔画像素占比足够
+        if h < 6 or h > height * 0.3 or w < h * 1.5:
+            continue
+        if cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h) < 0.25:
+            continue
+        text_area += w * h
+    return text_area / float(width * height)
+
+
+def has_text(frame, threshold=DEFAULT_TEXT_THRESHOLD):
+    """画面中文字行区域比例是否达到阈值"""
+    return text_score(frame) >= threshold
+
+
+if __name__ == "__main__":
+    import cv2
+
+    for image_path in sys.argv[1:]:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"{image_path}: 无法读取")
+            continue
+        score = text_score(image)
+        print(f"{image_path}: {score:.5f} {'有文字' if score >= DEFAULT_TEXT_THRESHOLD else '无文字'}")
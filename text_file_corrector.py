@@ -11,27 +11,324 @@
 5. EnSpellCorrector - 英文拼写纠错
 
 """
+import re
 import time
+import hashlib
 import os
-import pycorrector
-from pycorrector import Corrector, MacBertCorrector, ErnieCscCorrector, ConfusionCorrector, EnSpellCorrector
+from collections import Counter, OrderedDict
+
+from correction_manifest import CorrectionManifest, manifest_path_for
+from correction_profiler import LineProfiler, RunProfiler, write_profile_report
+from deadline_scheduler import DEADLINE_ORDER, LatencyTracker, run_with_deadline
+from pipeline_metrics import metrics
+from result_store import ResultStore
+from sentence_splitter import split_windows, stitch_results
+from text_normalizer import ROUTE_CHINESE, ROUTE_ENGLISH, classify_line, normalize_text, restore_original
+from subtitle_writer import JsonlWriter
+
+
+# 自定义混淆集，添加常见错误
+CUSTOM_CONFUSION = {
+    # 常见拼音/语义混淆
+    "人可": "认可",
+    "那里": "哪里",
+    "在那里": "在哪里",
+    "中要": "重要",
+    "因该": "应该",
+    "天氨门": "天安门",
+    "较书": "教书",
+    "书藉": "书籍",
+    "蒙习": "学习",
+    "公理": "公里",
+    "里成": "里程",
+    "试式": "仪式",
+    "经力": "经历",
+    "生崖": "生涯",
+    "心晴": "心情",
+    "做息": "作息",
+    "息习": "学习",
+    "问提": "问题",
+    "件建": "建议",
+    "意建": "建议",
+    "发发": "发生",
+    "生发": "发生",
+    "时实": "事实",
+    "实事": "事实",
+    "认只": "认识",
+    "识知": "知识",
+    "识意": "意识",
+    "观查": "观察",
+    "细仔": "仔细",
+    "份内": "分内",
+    "分今": "身份",
+    "身分": "身份",
+    "份份": "身份",
+    "年青": "年轻",
+    "轻年": "年轻",
+    "少青": "青年",
+    "清静": "清净",
+    "净清": "清净",
+    "功克": "攻克",
+    "攻刻": "攻克",
+    "坚苦": "艰苦",
+    "苦艰": "艰苦",
+    "坚巨": "艰巨",
+    "巨坚": "艰巨",
+    "困准": "困难",
+    "难困": "困难",
+    "能愿": "愿意",
+    "原意": "愿意",
+    "原意能": "愿意",
+    "能情": "能够",
+    "能清": "能够",
+    "可能能": "能够",
+    "能会": "能够",
+    "能有": "拥有",
+    "有能": "拥有",
+    "持支": "支持",
+    "支特": "特殊",
+    "特支": "特殊",
+    "特持": "特殊",
+    "持特": "特殊",
+    "持支": "支持",
+    "持支力": "支持",
+    "支技": "技术",
+    "技支": "技术",
+    "术技": "技术",
+    "科计": "科技",
+    "技科": "科技",
+    "科技术": "科技",
+    "技创": "创新",
+    "新创": "创新",
+    "创改": "改革",
+    "革改": "改革",
+    "体机": "机制",
+    "制机": "机制",
+    "机治": "机制",
+    "质机": "机制",
+    "制度": "机制",
+    "度制": "制度",
+    "制机": "机制",
+    "机制化": "机制",
+    "机置": "机制",
+    "置机": "机制",
+    "机置定": "机制",
+    "机制定": "机制",
+    "定机": "机制",
+    "机定": "机制",
+    "机制构": "机制",
+    "机结构": "机制",
+    "构结": "结构",
+    "结机": "结构",
+    "机结": "结构",
+    "构机": "结构",
+    "机构成": "结构",
+    "构架": "架构",
+    "架构": "架构",
+    "构架设": "架构",
+    "架设构": "架构",
+    "设架": "设计",
+    "计设": "设计",
+    "设构": "设计",
+    "构设": "设计",
+    "计画": "计划",
+    "划计": "计划",
+    "计策": "计划",
+    "策划": "计划",
+    "规化": "规划",
+    "划规": "规划",
+    "规设": "规划",
+    "设规": "规划",
+    "规计": "规划",
+    "规策": "规划",
+    "策规": "规划",
+    "规布": "公布",
+    "布公": "公布",
+    "发布告": "公布",
+    "布告": "公布",
+    "公告示": "公布",
+    "示告": "告知",
+    "告示": "告知",
+    "告之": "告知",
+    "知告": "告知",
+    "告达": "传达",
+    "传大": "传达",
+    "达传": "传达",
+    "传到": "传达",
+    "到传": "传达",
+    "传述": "转述",
+    "述转": "转述",
+    "转陈": "转述",
+    "陈转": "转述",
+    "述讲": "讲述",
+    "讲诉": "讲述",
+    "讲叙": "讲述",
+    "讲术": "讲述",
+    "述说": "讲述",
+    "说述": "讲述",
+    "道述": "描述",
+    "描速": "描述",
+    "速描": "描述",
+    "绘描": "描绘",
+    "描画": "描绘",
+    "绘画": "描绘",
+    "画绘": "描绘",
+    "绘图": "图画",
+    "图绘": "图画",
+    "画图": "图画",
+    "图画画": "图画",
+    "图绘绘": "图画",
+}
+
+
+# 有最大序列长度的 Transformer 模型，长行先切成窗口再批量送入
+SEGMENTED_MODELS = ('macbert', 'ernie')
+
+
+def load_pycorrector_class(class_name):
+    """
+    按需导入 pycorrector 中的纠错器类
+    导入 pycorrector 会连带加载 torch、transformers 等重依赖，只在确实要用到这些模型时才导入
+    """
+    import pycorrector
+    return getattr(pycorrector, class_name)
+
+
+# 集成策略注册表：名称 → 函数(text, run_model, model_names)
+# run_model(模型名, 输入文本) 返回该模型的结果字典，同一行内相同的调用只执行一次
+STRATEGIES = {}
+
+# 流水线策略中模型的应用顺序：混淆集几乎没有开销，最先应用
+PIPELINE_ORDER = ['confusion', 'kenlm', 'macbert', 'ernie', 'en_spell']
+
+
+def register_strategy(name):
+    """注册集成策略；新策略基于 run_model 给出的各模型结果计算最终文本，不会重复调用模型"""
+    def decorator(func):
+        STRATEGIES[name] = func
+        return func
+    return decorator
+
+
+def check_strategies(strategies):
+    """未注册的策略名抛出 ValueError"""
+    unknown = [strategy for strategy in strategies if strategy not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"未知的集成策略: {', '.join(unknown)}（可用: {', '.join(STRATEGIES)}）")
+
+
+@register_strategy('voting')
+def voting_strategy(text, run_model, model_names):
+    """投票策略：选择最常见的纠错结果"""
+    corrections = [run_model(model_name, text)['target'] for model_name in model_names]
+    corrections = [target for target in corrections if target != text]
+    if corrections:
+        # 简单多数投票
+        return Counter(corrections).most_common(1)[0][0]
+    return text
+
+
+@register_strategy('pipeline')
+def pipeline_strategy(text, run_model, model_names):
+    """流水线策略：按优先级依次应用每个模型，后一个模型的输入是前一个模型的输出"""
+    current_text = text
+    for model_name in PIPELINE_ORDER:
+        if model_name in model_names:
+            result = run_model(model_name, current_text)
+            if result['target'] != current_text and result['errors']:
+                current_text = result['target']
+    return current_text
+
+
+class DictConfusionCorrector:
+    """
+    基于混淆集字典的纠错器，与 pycorrector.ConfusionCorrector 的返回格式一致，但不依赖 pycorrector
+    所有错误词合并为一个正则，长词优先，一次扫描完成替换
+    """
+
+    def __init__(self, confusion, trusted=None):
+        """
+        Args:
+            confusion: {错词: 正词}
+            trusted: 可信的错词（如 confusion_miner.py 按改正比例挖掘出的词条），
+                     一行中只命中这些词条时 TextFileCorrector 不再运行其他模型
+        """
+        self.confusion = {wrong: right for wrong, right in confusion.items() if wrong and wrong != right}
+        self.trusted = {wrong for wrong in (trusted or ()) if wrong in self.confusion}
+        words = sorted(self.confusion, key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(re.escape, words))) if words else None
+
+    def fingerprint(self):
+        """词条内容的哈希，用于判断两次运行的混淆集是否相同"""
+        entries = "\n".join(f"{wrong}\t{right}\t{int(wrong in self.trusted)}"
+                             for wrong, right in sorted(self.confusion.items()))
+        return hashlib.blake2b(entries.encode("utf-8"), digest_size=16).hexdigest()
+
+    def only_trusted(self, errors):
+        """errors 非空且全部是可信词条"""
+        return bool(errors) and all(error[0] in self.trusted for error in errors)
+
+    def correct(self, sentence):
+        if self.pattern is None:
+            return {"source": sentence, "target": sentence, "errors": []}
+        errors = []
+
+        def replace(match):
+            wrong = match.group(0)
+            errors.append((wrong, self.confusion[wrong], match.start()))
+            return self.confusion[wrong]
+
+        target = self.pattern.sub(replace, sentence)
+        return {"source": sentence, "target": target, "errors": errors}
 
 
 class TextFileCorrector:
     """文本文件纠错器"""
     
-    def __init__(self, use_models=None):
+    def __init__(self, use_models=None, backend='torch', onnx_dir='models/macbert_onnx', intra_op_threads=None,
+                 max_segment_length=128, segment_overlap=16, normalize=True, fast_path=True,
+                 clean_cache_size=100000, confusion_path=None, trust_confusion_dict=True):
         """
         初始化文本文件纠错器
         Args:
             use_models: list, 要使用的模型列表，可选：
                        ['kenlm', 'macbert', 'ernie', 'confusion', 'en_spell']
+            backend: MacBERT 的推理后端，'torch'（pycorrector 默认）或 'onnx'（见 onnx_backend.py）
+            onnx_dir: ONNX 模型目录，backend='onnx' 时使用
+            intra_op_threads: ONNX Runtime 的 intra-op 线程数
+            max_segment_length: MacBERT/ERNIE 单次输入的最大字数，更长的行在标点处切分，None 表示不切分
+            segment_overlap: 找不到标点而硬切时，窗口两侧附带的上下文字数
+            normalize: 是否把规范化后的文本（全角字母数字转半角、合并空白）交给模型；
+                       模型没有改动的行保留原文，改动按字放回原文（见 text_normalizer.restore_original）
+            fast_path: 不含汉字的行是否跳过中文模型（英文行交给 en_spell，其余原样保留）
+            clean_cache_size: 记住多少条所有模型都判定无误的行（及各模型的状态），再次出现时直接返回，0 表示关闭
+            confusion_path: 额外的混淆集文件（如 confusion_miner.py 挖掘出的），与内置混淆集合并，同一错词以文件为准；
+                            需要 use_models 中包含 'confusion'
+            trust_confusion_dict: 一行中混淆集只命中 confusion_path 中的词条时，直接采用混淆集的结果，
+                                  不再运行 kenlm/macbert/ernie（挖掘出的词条已按改正比例过滤；
+                                  内置混淆集有歧义词条，命中时仍运行所有模型）
         """
         if use_models is None:
             use_models = ['kenlm', 'macbert', 'ernie', 'confusion']
+        if confusion_path and 'confusion' not in use_models:
+            raise ValueError("指定了混淆集文件，但 use_models 中没有 'confusion'")
         
         self.models = {}
         self.available_models = []
+        self.backend = backend
+        self.max_segment_length = max_segment_length
+        self.segment_overlap = segment_overlap
+        self.normalize = normalize
+        self.fast_path = fast_path
+        self.clean_cache_size = clean_cache_size
+        self.clean_cache = OrderedDict()
+        self.trust_confusion_dict = trust_confusion_dict
+        # 各路径的行数：chinese / english / url / symbol / empty / clean_cache / learned_confusion
+        self.route_stats = Counter()
+        # 各模型单次调用耗时的滑动平均，供 correct_with_deadline 估计剩余时间够运行哪些模型
+        self.latency = LatencyTracker()
+        # 剖析模式下由 correct_file 设置，记录逐行、逐模型耗时
+        self.line_profiler = None
         
         print("正在初始化文本纠错器...")
         print("=" * 60)
@@ -40,7 +337,7 @@ class TextFileCorrector:
         if 'kenlm' in use_models:
             try:
                 print("加载 Kenlm 模型...")
-                self.models['kenlm'] = Corrector()
+                self.models['kenlm'] = load_pycorrector_class('Corrector')()
                 self.available_models.append('kenlm')
                 print("✓ Kenlm 模型加载成功")
             except Exception as e:
@@ -48,17 +345,24 @@ class TextFileCorrector:
         
         if 'macbert' in use_models:
             try:
-                print("加载 MacBert 模型...")
-                self.models['macbert'] = MacBertCorrector()
+                if backend == 'onnx':
+                    from onnx_backend import OnnxMacBertCorrector
+
+                    print("加载 MacBert 模型（ONNX Runtime）...")
+                    self.models['macbert'] = OnnxMacBertCorrector(onnx_dir, intra_op_threads=intra_op_threads)
+                    print(f"✓ MacBert 模型加载成功: {self.models['macbert'].model_path}")
+                else:
+                    print("加载 MacBert 模型...")
+                    self.models['macbert'] = load_pycorrector_class('MacBertCorrector')()
+                    print("✓ MacBert 模型加载成功")
                 self.available_models.append('macbert')
-                print("✓ MacBert 模型加载成功")
             except Exception as e:
-                print("\n")
+                print(f"✗ MacBert 模型加载失败: {e}")
         
         if 'ernie' in use_models:
             try:
                 print("加载 ERNIE-CSC 模型...")
-                self.models['ernie'] = ErnieCscCorrector()
+                self.models['ernie'] = load_pycorrector_class('ErnieCscCorrector')()
                 self.available_models.append('ernie')
                 print("✓ ERNIE-CSC 模型加载成功")
             except Exception as e:
@@ -67,168 +371,23 @@ class TextFileCorrector:
         if 'confusion' in use_models:
             try:
                 print("加载混淆集纠错器...")
-                # 自定义混淆集，添加常见错误
-                custom_confusion = {
-                    # 常见拼音/语义混淆
-                    "人可": "认可",
-                    "那里": "哪里",
-                    "在那里": "在哪里",
-                    "中要": "重要",
-                    "因该": "应该",
-                    "天氨门": "天安门",
-                    "较书": "教书",
-                    "书藉": "书籍",
-                    "蒙习": "学习",
-                    "公理": "公里",
-                    "里成": "里程",
-                    "试式": "仪式",
-                    "经力": "经历",
-                    "生崖": "生涯",
-                    "心晴": "心情",
-                    "做息": "作息",
-                    "息习": "学习",
-                    "问提": "问题",
-                    "件建": "建议",
-                    "意建": "建议",
-                    "发发": "发生",
-                    "生发": "发生",
-                    "时实": "事实",
-                    "实事": "事实",
-                    "认只": "认识",
-                    "识知": "知识",
-                    "识意": "意识",
-                    "观查": "观察",
-                    "细仔": "仔细",
-                    "份内": "分内",
-                    "分今": "身份",
-                    "身分": "身份",
-                    "份份": "身份",
-                    "年青": "年轻",
-                    "轻年": "年轻",
-                    "少青": "青年",
-                    "清静": "清净",
-                    "净清": "清净",
-                    "功克": "攻克",
-                    "攻刻": "攻克",
-                    "坚苦": "艰苦",
-                    "苦艰": "艰苦",
-                    "坚巨": "艰巨",
-                    "巨坚": "艰巨",
-                    "困准": "困难",
-                    "难困": "困难",
-                    "能愿": "愿意",
-                    "原意": "愿意",
-                    "原意能": "愿意",
-                    "能情": "能够",
-                    "能清": "能够",
-                    "可能能": "能够",
-                    "能会": "能够",
-                    "能有": "拥有",
-                    "有能": "拥有",
-                    "持支": "支持",
-                    "支特": "特殊",
-                    "特支": "特殊",
-                    "特持": "特殊",
-                    "持特": "特殊",
-                    "持支": "支持",
-                    "持支力": "支持",
-                    "支技": "技术",
-                    "技支": "技术",
-                    "术技": "技术",
-                    "科计": "科技",
-                    "技科": "科技",
-                    "科技术": "科技",
-                    "技创": "创新",
-                    "新创": "创新",
-                    "创改": "改革",
-                    "革改": "改革",
-                    "体机": "机制",
-                    "制机": "机制",
-                    "机治": "机制",
-                    "质机": "机制",
-                    "制度": "机制",
-                    "度制": "制度",
-                    "制机": "机制",
-                    "机制化": "机制",
-                    "机置": "机制",
-                    "置机": "机制",
-                    "机置定": "机制",
-                    "机制定": "机制",
-                    "定机": "机制",
-                    "机定": "机制",
-                    "机制构": "机制",
-                    "机结构": "机制",
-                    "构结": "结构",
-                    "结机": "结构",
-                    "机结": "结构",
-                    "构机": "结构",
-                    "机构成": "结构",
-                    "构架": "架构",
-                    "架构": "架构",
-                    "构架设": "架构",
-                    "架设构": "架构",
-                    "设架": "设计",
-                    "计设": "设计",
-                    "设构": "设计",
-                    "构设": "设计",
-                    "计画": "计划",
-                    "划计": "计划",
-                    "计策": "计划",
-                    "策划": "计划",
-                    "规化": "规划",
-                    "划规": "规划",
-                    "规设": "规划",
-                    "设规": "规划",
-                    "规计": "规划",
-                    "规策": "规划",
-                    "策规": "规划",
-                    "规布": "公布",
-                    "布公": "公布",
-                    "发布告": "公布",
-                    "布告": "公布",
-                    "公告示": "公布",
-                    "示告": "告知",
-                    "告示": "告知",
-                    "告之": "告知",
-                    "知告": "告知",
-                    "告达": "传达",
-                    "传大": "传达",
-                    "达传": "传达",
-                    "传到": "传达",
-                    "到传": "传达",
-                    "传述": "转述",
-                    "述转": "转述",
-                    "转陈": "转述",
-                    "陈转": "转述",
-                    "述讲": "讲述",
-                    "讲诉": "讲述",
-                    "讲叙": "讲述",
-                    "讲术": "讲述",
-                    "述说": "讲述",
-                    "说述": "讲述",
-                    "道述": "描述",
-                    "描速": "描述",
-                    "速描": "描述",
-                    "绘描": "描绘",
-                    "描画": "描绘",
-                    "绘画": "描绘",
-                    "画绘": "描绘",
-                    "绘图": "图画",
-                    "图绘": "图画",
-                    "画图": "图画",
-                    "图画画": "图画",
-                    "图绘绘": "图画",
-                }
-                self.models['confusion'] = ConfusionCorrector(custom_confusion_path_or_dict=custom_confusion)
+                confusion = dict(CUSTOM_CONFUSION)
+                learned = {}
+                if confusion_path:
+                    from confusion_miner import load_confusion
+                    learned = load_confusion(confusion_path)
+                    confusion.update(learned)
+                self.models['confusion'] = DictConfusionCorrector(confusion,
+                                                                  trusted=learned if trust_confusion_dict else None)
                 self.available_models.append('confusion')
-                print("✓ 混淆集纠错器加载成功")
+                print(f"✓ 混淆集纠错器加载成功（{len(confusion)} 个词条，其中文件词条 {len(learned)} 个）")
             except Exception as e:
                 print(f"✗ 混淆集纠错器加载失败: {e}")
         
         if 'en_spell' in use_models:
             try:
                 print("加载英文拼写纠错器...")
-                self.models['en_spell'] = EnSpellCorrector()
+                self.models['en_spell'] = load_pycorrector_class('EnSpellCorrector')()
                 self.available_models.append('en_spell')
                 print("✓ 英文拼写纠错器加载成功")
             except Exception as e:
@@ -239,6 +398,26 @@ class TextFileCorrector:
         print(f"总共加载了 {len(self.available_models)} 个模型")
         print()
     
+    @staticmethod
+    def _normalize_result(text, result):
+        """统一各模型的返回格式为 {"source", "target", "errors", ...}"""
+        if isinstance(result, tuple):
+            # Kenlm模型返回 (corrected_text, errors)
+            return {"source": text, "target": result[0], "errors": result[1] if result[1] else []}
+        elif isinstance(result, dict):
+            # 其他模型返回字典格式
+            return result
+        return {"source": text, "target": str(result), "errors": []}
+
+    def _run_model(self, model_name, texts):
+        """对一组文本调用模型，模型支持 correct_batch 时整批送入"""
+        model = self.models[model_name]
+        if len(texts) > 1 and hasattr(model, 'correct_batch'):
+            results = model.correct_batch(texts)
+        else:
+            results = [model.correct(text) for text in texts]
+        return [self._normalize_result(text, result) for text, result in zip(texts, results)]
+
     def correct_single_model(self, text, model_name):
         """使用单个模型进行纠错"""
         if model_name not in self.available_models:
@@ -246,37 +425,30 @@ class TextFileCorrector:
         
         try:
             start_time = time.time()
-            result = self.models[model_name].correct(text)
+            windows = None
+            if model_name in SEGMENTED_MODELS:
+                windows = split_windows(text, self.max_segment_length, self.segment_overlap)
+            if windows and len(windows) > 1:
+                # 长行切成窗口整批纠错，再按偏移拼回整行
+                window_results = self._run_model(model_name, [text[w.start:w.end] for w in windows])
+                result = stitch_results(text, windows, window_results)
+                metrics.incr("long_lines_split")
+                metrics.incr("line_windows", len(windows))
+            else:
+                result = self._run_model(model_name, [text])[0]
             end_time = time.time()
+            metrics.observe(f"model_{model_name}", end_time - start_time)
+            self.latency.observe(model_name, end_time - start_time)
+            if self.line_profiler is not None:
+                self.line_profiler.record_model(model_name, end_time - start_time)
             
-            # 统一返回格式
-            if isinstance(result, tuple):
-                # Kenlm模型返回 (corrected_text, errors)
-                return {
-                    "source": text,
-                    "target": result[0],
-                    "errors": result[1] if result[1] else [],
-                    "model": model_name,
-                    "time": f"{end_time - start_time:.3f}s",
-                    "status": "成功"
-                }
-            elif isinstance(result, dict):
-                # 其他模型返回字典格式
-                result.update({
-                    "model": model_name,
-                    "time": f"{end_time - start_time:.3f}s",
-                    "status": "成功"
-                })
-                return result
-            else:
-                return {
-                    "source": text,
-                    "target": str(result),
-                    "errors": [],
-                    "model": model_name,
-                    "time": f"{end_time - start_time:.3f}s",
-                    "status": "成功"
-                }
+            result.update({
+                "model": model_name,
+                "time": f"{end_time - start_time:.3f}s",
+                "seconds": end_time - start_time,
+                "status": "成功"
+            })
+            return result
         except Exception as e:
             return {
                 "source": text,
@@ -287,48 +459,175 @@ class TextFileCorrector:
                 "status": f"错误: {e}"
             }
     
-    def correct_text(self, text, strategy='voting'):
+    def correct_text(self, text, strategy='voting', details=None):
         """
         使用多模型集成进行纠错
         Args:
             text: 待纠错文本
-            strategy: 集成策略，'voting' 或 'pipeline'
+            strategy: 集成策略，'voting'、'pipeline' 或其他已注册的策略
+            details: dict（可选），传入时记录每个模型对原文的纠错结果 {模型名: 纠错后文本}
         """
-        results = {}
-        
-        # 获取所有模型的结果
+        return self.correct_text_multi(text, [strategy], details)[strategy]
+
+    def correct_text_multi(self, text, strategies=('voting', 'pipeline'), details=None, results=None):
+        """
+        一次纠错同时得到多个策略的结果：每个模型对原文只运行一次，各策略共用这些结果
+        （流水线中前一个模型改动了文本时，后续模型才需要在改动后的文本上再运行）
+        Args:
+            text: 待纠错文本
+            strategies: 策略名列表
+            details: dict（可选），记录每个模型对原文的纠错结果
+            results: dict（可选），记录每个模型对原文的完整结果 {模型名: correct_single_model 返回的字典}
+        Returns:
+            dict: {策略名: 纠错后文本}（规范化只作用于模型输入，结果都已放回原文）
+        Raises:
+            ValueError: 策略未注册
+        """
+        check_strategies(strategies)
+        source = text
+        if self.normalize:
+            text = normalize_text(text)
+
+        def restore(target):
+            return restore_original(source, text, target)
+
+        def record(model_name, result):
+            if details is not None:
+                details[model_name] = restore(result['target'])
+            if results is not None:
+                results[model_name] = dict(result, source=source, target=restore(result['target']))
+
+        route = classify_line(text) if self.fast_path else ROUTE_CHINESE
+        if route != ROUTE_CHINESE:
+            # 不含汉字的行不经过中文模型
+            self.route_stats[route] += 1
+            metrics.incr(f"lines_route_{route}")
+            target = text
+            if route == ROUTE_ENGLISH and 'en_spell' in self.available_models:
+                result = self.correct_single_model(text, 'en_spell')
+                record('en_spell', result)
+                target = result['target']
+            return {strategy: restore(target) for strategy in strategies}
+
+        if text in self.clean_cache:
+            self.clean_cache.move_to_end(text)
+            self.route_stats['clean_cache'] += 1
+            metrics.incr("lines_clean_cache_hits")
+            # 按缓存的状态补记各模型的结果，明细和 ResultStore 与实际运行时一致（本次没有运行模型，耗时记为 0）
+            for model_name, status in self.clean_cache[text].items():
+                record(model_name, {"source": text, "target": text, "errors": [], "model": model_name,
+                                    "time": "0s", "seconds": 0.0, "status": status})
+            return {strategy: source for strategy in strategies}
+
+        model_results = {}
+
+        def run_model(model_name, input_text):
+            key = (model_name, input_text)
+            if key not in model_results:
+                model_results[key] = self.correct_single_model(input_text, model_name)
+            return model_results[key]
+
+        only_trusted = getattr(self.models.get('confusion'), 'only_trusted', None)
+        if self.trust_confusion_dict and only_trusted and 'confusion' in self.available_models:
+            # 混淆集最先运行；只命中挖掘出的可信词条时直接采用其结果，跳过耗时的模型
+            result = run_model('confusion', text)
+            if only_trusted(result['errors']):
+                self.route_stats['learned_confusion'] += 1
+                metrics.incr("lines_learned_confusion")
+                record('confusion', result)
+                return {strategy: restore(result['target']) for strategy in strategies}
+
+        self.route_stats[ROUTE_CHINESE] += 1
+
+        line_results = {}
         for model_name in self.available_models:
-            result = self.correct_single_model(text, model_name)
-            results[model_name] = result
-        
-        if strategy == 'voting':
-            # 投票策略：选择最常见的纠错结果
-            corrections = [r['target'] for r in results.values() if r['target'] != text]
-            if corrections:
-                # 简单多数投票
-                from collections import Counter
-                vote_result = Counter(corrections).most_common(1)[0][0]
-                return vote_result
-            else:
-                return text
-        
-        elif strategy == 'pipeline':
-            # 流水线策略：依次应用每个模型
-            current_text = text
-              # 按优先级顺序应用模型
-            model_order = ['kenlm', 'macbert', 'ernie', 'confusion', 'en_spell']
-            
-            for model_name in model_order:
-                if model_name in self.available_models:
-                    result = self.correct_single_model(current_text, model_name)
-                    if result['target'] != current_text and result['errors']:
-                        current_text = result['target']
-            
-            return current_text
-        
-        return text
+            result = run_model(model_name, text)
+            line_results[model_name] = result
+            record(model_name, result)
+
+        outputs = {}
+        for strategy in strategies:
+            target = STRATEGIES[strategy](text, run_model, self.available_models)
+            outputs[strategy] = restore(target)
+
+        # 所有模型都没有改动的行记入缓存，任何策略的结果都是原文
+        if self.clean_cache_size and all(result['target'] == text for result in line_results.values()):
+            self.clean_cache[text] = {model_name: result.get('status', '成功')
+                                      for model_name, result in line_results.items()}
+            if len(self.clean_cache) > self.clean_cache_size:
+                self.clean_cache.popitem(last=False)
+        return outputs
     
-    def correct_file(self, input_file_path, output_file_path=None, strategy='voting', encoding='utf-8', show_progress=True):
+    def correct_with_deadline(self, text, timeout=None, deadline=None, rewrite=None):
+        """
+        在截止时间内纠错：按 confusion → kenlm → macbert → ernie → en_spell → 大模型 的顺序依次应用
+        （固定顺序，相当于流水线策略），
+        根据各阶段实测延迟跳过剩余时间内来不及完成的阶段（见 deadline_scheduler.py）
+        Args:
+            text: 待纠错文本
+            timeout: 从现在起可用的秒数
+            deadline: time.monotonic() 截止时间点，与 timeout 二选一；都为 None 时不限时
+            rewrite: 大模型纠错函数 text -> text（可选，如 QwenRewrite.rewrite_text），为 None 时不运行大模型阶段
+        Returns:
+            dict: target（截止时间到达时已得到的最好结果）、stages（实际运行的阶段）、
+                  skipped（{被跳过的阶段: 'budget' | 'deadline' | 'error'}）、elapsed、deadline_met
+        """
+        if deadline is None:
+            deadline = time.monotonic() + timeout if timeout is not None else float('inf')
+        source = text
+        if self.normalize:
+            text = normalize_text(text)
+        route = classify_line(text) if self.fast_path else ROUTE_CHINESE
+        if route != ROUTE_CHINESE or text in self.clean_cache:
+            # 快速路径本身耗时可以忽略
+            target = self.correct_text(source)
+            return {"source": source, "target": target, "stages": [], "skipped": {}, "elapsed": 0.0,
+                    "deadline_met": True}
+
+        stages = [stage for stage in DEADLINE_ORDER
+                  if stage in self.available_models or (stage == 'llm' and rewrite is not None)]
+
+        def run_stage(stage, input_text):
+            if stage == 'llm':
+                start_time = time.time()
+                target = rewrite(input_text).strip()
+                self.latency.observe('llm', time.time() - start_time)
+                return target or input_text
+            result = self.correct_single_model(input_text, stage)
+            if result['status'] != "成功":
+                raise RuntimeError(result['status'])
+            return result['target'] if result['errors'] else input_text
+
+        result = run_with_deadline(text, stages, run_stage, deadline, self.latency)
+        result["source"] = source
+        result["target"] = restore_original(source, text, result["target"])
+        for stage in result['skipped']:
+            metrics.incr(f"deadline_skipped_{stage}")
+        return result
+
+    def _confusion_fingerprint(self):
+        """混淆集内容的哈希；替换为其他混淆集纠错器时按类名区分"""
+        model = self.models.get('confusion')
+        if model is None:
+            return None
+        fingerprint = getattr(model, 'fingerprint', None)
+        return fingerprint() if fingerprint else type(model).__name__
+
+    def manifest_config(self):
+        """影响纠错结果的配置，增量清单据此判断上一次的结果能否复用"""
+        return {
+            "models": list(self.available_models),
+            "backend": self.backend,
+            "normalize": self.normalize,
+            "fast_path": self.fast_path,
+            "max_segment_length": self.max_segment_length,
+            "segment_overlap": self.segment_overlap,
+            "confusion": self._confusion_fingerprint(),
+        }
+
+    def correct_file(self, input_file_path, output_file_path=None, strategy='voting', encoding='utf-8', show_progress=True,
+                     details_file_path=None, profile=False, profile_top_n=20, profiler=None, incremental=False,
+                     result_store=None):
         """
         批量纠错文件内容
         Args:
@@ -337,74 +636,178 @@ class TextFileCorrector:
             strategy: 集成策略，'voting' 或 'pipeline'
             encoding: 文件编码
             show_progress: 是否显示处理进度
+            details_file_path: 逐行纠错明细的 JSONL 输出路径（可选），
+                               每行记录行号、原文、各模型结果和最终结果，边处理边写入
+            profile: 是否开启剖析模式，记录逐行、逐模型耗时，报告写到输出文件旁的 *_profile.txt
+            profile_top_n: 剖析报告中保留的最慢行数
+            profiler: 额外包裹整个运行的剖析器，'cprofile' 或 'sampling'（开启时自动启用剖析模式）
+            incremental: 增量模式，复用输出文件旁清单中上一次的结果，只纠错新增或改动的行（见 correction_manifest.py）
+            result_store: ResultStore（可选），保存每行每个模型的完整结果（见 result_store.py）；
+                          增量模式下复用的行不会重新记录
         """
         # 如果没有指定输出文件路径，自动生成
         if output_file_path is None:
-            import os
             base_name = os.path.splitext(input_file_path)[0]
             output_file_path = f"{base_name}_corrected.txt"
+        result = self.correct_file_strategies(
+            input_file_path, {strategy: output_file_path}, encoding=encoding, show_progress=show_progress,
+            details_file_path=details_file_path, profile=profile, profile_top_n=profile_top_n, profiler=profiler,
+            incremental=incremental, result_store=result_store
+        )
+        if result["success"]:
+            result.update(result.pop("outputs")[strategy])
+        return result
+
+    def correct_file_strategies(self, input_file_path, output_paths, encoding='utf-8', show_progress=True,
+                                details_file_path=None, profile=False, profile_top_n=20, profiler=None,
+                                incremental=False, result_store=None):
+        """
+        一次遍历文件，同时写出多个策略的纠错结果（每行的每个模型只运行一次）
+        Args:
+            input_file_path: 输入文件路径
+            output_paths: {策略名: 输出文件路径}
+            其余参数同 correct_file；明细中的 target/strategy 为第一个策略，多个策略时另有 targets
+        Returns:
+            dict: 总体信息，以及 outputs: {策略名: {output_file_path, corrected_lines, correction_rate}}；
+                  增量模式下另有 incremental: {manifest_path, reused_lines, corrected_lines}
+        """
+        strategies = list(output_paths)
+        check_strategies(strategies)
         if show_progress:
             print(f"开始处理文件: {input_file_path}")
-            print(f"输出文件: {output_file_path}")
-            print(f"使用策略: {strategy}")
+            for strategy in strategies:
+                print(f"输出文件（{strategy}）: {output_paths[strategy]}")
             print("=" * 60)
         
+        run_profiler = None
         try:
             # 读取输入文件
             with open(input_file_path, 'r', encoding=encoding) as f:
                 lines = f.readlines()
             
-            corrected_lines = []
+            corrected_lines = {strategy: [] for strategy in strategies}
+            corrected_counts = Counter()
+            routes_before = Counter(self.route_stats)
             total_lines = len(lines)
-            corrected_count = 0
+            details_writer = JsonlWriter(details_file_path, encoding=encoding) if details_file_path else None
+            manifest = None
+            if incremental:
+                manifest = CorrectionManifest(manifest_path_for(output_paths[strategies[0]]), self.manifest_config(),
+                                              encoding=encoding)
+            if profile or profiler:
+                # 先创建 RunProfiler（会校验 profiler 参数），失败时不留下半设置的逐行剖析器
+                run_profiler = RunProfiler(profiler)
+                self.line_profiler = LineProfiler(top_n=profile_top_n)
+                run_profiler.start()
             
             for i, line in enumerate(lines, 1):
                 original_line = line
                 line = line.strip()
                 
                 if not line:  # 空行直接保留
-                    corrected_lines.append(original_line)
+                    for strategy in strategies:
+                        corrected_lines[strategy].append(original_line)
                     continue
                 
                 if show_progress:
                     print("\n")
                 
-                # 使用指定策略进行纠错
-                corrected_text = self.correct_text(line, strategy=strategy)
-                corrected_lines.append(corrected_text + '\n')
-                
-                # 统计纠错数量
-                if corrected_text != line:
-                    corrected_count += 1
-                    if show_progress:
-                        print(f"  ✓ 已纠错: {corrected_text}")
+                # 增量模式下内容没变的行直接复用上一次的结果
+                cached = manifest.lookup(line, strategies) if manifest else None
+                if cached:
+                    outputs, model_details = cached
+                    metrics.incr("lines_incremental_reused")
                 else:
-                    if show_progress:
-                        print("\n")
+                    # 一次纠错得到所有策略的结果
+                    model_details = {} if details_writer or manifest else None
+                    model_results = {} if result_store is not None else None
+                    if self.line_profiler is not None:
+                        self.line_profiler.start_line(i, line)
+                    outputs = self.correct_text_multi(line, strategies, details=model_details, results=model_results)
+                    if self.line_profiler is not None:
+                        self.line_profiler.end_line()
+                    if result_store is not None:
+                        result_store.add_line(i, line, model_results)
+                    if manifest:
+                        manifest.store(line, outputs, model_details)
+                for strategy in strategies:
+                    corrected_lines[strategy].append(outputs[strategy] + '\n')
+                if details_writer:
+                    record = {
+                        "line_number": i,
+                        "source": line,
+                        "models": model_details,
+                        "target": outputs[strategies[0]],
+                        "strategy": strategies[0]
+                    }
+                    if len(strategies) > 1:
+                        record["targets"] = outputs
+                    if cached:
+                        record["reused"] = True
+                    details_writer.write(record)
+                
+                # 统计纠错数量：只因规范化而不同的行不算纠错
+                normalized_line = normalize_text(line) if self.normalize else line
+                for strategy in strategies:
+                    if outputs[strategy] != line and (normalize_text(outputs[strategy]) if self.normalize
+                                                      else outputs[strategy]) != normalized_line:
+                        corrected_counts[strategy] += 1
+                        if show_progress:
+                            print(f"  ✓ 已纠错（{strategy}）: {outputs[strategy]}")
                 
                 if show_progress:
                     print()
             
+            if details_writer:
+                details_writer.close()
+
+            profile_report_path = None
+            if self.line_profiler is not None:
+                run_profiler.stop()
+                profile_report_path = f"{os.path.splitext(output_paths[strategies[0]])[0]}_profile.txt"
+                write_profile_report(profile_report_path, self.line_profiler, run_profiler, encoding=encoding)
+                self.line_profiler = None
+                if show_progress:
+                    print(f"剖析报告: {profile_report_path}")
+
             # 写入输出文件
-            with open(output_file_path, 'w', encoding=encoding) as f:
-                f.writelines(corrected_lines)
+            for strategy in strategies:
+                with open(output_paths[strategy], 'w', encoding=encoding) as f:
+                    f.writelines(corrected_lines[strategy])
+            if manifest:
+                manifest.save()
             
             if show_progress:
                 print("=" * 60)
                 print(f"文件处理完成！")
                 print(f"输入文件: {input_file_path}")
-                print(f"输出文件: {output_file_path}")
+                for strategy in strategies:
+                    print(f"输出文件（{strategy}）: {output_paths[strategy]}")
                 print(f"总行数: {total_lines}")
-                # print(f"纠错行数: {corrected_count}")
-                print(f"使用策略: {strategy}")
+            routes = dict(self.route_stats - routes_before)
+            if show_progress:
+                skipped = sum(count for route, count in routes.items() if route != ROUTE_CHINESE)
+                print(f"跳过中文模型的行数: {skipped}（{routes}）")
+                if manifest:
+                    print(f"增量模式: 复用 {manifest.reused} 行，重新纠错 {manifest.corrected} 行")
             
-            return {
+            result = {
                 "success": True,
                 "total_lines": total_lines,
-                "corrected_lines": corrected_count,
-                "correction_rate": corrected_count/total_lines*100,
-                "output_file_path": output_file_path  # 返回输出文件路径
+                "outputs": {
+                    strategy: {
+                        "output_file_path": output_paths[strategy],  # 返回输出文件路径
+                        "corrected_lines": corrected_counts[strategy],
+                        "correction_rate": corrected_counts[strategy] / total_lines * 100,
+                    }
+                    for strategy in strategies
+                },
+                "profile_report_path": profile_report_path,
+                "routes": routes
             }
+            if manifest:
+                result["incremental"] = manifest.stats()
+            return result
             
         except FileNotFoundError:
             error_msg = f"错误: 找不到输入文件 {input_file_path}"
@@ -418,6 +821,11 @@ class TextFileCorrector:
                 import traceback
                 traceback.print_exc()
             return {"success": False, "error": error_msg}
+        finally:
+            if self.line_profiler is not None:
+                if run_profiler is not None:
+                    run_profiler.stop()
+                self.line_profiler = None
 
 
 def main():
@@ -445,12 +853,11 @@ def main():
             print(f"缺少输入文件")
             return 0
         
-        # 使用投票策略处理文件
-        print(f"\n使用投票策略处理文件...")
-        result1 = corrector.correct_file(input_file, output_file_voting, strategy='voting')
-        
-        print(f"\n使用流水线策略处理文件...")
-        result2 = corrector.correct_file(input_file, output_file_pipeline, strategy='pipeline')
+        # 一次遍历同时得到投票和流水线两种策略的结果
+        print(f"\n使用投票和流水线策略处理文件...")
+        result = corrector.correct_file_strategies(
+            input_file, {'voting': output_file_voting, 'pipeline': output_file_pipeline}
+        )
         
         print(f"\n处理完成！")
         print(f"输入文件: {input_file}")
@@ -471,7 +878,10 @@ def main():
 if __name__ == "__main__":
     main()
 
-def text_file_corrector(input_file_path, strategy='voting', use_models=None, encoding='utf-8', show_progress=False):
+def text_file_corrector(input_file_path, strategy='voting', use_models=None, encoding='utf-8', show_progress=False,
+                        details_file_path=None, profile=False, profiler=None, backend='torch',
+                        onnx_dir='models/macbert_onnx', intra_op_threads=None, incremental=False,
+                        results_parquet=None, confusion_path=None):
     """
     简化的文本文件纠错接口，供外部代码调用
     
@@ -481,6 +891,13 @@ def text_file_corrector(input_file_path, strategy='voting', use_models=None, enc
         use_models: 要使用的模型列表，默认使用所有可用模型
         encoding: 文件编码
         show_progress: 是否显示进度
+        details_file_path: 逐行纠错明细的 JSONL 输出路径（可选）
+        profile: 是否开启剖析模式（逐行、逐模型耗时报告写到输出文件旁）
+        profiler: 额外的整体剖析器，'cprofile' 或 'sampling'
+        backend / onnx_dir / intra_op_threads: MacBERT 推理后端设置，见 TextFileCorrector
+        incremental: 增量模式，只纠错与上一次运行相比新增或改动的行
+        results_parquet: 把每行每个模型的完整结果流式写入该 Parquet 文件（需要 pyarrow）
+        confusion_path: 额外的混淆集文件（见 confusion_miner.py）
     
     Returns:
         dict: 包含结果信息和输出文件路径的字典
@@ -507,7 +924,8 @@ def text_file_corrector(input_file_path, strategy='voting', use_models=None, enc
         if use_models is None:
             use_models = ['kenlm', 'macbert', 'ernie', 'confusion']
         
-        corrector = TextFileCorrector(use_models=use_models)
+        corrector = TextFileCorrector(use_models=use_models, backend=backend, onnx_dir=onnx_dir,
+                                      intra_op_threads=intra_op_threads, confusion_path=confusion_path)
         
         if not corrector.available_models:
             return {
@@ -516,14 +934,23 @@ def text_file_corrector(input_file_path, strategy='voting', use_models=None, enc
                 "output_file_path": None
             }
         
+        result_store = ResultStore(parquet_path=results_parquet) if results_parquet else None
+        
         # 执行纠错
         result = corrector.correct_file(
             input_file_path, 
             output_file_path=None,  # 自动生成输出文件名
             strategy=strategy, 
             encoding=encoding, 
-            show_progress=show_progress
+            show_progress=show_progress,
+            details_file_path=details_file_path,
+            profile=profile,
+            profiler=profiler,
+            incremental=incremental,
+            result_store=result_store
         )
+        if result_store is not None:
+            result_store.close()
         
         return result
         
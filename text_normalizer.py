@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+纠错前的文本规范化与行分类
+
+- 全角字母、数字转为半角，全角空格和连续空白合并为一个半角空格；
+  中文标点（，。：等）保持原样，避免改动正文。规范化只用于模型输入，纠错结果用 restore_original 放回原文
+- 按内容把行分为 chinese / english / url / symbol / empty，
+  只有含汉字的行才需要经过中文纠错模型
+"""
+import re
+
+# 全角字母和数字（Ａ-Ｚ、ａ-ｚ、０-９）到半角的映射
+FULLWIDTH_ALNUM = {code: code - 0xFEE0 for code in list(range(0xFF10, 0xFF1A))
+                   + list(range(0xFF21, 0xFF3B)) + list(range(0xFF41, 0xFF5B))}
+FULLWIDTH_ALNUM[0x3000] = 0x20
+
+WHITESPACE_PATTERN = re.compile(r"[ \t\u00a0\u2000-\u200b\u202f\u205f\u3000]+")
+CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+URL_PATTERN = re.compile(r"^(?:(?:https?|ftp)://|www\.)\S+$|^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$", re.IGNORECASE)
+ENGLISH_WORD_PATTERN = re.compile(r"[A-Za-z]{2,}")
+
+# 行分类结果
+ROUTE_CHINESE = "chinese"
+ROUTE_ENGLISH = "english"
+ROUTE_URL = "url"
+ROUTE_SYMBOL = "symbol"
+ROUTE_EMPTY = "empty"
+
+
+def normalize_text(text):
+    """全角字母数字转半角，合并空白"""
+    text = text.translate(FULLWIDTH_ALNUM)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def restore_original(original, normalized, corrected):
+    """
+    把基于规范化文本的纠错结果放回原文：
+    没有改动时返回原文；规范化和纠错都不改变长度时逐字合并，只替换被改动的字，其余字保持原样（如全角字符）；
+    否则（规范化合并了空白等）返回纠错结果
+    """
+    if corrected == normalized:
+        return original
+    if len(original) == len(normalized) == len(corrected):
+        return "".join(new if new != old else raw for raw, old, new in zip(original, normalized, corrected))
+    return corrected
+
+
+def classify_line(text):
+    """
+    判断一行文本应走的路径
+    Returns:
+        str: chinese（含汉字，需要中文模型）、english（英文，可交给 en_spell）、
+             url（网址、邮箱）、symbol（数字、标点、符号）或 empty
+    """
+    if not text.strip():
+        return ROUTE_EMPTY
+    if CJK_PATTERN.search(text):
+        return ROUTE_CHINESE
+    if URL_PATTERN.match(text.strip()):
+        return ROUTE_URL
+    if ENGLISH_WORD_PATTERN.search(text):
+        return ROUTE_ENGLISH
+    return ROUTE_SYMBOL
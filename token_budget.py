@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+大模型 token 用量与费用统计，以及按预算降级
+
+每次 OCR / 改写请求的 usage（输入、输出、图片 token）记录到 ledger，按作业汇总并估算费用。
+设置了预算（token 数或费用）时，二级纠错只把优先级高的行发给大模型：
+第一次纠错中各模型都认为无误的行优先被跳过，保留第一次纠错的结果，而不是超出预算。
+
+# 单个文件：最多 20000 token、不超过 0.5 元
+python integrated_corrector.py video.mp4 --max-tokens 20000 --max-cost 0.5 --usage-json usage.json
+"""
+import json
+import threading
+
+# 每千 token 的价格（元）：(输入, 输出)。可用 --prices 指定 JSON 文件覆盖
+DEFAULT_PRICES = {
+    "qwen-plus": (0.0008, 0.002),
+    "qwen-vl-ocr-latest": (0.005, 0.005),
+}
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens", "image_tokens")
+
+# 改写请求中提示词和系统消息的固定开销（token）
+PROMPT_OVERHEAD = 200
+
+
+def _get(obj, name):
+    if obj is None:
+        return None
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def usage_to_dict(usage):
+    """把 completion.usage（对象或字典）转为 {字段: token 数}，图片 token 可能在 prompt_tokens_details 中"""
+    result = {field: _get(usage, field) or 0 for field in USAGE_FIELDS}
+    if not result["image_tokens"]:
+        result["image_tokens"] = _get(_get(usage, "prompt_tokens_details"), "image_tokens") or 0
+    if not result["total_tokens"]:
+        result["total_tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+    return result
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：汉字约一字一个 token，其余字符约四个一个"""
+    cjk = sum(1 for char in text if "一" <= char <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def load_prices(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return {model: tuple(prices) for model, prices in json.load(f).items()}
+
+
+class TokenLedger:
+    """一个作业内的 token 用量账本"""
+
+    def __init__(self, max_tokens=None, max_cost=None, prices=None):
+        # 可重入：rewrite_within_budget 在持有锁时计算剩余预算并预留
+        self.lock = threading.RLock()
+        self.records = []
+        self.skipped_lines = 0
+        # 已发出、还没有记录实际用量的请求预留的 token 数和费用
+        self.reserved_tokens = 0
+        self.reserved_cost = 0.0
+        self.configure(max_tokens, max_cost, prices)
+
+    def configure(self, max_tokens=None, max_cost=None, prices=None):
+        """
+        Args:
+            max_tokens: 作业总 token 预算，None 表示不限
+            max_cost: 作业总费用预算（元），None 表示不限
+            prices: {模型: (输入价格, 输出价格)}，单位为元/千 token
+        """
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.prices = dict(DEFAULT_PRICES, **(prices or {}))
+
+    def reset(self):
+        with self.lock:
+            self.records = []
+            self.skipped_lines = 0
+
+    @property
+    def has_budget(self):
+        return self.max_tokens is not None or self.max_cost is not None
+
+    def cost_of(self, model, prompt_tokens, completion_tokens):
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+    def record(self, stage, model, usage):
+        """记录一次请求的用量，usage 为 None 时忽略"""
+        if usage is None:
+            return None
+        entry = {"stage": stage, "model": model, **usage_to_dict(usage)}
+        entry["cost"] = round(self.cost_of(model, entry["prompt_tokens"], entry["completion_tokens"]), 6)
+        with self.lock:
+            self.records.append(entry)
+        return entry
+
+    def merge_records(self, records):
+        """合并子进程输出的用量记录"""
+        with self.lock:
+            self.records.extend(records)
+
+    def total_tokens(self):
+        with self.lock:
+            return sum(entry["total_tokens"] for entry in self.records)
+
+    def total_cost(self):
+        with self.lock:
+            return sum(entry["cost"] for entry in self.records)
+
+    def remaining_tokens(self, model="qwen-plus"):
+        """
+        按 token 预算和费用预算（以该模型的较高单价折算）计算剩余可用的 token 数，已预留的部分视为已用
+        Returns:
+            int 或 None（没有预算）
+        """
+        remaining = []
+        with self.lock:
+            if self.max_tokens is not None:
+                remaining.append(self.max_tokens - self.total_tokens() - self.reserved_tokens)
+            if self.max_cost is not None:
+                price = max(self.prices.get(model, (0.0, 0.0)))
+                if price > 0:
+                    remaining.append(int((self.max_cost - self.total_cost() - self.reserved_cost) * 1000 / price))
+        return max(0, min(remaining)) if remaining else None
+
+    def reserve(self, tokens, model="qwen-plus"):
+        """
+        为即将发出的请求预留 token（费用按该模型的较高单价折算），
+        并发的作业据此看到扣除预留后的剩余预算；请求结束、实际用量记录之后用 release 释放
+        Returns:
+            (int, float): 预留的 token 数和费用
+        """
+        reservation = (tokens, tokens * max(self.prices.get(model, (0.0, 0.0))) / 1000)
+        with self.lock:
+            self.reserved_tokens += reservation[0]
+            self.reserved_cost += reservation[1]
+        return reservation
+
+    def release(self, reservation):
+        with self.lock:
+            self.reserved_tokens -= reservation[0]
+            self.reserved_cost -= reservation[1]
+
+    def summary(self):
+        """按阶段汇总用量和费用"""
+        stages = {}
+        with self.lock:
+            for entry in self.records:
+                stage = stages.setdefault(entry["stage"], {"requests": 0, "cost": 0.0,
+                                                           **{field: 0 for field in USAGE_FIELDS}})
+                stage["requests"] += 1
+                stage["cost"] = round(stage["cost"] + entry["cost"], 6)
+                for field in USAGE_FIELDS:
+                    stage[field] += entry[field]
+        return {
+            "stages": stages,
+            "total_tokens": sum(stage["total_tokens"] for stage in stages.values()),
+            "total_cost": round(sum(stage["cost"] for stage in stages.values()), 6),
+            "max_tokens": self.max_tokens,
+            "max_cost": self.max_cost,
+            "llm_lines_skipped": self.skipped_lines,
+        }
+
+    def to_json(self, file_path):
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(dict(self.summary(), records=self.records), f, ensure_ascii=False, indent=2)
+
+
+# 当前进程的作业账本
+ledger = TokenLedger()
+
+
+def line_priority(source, model_targets, target):
+    """
+    二级纠错的行优先级：第一次纠错改动过、各模型意见不一致的行更值得交给大模型，
+    所有模型都认为无误的行优先级为 0
+    """
+    suggestions = {text for text in (model_targets or {}).values() if text != source}
+    priority = len(suggestions)
+    if target != source:
+        priority += 1
+    if len(suggestions) > 1:
+        priority += 1
+    return priority
+
+
+def line_tokens(line):
+    """一行在改写请求中的估计用量：输入一次、输出一次"""
+    return 2 * estimate_tokens(line) + 2
+
+
+def planned_tokens(text):
+    """一次改写请求的估计用量：固定开销加上各非空行的输入、输出"""
+    return PROMPT_OVERHEAD + sum(line_tokens(line) for line in text.split("\n") if line.strip())
+
+
+def plan_rewrite(lines, budget_tokens, priorities=None, prompt_overhead=None):
+    """
+    在 token 预算内选出要交给大模型的行
+    Args:
+        lines: 第一次纠错后的各行
+        budget_tokens: 可用 token 数，None 表示不限
+        priorities: 与 lines 对应的优先级（越大越优先），None 表示按原顺序
+        prompt_overhead: 提示词和系统消息的固定开销，默认 PROMPT_OVERHEAD
+    Returns:
+        list[int]: 选中行的下标（升序）
+    """
+    candidates = [index for index, line in enumerate(lines) if line.strip()]
+    if budget_tokens is None:
+        return candidates
+    remaining = budget_tokens - (PROMPT_OVERHEAD if prompt_overhead is None else prompt_overhead)
+    selected = []
+    order = sorted(candidates, key=lambda index: (-(priorities[index] if priorities else 0), index))
+    for index in order:
+        cost = line_tokens(lines[index])
+        if cost <= remaining:
+            selected.append(index)
+            remaining -= cost
+    return sorted(selected)
+
+
+def rewrite_within_budget(lines, rewrite, budget_ledger=None, priorities=None, model="qwen-plus"):
+    """
+    在预算内进行二级纠错，超出预算的低优先级行保留第一次纠错的结果
+    Args:
+        lines: 第一次纠错后的各行
+        rewrite: 接收文本、返回纠错后文本的函数
+        budget_ledger: 使用的账本，默认为当前进程的 ledger
+        priorities: 各行优先级
+    Returns:
+        (list[str], int): 最终各行，以及因预算跳过的非空行数
+    """
+    from line_aligner import align_to_segments
+
+    budget_ledger = budget_ledger or ledger
+    non_empty = [index for index, line in enumerate(lines) if line.strip()]
+    # 并发的作业共用一个账本：在同一把锁内计算剩余预算并预留本次计划的用量，
+    # 否则它们会按同一份剩余预算各自规划，合计超出预算
+    with budget_ledger.lock:
+        budget_tokens = budget_ledger.remaining_tokens(model)
+        selected = plan_rewrite(lines, budget_tokens, priorities)
+        skipped = len(non_empty) - len(selected)
+        budget_ledger.skipped_lines += skipped
+        reservation = None
+        if selected and budget_tokens is not None:
+            reservation = budget_ledger.reserve(PROMPT_OVERHEAD + sum(line_tokens(lines[index]) for index in selected),
+                                                model)
+    if not selected:
+        return list(lines), skipped
+
+    try:
+        # 全部选中时保持原样发送（包括空行），否则只发送选中的行
+        if len(selected) == len(non_empty):
+            return align_to_segments(list(lines), rewrite("\n".join(lines))), skipped
+        selected_lines = [lines[index] for index in selected]
+        rewritten = align_to_segments(selected_lines, rewrite("\n".join(selected_lines)))
+    finally:
+        # rewrite 返回前实际用量已记入账本（进程内的 record 或子进程的 USAGE 行），预留随之释放
+        if reservation is not None:
+            budget_ledger.release(reservation)
+    final_lines = list(lines)
+    for index, line in zip(selected, rewritten):
+        final_lines[index] = line
+    return final_lines, skipped